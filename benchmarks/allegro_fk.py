@@ -0,0 +1,77 @@
+"""
+Compares the action distance subsampling of AllegroSampler with the fingertip coordinates computed
+one state at a time through ikpy (the old path) and for all the states at once with
+AllegroKDL.get_batched_fingertip_coords, on synthetic Allegro joint states.
+
+    python benchmarks/allegro_fk.py --num-states 100000
+"""
+
+import argparse
+import time
+import warnings
+
+import numpy as np
+
+from openteach.robot.allegro.allegro_kdl import AllegroKDL
+from openteach.utils.vectorops import get_distance, get_distance_subsample_idxs
+
+MIN_ACTION_DISTANCE = 0.01
+
+
+def synthetic_joint_states(num_states):
+    # Smooth random finger motions inside the joint limits
+    rng = np.random.default_rng(0)
+    steps = rng.normal(0, 0.01, (num_states, 16))
+    return np.clip(np.cumsum(steps, axis=0), -0.2, 1.5)
+
+
+def old_subsample(robot, joint_states):
+    coords = [robot.get_fingertip_coords(np.array(state)) for state in joint_states]
+    chosen_idxs, previous_state = [], coords[0]
+    for idx in range(1, len(coords)):
+        if get_distance(coords[idx], previous_state) > MIN_ACTION_DISTANCE:
+            chosen_idxs.append(idx)
+            previous_state = coords[idx]
+    return np.array(coords), np.array(chosen_idxs)
+
+
+def new_subsample(robot, joint_states):
+    coords = robot.get_batched_fingertip_coords(joint_states)
+    return coords, get_distance_subsample_idxs(coords, MIN_ACTION_DISTANCE)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--num-states", type=int, default=100000)
+    args = parser.parse_args()
+
+    with warnings.catch_warnings():
+        # ikpy warns about the fixed fingertip links of the URDF
+        warnings.simplefilter("ignore")
+        robot = AllegroKDL()
+    joint_states = synthetic_joint_states(args.num_states)
+
+    # Compiling the numba scan before timing it
+    new_subsample(robot, joint_states[:10])
+
+    start_time = time.perf_counter()
+    new_coords, new_idxs = new_subsample(robot, joint_states)
+    new_time = time.perf_counter() - start_time
+
+    start_time = time.perf_counter()
+    old_coords, old_idxs = old_subsample(robot, joint_states)
+    old_time = time.perf_counter() - start_time
+
+    print("States: {}".format(args.num_states))
+    print("Old path (ikpy per state): {:.2f} s".format(old_time))
+    print("Batched path: {:.3f} s ({:.0f}x)".format(new_time, old_time / new_time))
+    print("Max fingertip difference: {:.2e} m".format(np.abs(old_coords - new_coords).max()))
+    print(
+        "Same sampled states: {} ({} states)".format(
+            np.array_equal(old_idxs, new_idxs), len(new_idxs)
+        )
+    )
+
+
+if __name__ == "__main__":
+    main()
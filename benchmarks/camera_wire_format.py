@@ -0,0 +1,89 @@
+"""
+Compares the bytes on the wire and the encode / decode CPU time per frame of the old RGB camera
+messages (JPEG + base64 + pickled dict) with the [topic, header, JPEG] messages sent by
+ZMQCameraPublisher.
+
+    python benchmarks/camera_wire_format.py --iterations 100
+"""
+
+import argparse
+import base64
+import pickle
+import time
+
+import cv2
+import numpy as np
+
+from openteach.constants import HEIGHT, WIDTH
+from openteach.utils.images import IMAGE_CODEC_JPEG
+from openteach.utils.network import pack_rgb_header, unpack_rgb_header
+
+
+def synthetic_image():
+    # Smooth gradients with sensor-like noise compress like a camera frame, pure noise does not
+    x, y = np.meshgrid(np.linspace(0, 255, WIDTH), np.linspace(0, 255, HEIGHT))
+    image = np.stack([x, y, (x + y) / 2], axis=-1)
+    image += np.random.normal(0, 4, image.shape)
+    return np.clip(image, 0, 255).astype(np.uint8)
+
+
+def encode_pickled(image, timestamp):
+    _, buffer = cv2.imencode(".jpg", image, [int(cv2.IMWRITE_JPEG_QUALITY), 70])
+    data = dict(timestamp=timestamp, rgb_image=base64.b64encode(buffer))
+    return [b"rgb_image " + pickle.dumps(data, protocol=-1)]
+
+
+def decode_pickled(frames):
+    data = pickle.loads(frames[0].lstrip(b"rgb_image "))
+    encoded_data = np.frombuffer(base64.b64decode(data["rgb_image"]), np.uint8)
+    return cv2.imdecode(encoded_data, 1), data["timestamp"]
+
+
+def encode_framed(image, timestamp):
+    _, buffer = cv2.imencode(".jpg", image, [int(cv2.IMWRITE_JPEG_QUALITY), 70])
+    return [b"rgb_image", pack_rgb_header(timestamp, image.shape, IMAGE_CODEC_JPEG), buffer]
+
+
+def decode_framed(frames):
+    timestamp, _, _ = unpack_rgb_header(frames[1])
+    return cv2.imdecode(np.frombuffer(frames[2], np.uint8), 1), timestamp
+
+
+def measure(encode, decode, image, iterations):
+    encode_time, decode_time = 0, 0
+    for idx in range(iterations):
+        start_time = time.perf_counter()
+        frames = encode(image, float(idx))
+        encode_time += time.perf_counter() - start_time
+
+        start_time = time.perf_counter()
+        decoded_image, timestamp = decode(frames)
+        decode_time += time.perf_counter() - start_time
+
+    assert decoded_image.shape == image.shape and timestamp == iterations - 1
+    num_bytes = sum(len(memoryview(frame).cast("B")) for frame in frames)
+    return num_bytes, encode_time / iterations, decode_time / iterations
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--iterations", type=int, default=100)
+    args = parser.parse_args()
+
+    image = synthetic_image()
+    print("{}x{} frame".format(WIDTH, HEIGHT))
+    print("{:<10}{:>14}{:>14}{:>14}".format("format", "bytes/frame", "encode ms", "decode ms"))
+    for name, encode, decode in [
+        ("pickled", encode_pickled, decode_pickled),
+        ("framed", encode_framed, decode_framed),
+    ]:
+        num_bytes, encode_time, decode_time = measure(encode, decode, image, args.iterations)
+        print(
+            "{:<10}{:>14}{:>14.2f}{:>14.2f}".format(
+                name, num_bytes, encode_time * 1e3, decode_time * 1e3
+            )
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+"""
+Records a synthetic 1280x720 uint16 depth stream through the DepthImageRecorder writer path
+(bounded queue, background writer thread, chunked HDF5 dataset) and reports the sustained
+frame rate, the dropped frames, the writer capacity and the peak RSS. The default is a
+10 minute capture at 30 FPS, which the old recorder had to keep twice in memory.
+
+    python benchmarks/depth_recording.py --duration 600 --compression lzf
+    python benchmarks/depth_recording.py --duration 60 --compression lz4 --fps 0
+"""
+
+import argparse
+import os
+import resource
+import tempfile
+import time
+
+import h5py
+import numpy as np
+
+from openteach.constants import (
+    DEPTH_RECORD_FLUSH_EVERY,
+    DEPTH_RECORD_FPS,
+    DEPTH_RECORD_QUEUE_SIZE,
+    HEIGHT,
+    WIDTH,
+)
+from openteach.utils.hdf5 import HDF5StreamWriter
+from openteach.utils.writer import BackgroundWriter
+
+NUM_SYNTHETIC_FRAMES = 30
+
+
+def synthetic_depth_frames(num_frames=NUM_SYNTHETIC_FRAMES):
+    # A tilted floor, a box and sensor noise with a few holes, in millimeters
+    rng = np.random.default_rng(0)
+    rows, cols = np.mgrid[0:HEIGHT, 0:WIDTH]
+    scene = 600 + rows * 0.8 + cols * 0.1
+    scene[200:500, 400:800] = 450
+    frames = []
+    for _ in range(num_frames):
+        frame = scene + rng.normal(0, 3, scene.shape)
+        frame[rng.random(scene.shape) < 0.02] = 0
+        frames.append(frame.astype(np.uint16))
+    return frames
+
+
+def peak_rss_mb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--duration", type=float, default=600, help="Seconds of capture")
+    parser.add_argument("--fps", type=float, default=DEPTH_RECORD_FPS, help="0 for unpaced")
+    parser.add_argument("--compression", default="lzf")
+    parser.add_argument("--compression-level", type=int, default=None)
+    parser.add_argument("--output", default=None, help="Defaults to a temporary file")
+    args = parser.parse_args()
+
+    frames = synthetic_depth_frames()
+    num_frames = int(args.duration * (args.fps or DEPTH_RECORD_FPS))
+    print("Baseline RSS: {:.0f} MB".format(peak_rss_mb()))
+
+    output = args.output or os.path.join(tempfile.mkdtemp(), "cam_0_depth.h5")
+    hdf5_writer = HDF5StreamWriter(
+        output,
+        flush_every=DEPTH_RECORD_FLUSH_EVERY,
+        dtypes=dict(depth_images=np.uint16, timestamps=np.float64),
+        compression=args.compression,
+        compression_level=args.compression_level,
+    )
+
+    def write_frame(frame):
+        depth_data, timestamp = frame
+        hdf5_writer.append(dict(depth_images=depth_data, timestamps=timestamp))
+
+    writer = BackgroundWriter(write_frame, DEPTH_RECORD_QUEUE_SIZE, name="depth writer")
+
+    start_time = time.perf_counter()
+    for idx in range(num_frames):
+        if args.fps:
+            # Paced like the recorder loop, frames that do not fit in the queue are dropped
+            delay = start_time + idx / args.fps - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+        else:
+            # Unpaced, waits for the writer to measure its throughput
+            while writer.qsize() >= DEPTH_RECORD_QUEUE_SIZE:
+                time.sleep(0.001)
+
+        writer.put((frames[idx % len(frames)].copy(), time.time()))
+    capture_time = time.perf_counter() - start_time
+    writer.close()
+    hdf5_writer.close()
+    total_time = time.perf_counter() - start_time
+
+    statistics = writer.get_statistics()
+    with h5py.File(output, "r") as file:
+        num_stored = len(file["depth_images"])
+    file_size = os.path.getsize(output)
+
+    print("Compression: {}".format(args.compression))
+    print("Frames captured: {} in {:.1f} s".format(num_frames, capture_time))
+    print("Frames stored: {} ({} dropped)".format(num_stored, statistics["num_dropped"]))
+    print("Sustained FPS: {:.1f}".format(num_stored / total_time))
+    print("Writer capacity FPS: {:.1f}".format(1 / max(statistics["mean_write_time"], 1e-9)))
+    print("Max write time: {:.1f} ms".format(statistics["max_write_time"] * 1e3))
+    print("Max queue depth: {}".format(statistics["max_queue_depth"]))
+    print(
+        "File size: {:.0f} MB ({:.0f} KB/frame)".format(
+            file_size / 2**20, file_size / 1024 / max(1, num_stored)
+        )
+    )
+    print("Peak RSS: {:.0f} MB".format(peak_rss_mb()))
+    print(
+        "In-memory recorder would have held: {:.0f} MB".format(
+            2 * num_frames * frames[0].nbytes / 2**20
+        )
+    )
+
+    if args.output is None:
+        os.remove(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+"""
+Reports the encode time, decode time and bytes per frame of every image codec available for the
+camera streams on a synthetic 1280x720 frame, to pick the codec of each deployment in
+configs/camera.yaml.
+
+    python benchmarks/image_codecs.py --iterations 50
+"""
+
+import argparse
+import time
+
+from camera_wire_format import synthetic_image
+
+from openteach.utils.images import TurboJPEGCodec, decode_image, get_image_codec
+
+CODEC_CONFIGS = [
+    dict(name="raw"),
+    dict(name="jpeg", quality=50),
+    dict(name="jpeg", quality=70),
+    dict(name="jpeg", quality=90),
+    dict(name="turbojpeg", quality=70),
+    dict(name="webp", quality=80),
+    dict(name="png", compression=1),
+    dict(name="png", compression=6),
+]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--iterations", type=int, default=50)
+    args = parser.parse_args()
+
+    image = synthetic_image()
+    print("{:<28}{:>14}{:>14}{:>14}".format("codec", "bytes/frame", "encode ms", "decode ms"))
+    for codec_configs in CODEC_CONFIGS:
+        name = ", ".join("{}={}".format(key, value) for key, value in codec_configs.items())
+        if codec_configs["name"] == "turbojpeg":
+            try:
+                TurboJPEGCodec()
+            except (ImportError, OSError, RuntimeError):
+                print("{:<28}not installed".format(name))
+                continue
+
+        codec = get_image_codec(codec_configs)
+        encode_time, decode_time = 0, 0
+        for _ in range(args.iterations):
+            start_time = time.perf_counter()
+            buffer = codec.encode(image)
+            encode_time += time.perf_counter() - start_time
+
+            start_time = time.perf_counter()
+            decoded_image = decode_image(buffer, image.shape, codec.codec_id)
+            decode_time += time.perf_counter() - start_time
+
+        assert decoded_image.shape == image.shape
+        print(
+            "{:<28}{:>14}{:>14.2f}{:>14.2f}".format(
+                name,
+                len(memoryview(buffer).cast("B")),
+                encode_time / args.iterations * 1e3,
+                decode_time / args.iterations * 1e3,
+            )
+        )
+
+
+if __name__ == "__main__":
+    main()
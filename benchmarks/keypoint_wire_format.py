@@ -0,0 +1,93 @@
+"""
+Compares the pickled keypoint messages with the [topic, header, payload] framing used by
+ZMQKeypointPublisher / ZMQKeypointSubscriber.
+
+    python benchmarks/keypoint_wire_format.py --iterations 20000
+"""
+
+import argparse
+import pickle
+import time
+import tracemalloc
+
+import numpy as np
+import zmq
+
+from openteach.utils.network import (
+    decode_keypoints,
+    encode_keypoints,
+    recv_latest_multipart,
+    send_frames,
+)
+
+PAYLOADS = {
+    "hand_keypoints (24x3)": np.random.rand(24, 3),
+    "hand_frame (4x3)": np.random.rand(4, 3),
+}
+TOPIC = "transformed_hand_coords"
+
+
+def pickle_roundtrip(sender, receiver, array):
+    sender.send(bytes("{} ".format(TOPIC), "utf-8") + pickle.dumps(array, protocol=-1))
+    raw_data = receiver.recv()
+    return pickle.loads(raw_data.lstrip(bytes("{} ".format(TOPIC), "utf-8")))
+
+
+def framed_roundtrip(sender, receiver, array):
+    header, payload = encode_keypoints(array)
+    send_frames(sender, [bytes(TOPIC, "utf-8"), header, payload])
+    _, header, payload = recv_latest_multipart(receiver, bytes(TOPIC, "utf-8"))
+    return decode_keypoints(header.buffer, payload.buffer)
+
+
+def measure(roundtrip, sender, receiver, array, iterations):
+    # Latency
+    start_time = time.perf_counter()
+    for _ in range(iterations):
+        roundtrip(sender, receiver, array)
+    latency = (time.perf_counter() - start_time) / iterations
+
+    # Allocations of a single message
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    result = roundtrip(sender, receiver, array)
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    stats = after.compare_to(before, "lineno")
+    num_blocks = sum(stat.count_diff for stat in stats if stat.count_diff > 0)
+    num_bytes = sum(stat.size_diff for stat in stats if stat.size_diff > 0)
+
+    assert np.array_equal(result, array)
+    return latency, num_blocks, num_bytes
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--iterations", type=int, default=10000)
+    args = parser.parse_args()
+
+    context = zmq.Context()
+    sender = context.socket(zmq.PAIR)
+    sender.bind("inproc://keypoint_benchmark")
+    receiver = context.socket(zmq.PAIR)
+    receiver.connect("inproc://keypoint_benchmark")
+
+    print("{:<24}{:<10}{:>14}{:>14}{:>14}".format("payload", "format", "us/msg", "blocks", "bytes"))
+    for name, array in PAYLOADS.items():
+        for format_name, roundtrip in [("pickle", pickle_roundtrip), ("framed", framed_roundtrip)]:
+            latency, num_blocks, num_bytes = measure(
+                roundtrip, sender, receiver, array, args.iterations
+            )
+            print(
+                "{:<24}{:<10}{:>14.2f}{:>14}{:>14}".format(
+                    name, format_name, latency * 1e6, num_blocks, num_bytes
+                )
+            )
+
+    sender.close()
+    receiver.close()
+    context.term()
+
+
+if __name__ == "__main__":
+    main()
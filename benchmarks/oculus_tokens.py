@@ -0,0 +1,90 @@
+"""
+Compares the old Oculus keypoint token parsing (decode, split and float() per value into a
+list) with parse_keypoint_token, alone and with the publisher encoding and the keypoint
+transform decoding that follow it. Uses tokens recorded from the headset, one per line, or
+synthetic tokens with the same format.
+
+    python benchmarks/oculus_tokens.py --iterations 20000
+    python benchmarks/oculus_tokens.py --tokens recorded_tokens.txt
+"""
+
+import argparse
+import time
+
+import numpy as np
+
+from openteach.constants import OCULUS_NUM_KEYPOINTS
+from openteach.utils.network import decode_keypoints, encode_keypoints, parse_keypoint_token
+
+
+def synthetic_tokens(num_tokens):
+    rng = np.random.default_rng(0)
+    tokens = []
+    for idx in range(num_tokens):
+        hand_type = "absolute" if idx % 2 == 0 else "relative"
+        vectors = rng.normal(0, 0.2, (OCULUS_NUM_KEYPOINTS, 3))
+        tokens.append(
+            "{}:{}".format(
+                hand_type,
+                "|".join(
+                    ",".join("{:.6f}".format(value) for value in vector) for vector in vectors
+                ),
+            ).encode()
+        )
+    return tokens
+
+
+def old_parse(token):
+    data = token.decode().strip()
+    keypoint_vals = [0] if data.startswith("absolute") else [1]
+    for vector_str in data.split(":")[1].strip().split("|"):
+        for float_str in vector_str.split(",")[:3]:
+            keypoint_vals.append(float(float_str))
+    return keypoint_vals
+
+
+def detector_to_transform(parse_function, token):
+    # Detector publish and keypoint transform receive, without the sockets
+    header, payload = encode_keypoints(parse_function(token))
+    data = decode_keypoints(header, memoryview(payload))
+    return np.asanyarray(data[1:]).reshape(-1, 3)
+
+
+def time_function(function, tokens, iterations):
+    start_time = time.perf_counter()
+    for idx in range(iterations):
+        function(tokens[idx % len(tokens)])
+    return (time.perf_counter() - start_time) / iterations * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--iterations", type=int, default=20000)
+    parser.add_argument("--tokens", default=None, help="File with one recorded token per line")
+    args = parser.parse_args()
+
+    if args.tokens is None:
+        tokens = synthetic_tokens(100)
+    else:
+        with open(args.tokens, "rb") as file:
+            tokens = [line.strip() for line in file if line.strip()]
+
+    for token in tokens:
+        assert np.allclose(old_parse(token), parse_keypoint_token(token), atol=1e-6)
+
+    print("Tokens: {} ({} bytes on average)".format(len(tokens), np.mean([len(t) for t in tokens])))
+    print("{:<32}{:>12}{:>12}".format("", "old (us)", "new (us)"))
+    old_time = time_function(old_parse, tokens, args.iterations)
+    new_time = time_function(parse_keypoint_token, tokens, args.iterations)
+    print("{:<32}{:>12.2f}{:>12.2f}".format("parse", old_time, new_time))
+    old_time = time_function(
+        lambda token: detector_to_transform(old_parse, token), tokens, args.iterations
+    )
+    new_time = time_function(
+        lambda token: detector_to_transform(parse_keypoint_token, token), tokens, args.iterations
+    )
+    print("{:<32}{:>12.2f}{:>12.2f}".format("parse + publish + receive", old_time, new_time))
+
+
+if __name__ == "__main__":
+    main()
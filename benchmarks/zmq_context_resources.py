@@ -0,0 +1,90 @@
+"""
+Counts the threads and file descriptors of a process after opening the sockets of an operator
+(like ULite6ArmOperator: 3 subscribers and 3 publishers) with one context per socket and with
+the shared process context. Linux only, reads /proc/self.
+
+    python benchmarks/zmq_context_resources.py --num-operators 4
+"""
+
+import argparse
+import os
+import time
+
+import zmq
+
+from openteach.utils.network import (
+    ZMQKeypointPublisher,
+    ZMQKeypointSubscriber,
+    close_zmq_context,
+)
+
+BASE_PORT = 18000
+
+
+def count_resources():
+    return len(os.listdir("/proc/self/task")), len(os.listdir("/proc/self/fd"))
+
+
+def open_per_socket_contexts(num_operators):
+    sockets = []
+    for idx in range(num_operators):
+        for offset in range(3):
+            context = zmq.Context()
+            socket = context.socket(zmq.PUB)
+            socket.bind("tcp://127.0.0.1:{}".format(BASE_PORT + 3 * idx + offset))
+            sockets.append((context, socket))
+            context = zmq.Context()
+            socket = context.socket(zmq.SUB)
+            socket.connect("tcp://127.0.0.1:{}".format(BASE_PORT + 3 * idx + offset))
+            sockets.append((context, socket))
+    return sockets
+
+
+def open_shared_context(num_operators):
+    components = []
+    for idx in range(num_operators):
+        for offset in range(3):
+            port = BASE_PORT + 3 * idx + offset
+            components.append(ZMQKeypointPublisher(host="127.0.0.1", port=port))
+            components.append(ZMQKeypointSubscriber(host="127.0.0.1", port=port, topic="joint"))
+    return components
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--num-operators", type=int, default=1)
+    args = parser.parse_args()
+
+    base_threads, base_fds = count_resources()
+    print("Baseline: {} threads, {} fds".format(base_threads, base_fds))
+
+    start_time = time.perf_counter()
+    sockets = open_per_socket_contexts(args.num_operators)
+    setup_time = time.perf_counter() - start_time
+    threads, fds = count_resources()
+    print(
+        "Context per socket: +{} threads, +{} fds, {:.1f} ms setup".format(
+            threads - base_threads, fds - base_fds, setup_time * 1e3
+        )
+    )
+    for context, socket in sockets:
+        socket.close(linger=0)
+        context.term()
+
+    base_threads, base_fds = count_resources()
+    start_time = time.perf_counter()
+    components = open_shared_context(args.num_operators)
+    setup_time = time.perf_counter() - start_time
+    threads, fds = count_resources()
+    print(
+        "Shared context: +{} threads, +{} fds, {:.1f} ms setup".format(
+            threads - base_threads, fds - base_fds, setup_time * 1e3
+        )
+    )
+    for component in components:
+        component.socket.close(linger=0)
+    close_zmq_context()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,12 @@
 from abc import ABC, abstractmethod
 
+from openteach.utils.metrics import NULL_METRICS, create_component_metrics
+
 
 class Component(ABC):
+    # Loop instrumentation, replaced when the component starts if the metrics are enabled
+    metrics = NULL_METRICS
+
     @abstractmethod
     def stream(self):
         raise NotImplementedError()
@@ -10,3 +15,5 @@ class Component(ABC):
         print("***************************************************************")
         print("     Starting {} component".format(component_name))
         print("***************************************************************")
+        if self.metrics is NULL_METRICS:
+            self.metrics = create_component_metrics(component_name)
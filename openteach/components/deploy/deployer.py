@@ -5,8 +5,8 @@ import hydra
 import numpy as np
 
 from openteach.components import Component
-from openteach.constants import DEPLOY_FREQ, VR_FREQ
-from openteach.utils.network import create_response_socket
+from openteach.constants import DEPLOY_FREQ, VR_FREQ, XELA_SENSOR_TOPIC
+from openteach.utils.network import ZMQSensorStateSubscriber, create_response_socket
 from openteach.utils.timer import FrequencyTimer
 
 
@@ -33,10 +33,27 @@ class DeployServer(Component):
         for robot in robot_controllers:
             self._robots[robot.name] = robot
 
+    def _start_sensor_component(self, sensor_configs):
+        component = hydra.utils.instantiate(sensor_configs)
+        component.stream()
+
     def _init_sensor_subscribers(self):
-        xela_controllers = hydra.utils.instantiate(self.configs.robot.xela_controllers)
+        # The sensor is read and published by its own process, the server keeps its latest state
+        # instead of reading the device on every request. The process is stopped with the server.
+        self.sensor_processes = []
+        for controller_config in self.configs.robot.xela_controllers:  # There is only 1 controller
+            process = Process(
+                target=self._start_sensor_component, args=(controller_config,), daemon=True
+            )
+            process.start()
+            self.sensor_processes.append(process)
+
         self._sensors = dict()
-        self._sensors["xela"] = xela_controllers[0]  # There is only 1 controller
+        self._sensors["xela"] = ZMQSensorStateSubscriber(
+            host=self.configs.host_address,
+            port=self.configs.xela_sensor_port,
+            topic=XELA_SENSOR_TOPIC,
+        )
 
     def _perform_robot_action(self, robot_action_dict):
         try:
@@ -89,7 +106,7 @@ class DeployServer(Component):
         for sensor_name in self._sensors.keys():
             data[sensor_name] = self._sensors[
                 sensor_name
-            ].get_sensor_state()  # For xela this will be dict {sensor_values: [...], timestamp: [...]}
+            ].get_sensor_state()  # For xela this will be dict {palm_sensor_values: [...], ..., timestamp}
 
         return data
 
@@ -149,3 +166,9 @@ class DeployServer(Component):
         # self.visualizer_process.join()
         print("Closing robot deployer component.")
         self.deployment_socket.close()
+
+        # The sensor stream only stops on a keyboard interrupt
+        if self.configs.use_sensor:
+            for process in self.sensor_processes:
+                process.terminate()
+                process.join()
@@ -1,17 +1,73 @@
+import time
+
+import numpy as np
+import zmq
+
 from openteach.components import Component
 from openteach.constants import (
     ARM_HIGH_RESOLUTION,
     ARM_LOW_RESOLUTION,
     ARM_TELEOP_CONT,
     ARM_TELEOP_STOP,
-    VR_FREQ,
+    VR_INPUT_STALE_TIME,
+    VR_POLL_TIMEOUT,
 )
 from openteach.utils.network import (
     ZMQButtonFeedbackSubscriber,
     ZMQKeypointPublisher,
     create_pull_socket,
+    parse_keypoint_token,
 )
-from openteach.utils.timer import FrequencyTimer
+
+
+class VRInputPoller(object):
+    """
+    Waits on the input sockets of a VR detector with a single poller and returns the latest
+    message of every input that is ready, so that an input that stops sending does not stall the
+    others. Reports the inputs that go without a message for more than stale_time seconds and
+    the ones that come back, and counts the times every input went stale in the metrics.
+    """
+
+    def __init__(self, sockets, metrics, stale_time=VR_INPUT_STALE_TIME):
+        self._metrics = metrics
+        self._stale_time = stale_time
+        self._names = dict()
+        self._poller = zmq.Poller()
+        for name, socket in sockets.items():
+            self._names[socket] = name
+            self._poller.register(socket, zmq.POLLIN)
+
+        # Inputs count as stale until their first message
+        self._last_times = {name: -np.inf for name in sockets}
+        self._stale = {name: True for name in sockets}
+
+    def poll(self, timeout=VR_POLL_TIMEOUT):
+        messages = dict()
+        for socket, _ in self._poller.poll(timeout):
+            # The sockets keep only their latest message
+            messages[self._names[socket]] = socket.recv(zmq.NOBLOCK)
+
+        current_time = time.monotonic()
+        for name in messages:
+            self._last_times[name] = current_time
+        self._update_staleness(current_time)
+        return messages
+
+    def _update_staleness(self, current_time):
+        for name, last_time in self._last_times.items():
+            stale = current_time - last_time > self._stale_time
+            if stale != self._stale[name]:
+                self._stale[name] = stale
+                if stale:
+                    self._metrics.count("stale_" + name)
+                    print("VR input {} stopped sending.".format(name))
+                else:
+                    print("VR input {} is sending.".format(name))
+
+    def get_ages(self):
+        # Seconds since the last message of every input
+        current_time = time.monotonic()
+        return {name: current_time - last_time for name, last_time in self._last_times.items()}
 
 
 class OculusVRHandDetector(Component):
@@ -38,26 +94,20 @@ class OculusVRHandDetector(Component):
         self.button_socket_publisher = ZMQKeypointPublisher(host=host, port=button_publish_port)
         # Socket For Teleop Reset
         self.pause_info_publisher = ZMQKeypointPublisher(host=host, port=teleop_reset_publish_port)
-        self.timer = FrequencyTimer(VR_FREQ)
-
-    # Function to process the data token received from the VR
-    def _process_data_token(self, data_token):
-        return data_token.decode().strip()
+        # Waiting on the three inputs at once, so that one input stopping does not hold the others
+        self.input_poller = VRInputPoller(
+            dict(
+                keypoints=self.raw_keypoint_socket,
+                button=self.button_keypoint_socket,
+                pause=self.teleop_reset_socket,
+            ),
+            self.metrics,
+        )
 
     # Function to Extract the Keypoints from the String Token sent by the VR
     def _extract_data_from_token(self, token):
-        data = self._process_data_token(token)
-        information = dict()
-        keypoint_vals = [0] if data.startswith("absolute") else [1]
         # Data is in the format <hand>:x,y,z|x,y,z|x,y,z
-        vector_strings = data.split(":")[1].strip().split("|")
-        for vector_str in vector_strings:
-            vector_vals = vector_str.split(",")
-            for float_str in vector_vals[:3]:
-                keypoint_vals.append(float(float_str))
-
-        information["keypoints"] = keypoint_vals
-        return information
+        return dict(keypoints=parse_keypoint_token(token))
 
     # Function to Publish the transformed Keypoints
     def _publish_data(self, keypoint_dict):
@@ -75,40 +125,55 @@ class OculusVRHandDetector(Component):
     def _publish_pause_data(self, pause_status):
         self.pause_info_publisher.pub_keypoints(keypoint_array=pause_status, topic_name="pause")
 
+    def _get_button_feedback(self, button_feedback):
+        # Analyzing the resolution based on Button Feedback
+        if button_feedback == b"Low":
+            return ARM_LOW_RESOLUTION
+        return ARM_HIGH_RESOLUTION
+
+    def _get_pause_status(self, pause_status):
+        # Analyzing the Teleop Reset Status
+        if pause_status == b"Low":
+            return ARM_TELEOP_STOP
+        return ARM_TELEOP_CONT
+
     # Function to Stream the Keypoints
     def stream(self):
+        # Last known button and pause states, published with every keypoint message so that the
+        # operators keep receiving them when the headset does not send them
+        button_feedback_num, pause_status = None, None
         while True:
             try:
-                self.timer.start_loop()
-                # Getting the raw keypoints
-                raw_keypoints = self.raw_keypoint_socket.recv()
-                # Getting the button feedback
-                button_feedback = self.button_keypoint_socket.recv()
-                # Getting the Teleop Reset Status
-                pause_status = self.teleop_reset_socket.recv()
-                # Analyzing the resolution based on Button Feedback
-                if button_feedback == b"Low":
-                    button_feedback_num = ARM_LOW_RESOLUTION
-                else:
-                    button_feedback_num = ARM_HIGH_RESOLUTION
-                # Analyzing the Teleop Reset Status
-                if pause_status == b"Low":
-                    pause_status = ARM_TELEOP_STOP
-                else:
-                    pause_status = ARM_TELEOP_CONT
-                # Processing the keypoints and publishing them
-                keypoint_dict = self._extract_data_from_token(raw_keypoints)
-                # Publish Data
-                self._publish_data(keypoint_dict)
-                # Publish Button Data
-                self._publish_button_data(button_feedback_num)
-                # Publish Pause Data
-                self._publish_pause_data(pause_status)
-                self.timer.end_loop()
-            except:
+                with self.metrics.span("recv"):
+                    messages = self.input_poller.poll()
+                if len(messages) == 0:
+                    continue
+
+                if "button" in messages:
+                    button_feedback_num = self._get_button_feedback(messages["button"])
+                if "pause" in messages:
+                    pause_status = self._get_pause_status(messages["pause"])
+
+                # Processing the keypoints as soon as they arrive
+                keypoint_dict = None
+                if "keypoints" in messages:
+                    with self.metrics.span("compute"):
+                        keypoint_dict = self._extract_data_from_token(messages["keypoints"])
+
+                with self.metrics.span("publish"):
+                    if keypoint_dict is not None:
+                        self._publish_data(keypoint_dict)
+                    if button_feedback_num is not None:
+                        self._publish_button_data(button_feedback_num)
+                    if pause_status is not None:
+                        self._publish_pause_data(pause_status)
+                self.metrics.end_loop()
+            except KeyboardInterrupt:
                 break
 
         self.raw_keypoint_socket.close()
+        self.button_keypoint_socket.close()
+        self.teleop_reset_socket.close()
         self.hand_keypoint_publisher.stop()
 
         print("Stopping the oculus keypoint extraction process.")
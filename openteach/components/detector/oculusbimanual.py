@@ -6,10 +6,14 @@ from openteach.constants import (
     ARM_TELEOP_STOP,
     GRIPPER_CLOSE,
     GRIPPER_OPEN,
-    VR_FREQ,
 )
-from openteach.utils.network import ZMQKeypointPublisher, create_pull_socket
-from openteach.utils.timer import FrequencyTimer
+from openteach.utils.network import (
+    ZMQKeypointPublisher,
+    create_pull_socket,
+    parse_keypoint_token,
+)
+
+from .oculus import VRInputPoller
 
 
 # This class is used to detect the hand keypoints from the VR and publish them.
@@ -36,27 +40,20 @@ class OculusVRTwoHandDetector(Component):
 
         # Publisher socket for button feedback
         self.button_socket_publisher = ZMQKeypointPublisher(host=host, port=button_publish_port)
-        self.timer = FrequencyTimer(VR_FREQ)
-
-    # Function to process the data token received from the VR
-    def _process_data_token(self, data_token):
-        return data_token.decode().strip()
+        # Waiting on both hands and the button at once
+        self.input_poller = VRInputPoller(
+            dict(
+                right=self.raw_keypoint_right_socket,
+                left=self.raw_keypoint_left_socket,
+                button=self.button_keypoint_socket,
+            ),
+            self.metrics,
+        )
 
     # Function to Extract the Keypoints from the String Token sent by the VR
     def _extract_data_from_token(self, token):
-        data = self._process_data_token(token)
-        information = dict()
-        keypoint_vals = [0] if data.startswith("absolute") else [1]
-
         # Data is in the format <hand>:x,y,z|x,y,z|x,y,z
-        vector_strings = data.split(":")[1].strip().split("|")
-        for vector_str in vector_strings:
-            vector_vals = vector_str.split(",")
-            for float_str in vector_vals[:3]:
-                keypoint_vals.append(float(float_str))
-
-        information["keypoints"] = keypoint_vals
-        return information
+        return dict(keypoints=parse_keypoint_token(token))
 
     # Function to Publish the right hand transformed Keypoints
     def _publish_right_data(self, keypoint_dict):
@@ -78,32 +75,36 @@ class OculusVRTwoHandDetector(Component):
 
     # Function to publish the left/right hand keypoints and button Feedback
     def stream(self):
+        # Last known button state, published with every keypoint message
+        button_feedback_num = None
         while True:
             try:
-                self.timer.start_loop()
-
-                # Getting the raw keypoints
-                raw_right_keypoints = self.raw_keypoint_right_socket.recv()
-                raw_left_keypoints = self.raw_keypoint_left_socket.recv()
-                button_feedback = self.button_keypoint_socket.recv()
-
-                if button_feedback == b"Low":
-                    button_feedback_num = ARM_LOW_RESOLUTION
-                else:
-                    button_feedback_num = ARM_HIGH_RESOLUTION
-
-                # Processing the keypoints and publishing them
-                keypoint_right_dict = self._extract_data_from_token(raw_right_keypoints)
-                keypoint_left_dict = self._extract_data_from_token(raw_left_keypoints)
-                self._publish_right_data(keypoint_right_dict)
-                self._publish_left_data(keypoint_left_dict)
-                self._publish_button_data(button_feedback_num)
-                self.timer.end_loop()
+                with self.metrics.span("recv"):
+                    messages = self.input_poller.poll()
+                if len(messages) == 0:
+                    continue
+
+                if "button" in messages:
+                    if messages["button"] == b"Low":
+                        button_feedback_num = ARM_LOW_RESOLUTION
+                    else:
+                        button_feedback_num = ARM_HIGH_RESOLUTION
+
+                # Processing and publishing every hand as soon as its keypoints arrive
+                with self.metrics.span("publish"):
+                    if "right" in messages:
+                        self._publish_right_data(self._extract_data_from_token(messages["right"]))
+                    if "left" in messages:
+                        self._publish_left_data(self._extract_data_from_token(messages["left"]))
+                    if button_feedback_num is not None:
+                        self._publish_button_data(button_feedback_num)
+                self.metrics.end_loop()
 
             except KeyboardInterrupt:
                 break
 
         self.raw_keypoint_right_socket.close()
         self.raw_keypoint_left_socket.close()
+        self.button_keypoint_socket.close()
         self.hand_keypoint_publisher.stop()
         print("Stopping the oculus keypoint extraction process.")
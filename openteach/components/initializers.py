@@ -5,6 +5,9 @@ from multiprocessing import Process
 import hydra
 
 from openteach.constants import *
+from openteach.utils.hdf5 import HDF5_FLUSH_EVERY
+from openteach.utils.metrics import METRICS_INTERVAL, set_metrics_address
+from openteach.utils.network import ZMQ_IO_THREADS, set_zmq_io_threads
 
 from .recorders.image import DepthImageRecorder, FishEyeImageRecorder, RGBImageRecorder
 from .recorders.robot_state import RobotInformationRecord
@@ -17,6 +20,15 @@ class ProcessInstantiator(ABC):
     def __init__(self, configs):
         self.configs = configs
         self.processes = []
+        # The component processes are forked from here and inherit the setting
+        set_zmq_io_threads(configs.get("zmq_io_threads", ZMQ_IO_THREADS))
+        # Loop metrics of the components, displayed by the monitor
+        if configs.get("enable_metrics", False):
+            set_metrics_address(
+                configs.host_address,
+                configs.metrics_port,
+                configs.get("metrics_interval", METRICS_INTERVAL),
+            )
 
     def _start_component(self, configs):
         raise NotImplementedError("Function not implemented!")
@@ -46,6 +58,9 @@ class RealsenseCameras(ProcessInstantiator):
             cam_id=cam_idx + 1,
             cam_configs=self.configs.cam_configs,
             stream_oculus=True if self.configs.oculus_cam == cam_idx else False,
+            rgb_codec=self.configs.get("rgb_codecs", dict()).get(
+                cam_idx, self.configs.cam_configs.get("rgb_codec")
+            ),
         )
         component.stream()
 
@@ -140,11 +155,11 @@ class TeleOperator(ProcessInstantiator):
     def _init_visualizers(self):
         for visualizer_config in self.configs.robot.visualizers:
             self.processes.append(Process(target=self._start_component, args=(visualizer_config,)))
-        # XELA visualizer
+        # XELA sensors, read by one process and published to the visualizer and the recorder
         if self.configs.run_xela:
-            for visualizer_config in self.configs.xela_visualizers:
+            for controller_config in self.configs.robot.xela_controllers:
                 self.processes.append(
-                    Process(target=self._start_component, args=(visualizer_config,))
+                    Process(target=self._start_component, args=(controller_config,))
                 )
 
     # Function to start the operator
@@ -200,6 +215,7 @@ class Collector(ProcessInstantiator):
                 image_stream_port=self.configs.cam_port_offset + cam_idx,
                 storage_path=self._storage_path,
                 filename="cam_{}_rgb_video".format(cam_idx),
+                record_format=self.configs.get("rgb_record_format", "avi"),
             )
         else:
             print("Reaching correct function")
@@ -209,6 +225,7 @@ class Collector(ProcessInstantiator):
                 storage_path=self._storage_path,
                 filename="cam_{}_rgb_video".format(cam_idx),
                 sim=True,
+                record_format=self.configs.get("rgb_record_format", "avi"),
             )
         component.stream()
 
@@ -220,6 +237,8 @@ class Collector(ProcessInstantiator):
                 image_stream_port=self.configs.cam_port_offset + cam_idx + DEPTH_PORT_OFFSET,
                 storage_path=self._storage_path,
                 filename="cam_{}_depth".format(cam_idx),
+                compression=self.configs.get("depth_compression", "lzf"),
+                compression_level=self.configs.get("depth_compression_level"),
             )
         else:
             component = DepthImageRecorder(
@@ -227,6 +246,8 @@ class Collector(ProcessInstantiator):
                 image_stream_port=self.configs.sim_image_port + cam_idx + DEPTH_PORT_OFFSET,
                 storage_path=self._storage_path,
                 filename="cam_{}_depth".format(cam_idx),
+                compression=self.configs.get("depth_compression", "lzf"),
+                compression_level=self.configs.get("depth_compression_level"),
             )
         component.stream()
 
@@ -253,22 +274,22 @@ class Collector(ProcessInstantiator):
                 Process(target=self._start_sim_component, args=(port_configs[0], key))
             )
 
-    # Function to start the xela sensor recorders
-    def _start_xela_component(self, controller_config):
+    # Function to start the xela sensor recorder
+    def _start_xela_component(self):
         component = XelaSensorRecorder(
-            controller_configs=controller_config, storage_path=self._storage_path
+            host=self.configs.host_address,
+            sensor_port=self.configs.xela_sensor_port,
+            storage_path=self._storage_path,
         )
         component.stream()
 
     # Function to start the sensor recorders
     def _init_sensor_recorders(self):
         """
-        For the XELA sensors or any other sensors
+        For the XELA sensors or any other sensors. The sensors are read and published by the
+        teleoperation processes (run_xela), the recorder subscribes to their stream.
         """
-        for controller_config in self.configs.robot.xela_controllers:
-            self.processes.append(
-                Process(target=self._start_xela_component, args=(controller_config,))
-            )
+        self.processes.append(Process(target=self._start_xela_component))
 
     # Function to start the fish eye recorders
     def _start_fish_eye_component(self, cam_idx):
@@ -286,6 +307,7 @@ class Collector(ProcessInstantiator):
             robot_configs=robot_configs,
             recorder_function_key=recorder_function_key,
             storage_path=self._storage_path,
+            flush_every=self.configs.get("record_flush_every", HDF5_FLUSH_EVERY),
         )
 
         component.stream()
@@ -193,6 +193,7 @@ class ULite6ArmOperator(Operator):
             if data is not None:
                 break
         if data is None:
+            self.metrics.count("hand_frame_none")
             return None
         return np.asanyarray(data).reshape(4, 3)
 
@@ -378,12 +379,15 @@ class ULite6ArmOperator(Operator):
 
         # We save the states here during teleoperation as saving directly at 90Hz seems to be too fast for XArm.
         self.gripper_publisher.pub_keypoints(self.gripper_correct_state, "gripper_right")
-        position = self.robot.get_cartesian_position()
-        joint_position = self.robot.get_joint_position()
-        self.cartesian_publisher.pub_keypoints(position, "cartesian")
-        self.joint_publisher.pub_keypoints(joint_position, "joint")
-        self.cartesian_command_publisher.pub_keypoints(final_pose, "cartesian")
+        with self.metrics.span("robot_state"):
+            position = self.robot.get_cartesian_position()
+            joint_position = self.robot.get_joint_position()
+        with self.metrics.span("publish"):
+            self.cartesian_publisher.pub_keypoints(position, "cartesian")
+            self.joint_publisher.pub_keypoints(joint_position, "joint")
+            self.cartesian_command_publisher.pub_keypoints(final_pose, "cartesian")
 
         if self.arm_teleop_state == ARM_TELEOP_CONT and gripper_flag is False:
             # print("Final Pose processed:", final_pose)
-            self.robot.arm_control(final_pose)
+            with self.metrics.span("robot_command"):
+                self.robot.arm_control(final_pose)
@@ -47,15 +47,21 @@ class Operator(Component, ABC):
                         self.timer.start_loop()
 
                         # Retargeting function
-                        self._apply_retargeted_angles()
+                        with self.metrics.span("retarget"):
+                            self._apply_retargeted_angles()
 
+                        self.metrics.end_loop(self.timer)
                         self.timer.end_loop()
+                    else:
+                        self.metrics.count("robot_state_none")
                 else:
                     self.timer.start_loop()
 
                     # Retargeting function
-                    self._apply_retargeted_angles()
+                    with self.metrics.span("retarget"):
+                        self._apply_retargeted_angles()
 
+                    self.metrics.end_loop(self.timer)
                     self.timer.end_loop()
 
             except KeyboardInterrupt:
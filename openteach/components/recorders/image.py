@@ -2,27 +2,41 @@ import os
 import time
 
 import cv2
-import h5py
 import numpy as np
 
 from openteach.constants import (
     CAM_FPS,
     CAM_FPS_SIM,
+    DEPTH_RECORD_FLUSH_EVERY,
     DEPTH_RECORD_FPS,
+    DEPTH_RECORD_QUEUE_SIZE,
     IMAGE_RECORD_RESOLUTION,
     IMAGE_RECORD_RESOLUTION_SIM,
+    RGB_RECORD_QUEUE_SIZE,
     VR_FREQ,
 )
 from openteach.utils.files import store_pickle_data
+from openteach.utils.hdf5 import HDF5StreamWriter
+from openteach.utils.images import IMAGE_CODEC_JPEG, JPEGCodec, decode_image
 from openteach.utils.network import ZMQCameraSubscriber
 from openteach.utils.timer import FrequencyTimer
+from openteach.utils.video import MJPEGWriter
+from openteach.utils.writer import BackgroundWriter
 
 from .recorder import Recorder
 
 
 # To record realsense streams
 class RGBImageRecorder(Recorder):
-    def __init__(self, host, image_stream_port, storage_path, filename, sim=False):
+    def __init__(
+        self,
+        host,
+        image_stream_port,
+        storage_path,
+        filename,
+        sim=False,
+        record_format="avi",
+    ):
         self.notify_component_start("RGB stream: {}".format(image_stream_port))
 
         # Subscribing to the image stream port
@@ -39,11 +53,18 @@ class RGBImageRecorder(Recorder):
 
         # Storage path for file
         self._filename = filename
-        self._recorder_file_name = os.path.join(storage_path, filename + ".avi")
+        self._record_format = record_format
+        self._recorder_file_name = os.path.join(storage_path, filename + "." + record_format)
         self._metadata_filename = os.path.join(storage_path, filename + ".metadata")
 
         # Initializing the recorder
-        if self.sim == True:
+        if self._record_format == "mjpeg":
+            # The received JPEGs are stored without decoding and encoding them again
+            self.recorder = MJPEGWriter(self._recorder_file_name)
+            self._jpeg_codec = JPEGCodec()
+        elif self._record_format != "avi":
+            raise ValueError("Unknown RGB record format: {}".format(record_format))
+        elif self.sim == True:
             self.recorder = cv2.VideoWriter(
                 self._recorder_file_name,
                 cv2.VideoWriter_fourcc(*"XVID"),
@@ -59,19 +80,41 @@ class RGBImageRecorder(Recorder):
             )
         self.timestamps = []
 
+    def _write_frame(self, frame):
+        encoded_image, image_shape, codec = frame
+        if self._record_format == "avi":
+            self.recorder.write(decode_image(encoded_image, image_shape, codec))
+        elif codec == IMAGE_CODEC_JPEG:
+            self.recorder.write(encoded_image)
+        else:
+            # Streams with other codecs are converted to keep the file a Motion JPEG
+            self.recorder.write(
+                self._jpeg_codec.encode(decode_image(encoded_image, image_shape, codec))
+            )
+
     def stream(self):
         print("Starting to record RGB frames from port: {}".format(self._image_stream_port))
 
+        # Frames are written to the video in the background
+        writer = BackgroundWriter(self._write_frame, RGB_RECORD_QUEUE_SIZE, name="rgb writer")
+
         self.num_image_frames = 0
         self.record_start_time = time.time()
 
         while True:
             try:
                 self.timer.start_loop()
-                image, timestamp = self.image_subscriber.recv_rgb_image()
-                self.recorder.write(image)
-                self.timestamps.append(timestamp)
-                self.num_image_frames += 1
+                with self.metrics.span("recv"):
+                    encoded_image, timestamp, image_shape, codec = (
+                        self.image_subscriber.recv_rgb_frame()
+                    )
+                # Only the timestamps of the frames in the video are kept
+                if writer.put((encoded_image, image_shape, codec)):
+                    self.timestamps.append(timestamp)
+                    self.num_image_frames += 1
+                else:
+                    self.metrics.count("dropped_frames")
+                self.metrics.end_loop(self.timer)
                 self.timer.end_loop()
             except KeyboardInterrupt:
                 self.record_end_time = time.time()
@@ -82,10 +125,15 @@ class RGBImageRecorder(Recorder):
 
         # Displaying statistics
         self._display_statistics(self.num_image_frames)
+        print("Waiting for {} queued RGB frames to be written...".format(writer.qsize()))
+        writer.close()
+        print("Dropped RGB frames: {}.".format(writer.num_dropped))
 
         # Saving the metadata
         self._add_metadata(self.num_image_frames)
+        self._add_writer_metadata(writer)
         self.metadata["timestamps"] = self.timestamps
+        self.metadata["record_format"] = self._record_format
         self.metadata["recorder_ip_address"] = self._host
         self.metadata["recorder_image_stream_port"] = self._image_stream_port
 
@@ -98,7 +146,15 @@ class RGBImageRecorder(Recorder):
 
 
 class DepthImageRecorder(Recorder):
-    def __init__(self, host, image_stream_port, storage_path, filename):
+    def __init__(
+        self,
+        host,
+        image_stream_port,
+        storage_path,
+        filename,
+        compression="lzf",
+        compression_level=None,
+    ):
         self.notify_component_start("Depth stream: {}".format(image_stream_port))
 
         # Subscribing to the image stream port
@@ -114,9 +170,13 @@ class DepthImageRecorder(Recorder):
         self._filename = filename
         self._recorder_file_name = os.path.join(storage_path, filename + ".h5")
 
-        # Intializing the depth data containers
-        self.depth_frames = []
-        self.timestamps = []
+        # Depth frames are compressed and written in the background, one frame per chunk
+        self._compression = compression
+        self._compression_level = compression_level
+
+    def _write_frame(self, frame):
+        depth_data, timestamp = frame
+        self._hdf5_writer.append(dict(depth_images=depth_data, timestamps=timestamp))
 
     def stream(self):
         if self.image_subscriber.recv_depth_image() is None:
@@ -124,17 +184,29 @@ class DepthImageRecorder(Recorder):
 
         print("Starting to record depth frames from port: {}".format(self._image_stream_port))
 
+        self._hdf5_writer = HDF5StreamWriter(
+            self._recorder_file_name,
+            flush_every=DEPTH_RECORD_FLUSH_EVERY,
+            dtypes=dict(depth_images=np.uint16, timestamps=np.float64),
+            compression=self._compression,
+            compression_level=self._compression_level,
+        )
+        writer = BackgroundWriter(self._write_frame, DEPTH_RECORD_QUEUE_SIZE, name="depth writer")
+
         self.num_image_frames = 0
         self.record_start_time = time.time()
 
         while True:
             try:
                 self.timer.start_loop()
-                depth_data, timestamp = self.image_subscriber.recv_depth_image()
-                self.depth_frames.append(depth_data)
-                self.timestamps.append(timestamp)
-
-                self.num_image_frames += 1
+                with self.metrics.span("recv"):
+                    depth_frame = self.image_subscriber.recv_depth_image()
+                # Only the frames queued for the file are counted
+                if writer.put(depth_frame):
+                    self.num_image_frames += 1
+                else:
+                    self.metrics.count("dropped_frames")
+                self.metrics.end_loop(self.timer)
                 self.timer.end_loop()
             except KeyboardInterrupt:
                 self.record_end_time = time.time()
@@ -145,30 +217,17 @@ class DepthImageRecorder(Recorder):
 
         # Displaying statistics
         self._display_statistics(self.num_image_frames)
+        print("Waiting for {} queued depth frames to be written...".format(writer.qsize()))
+        writer.close()
+        print("Dropped depth frames: {}.".format(writer.num_dropped))
 
         # Saving the metadata
         self._add_metadata(self.num_image_frames)
         self.metadata["recorder_ip_address"] = self._host
         self.metadata["recorder_image_stream_port"] = self._image_stream_port
+        self._add_writer_metadata(writer)
 
-        # Writing to dataset - hdf5 is faster and compresses more than blosc zstd with clevel 9
-        print("Compressing depth data...")
-        with h5py.File(self._recorder_file_name, "w") as file:
-            stacked_frames = np.array(self.depth_frames, dtype=np.uint16)
-            file.create_dataset(
-                "depth_images",
-                data=stacked_frames,
-                compression="gzip",
-                compression_opts=6,
-            )
-
-            timestamps = np.array(self.timestamps, np.float64)
-            file.create_dataset(
-                "timestamps", data=timestamps, compression="gzip", compression_opts=6
-            )
-
-            file.update(self.metadata)
-
+        self._hdf5_writer.close(self.metadata)
         print("Saved compressed depth data in {}.".format(self._recorder_file_name))
 
 
@@ -20,3 +20,8 @@ class Recorder(Component):
                 datapoints / (self.record_end_time - self.record_start_time)
             )
         )
+
+    def _add_writer_metadata(self, writer):
+        # Queue and write time statistics of the background writer
+        for key, value in writer.get_statistics().items():
+            self.metadata["writer_{}".format(key)] = value
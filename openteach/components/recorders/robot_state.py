@@ -1,11 +1,11 @@
 import os
 import time
 
-import h5py
 import hydra
 import numpy as np
 
 from openteach.constants import *
+from openteach.utils.hdf5 import HDF5_FLUSH_EVERY, HDF5StreamWriter
 from openteach.utils.timer import FrequencyTimer
 
 from .recorder import Recorder
@@ -13,7 +13,13 @@ from .recorder import Recorder
 
 # To record robot information
 class RobotInformationRecord(Recorder):
-    def __init__(self, robot_configs, recorder_function_key, storage_path):
+    def __init__(
+        self,
+        robot_configs,
+        recorder_function_key,
+        storage_path,
+        flush_every=HDF5_FLUSH_EVERY,
+    ):
         # Data function and attributes
         self.robot = hydra.utils.instantiate(robot_configs, record_type=recorder_function_key)
         self.keypoint_function = self.robot.recorder_functions[recorder_function_key]
@@ -26,8 +32,8 @@ class RobotInformationRecord(Recorder):
         self.notify_component_start("{}".format(self._filename))
         self._recorder_file_name = os.path.join(storage_path, self._filename + ".h5")
 
-        # Initializing data containers
-        self.robot_information = dict()
+        # Samples are written to the file every flush_every datapoints
+        self._flush_every = flush_every
 
     def stream(self):
         # Checking if the keypoint port is active
@@ -36,22 +42,25 @@ class RobotInformationRecord(Recorder):
             continue
         print("Starting to record keypoints to store in {}.".format(self._recorder_file_name))
 
+        writer = HDF5StreamWriter(
+            self._recorder_file_name,
+            flush_every=self._flush_every,
+            dtypes=dict(timestamps=np.float64),
+        )
+
         self.num_datapoints = 0
         self.record_start_time = time.time()
 
         while True:
             self.timer.start_loop()
             try:
-                datapoint = self.keypoint_function()
-                # print(datapoint.keys())
-                for attribute in datapoint.keys():
-                    if attribute not in self.robot_information.keys():
-                        self.robot_information[attribute] = [datapoint[attribute]]
-                        continue
-
-                    self.robot_information[attribute].append(datapoint[attribute])
+                with self.metrics.span("robot_io"):
+                    datapoint = self.keypoint_function()
+                with self.metrics.span("write"):
+                    writer.append({key + "s": value for key, value in datapoint.items()})
 
                 self.num_datapoints += 1
+                self.metrics.end_loop(self.timer)
                 self.timer.end_loop()
             except KeyboardInterrupt:
                 self.record_end_time = time.time()
@@ -63,32 +72,6 @@ class RobotInformationRecord(Recorder):
         # Saving the metadata
         self._add_metadata(self.num_datapoints)
 
-        # Writing to dataset
-        print("Compressing keypoint data...")
-        with h5py.File(self._recorder_file_name, "w") as file:
-            # Main data
-            for key in self.robot_information.keys():
-                if key != "timestamp":
-                    self.robot_information[key] = np.array(
-                        self.robot_information[key], dtype=np.float32
-                    )
-                    file.create_dataset(
-                        key + "s",
-                        data=self.robot_information[key],
-                        compression="gzip",
-                        compression_opts=6,
-                    )
-                else:
-                    self.robot_information["timestamp"] = np.array(
-                        self.robot_information["timestamp"], dtype=np.float64
-                    )
-                    file.create_dataset(
-                        "timestamps",
-                        data=self.robot_information["timestamp"],
-                        compression="gzip",
-                        compression_opts=6,
-                    )
-
-            # Other metadata
-            file.update(self.metadata)
+        # Writing the remaining datapoints and the metadata
+        writer.close(self.metadata)
         print("Saved keypoint data in {}.".format(self._recorder_file_name))
@@ -1,55 +1,68 @@
 import os
 import time
 
-import h5py
-import hydra
 import numpy as np
 
 from openteach.constants import *
-from openteach.utils.timer import FrequencyTimer
+from openteach.utils.hdf5 import HDF5_FLUSH_EVERY, HDF5StreamWriter
+from openteach.utils.network import ZMQSensorStateSubscriber
 
 from .recorder import Recorder
 
 
 class XelaSensorRecorder(Recorder):
-    def __init__(self, controller_configs, storage_path):
-        # Initialize the sensor controllers
-        self.sensor = hydra.utils.instantiate(controller_configs)
-
-        # Timer
-        self.timer = FrequencyTimer(XELA_FPS)
+    def __init__(self, host, sensor_port, storage_path, flush_every=HDF5_FLUSH_EVERY):
+        # Subscribing to the readings published by the Xela sensor component
+        self.sensor = ZMQSensorStateSubscriber(host=host, port=sensor_port, topic=XELA_SENSOR_TOPIC)
 
         # Create the storage path for file
         self._filename = "touch_sensor_values"
         self.notify_component_start("{}".format(self._filename))
         self._recorder_file_name = os.path.join(storage_path, self._filename + ".h5")
 
-        # Initializing the data containers
-        self.sensor_information = dict()
+        # Samples are written to the file every flush_every datapoints
+        self._flush_every = flush_every
+
+    def _add_rate_metadata(self):
+        # Achieved rate against the rate of the sensor component
+        self.metadata["target_frequency"] = XELA_FPS
+        self.metadata["frequency_ratio"] = self.metadata["record_frequency"] / XELA_FPS
+        self.metadata["num_missed_states"] = self.sensor.num_missed_states
 
     def stream(self):
         print("Checking if XELA sensors are active...")
-        while self.sensor.get_sensor_state() is None:
-            continue
+        sensor_state = self.sensor.recv_next_state()
 
         print("Starting to record xela sensor values in {}".format(self._recorder_file_name))
 
+        # The readings as float32 and the timestamps as float64, one row per state
+        writer = HDF5StreamWriter(
+            self._recorder_file_name,
+            flush_every=self._flush_every,
+            dtypes=dict(timestamps=np.float64),
+            compression="gzip",
+            compression_level=6,
+        )
+
         self.num_datapoints = 0
         self.record_start_time = time.time()
 
         while True:
             try:
-                self.timer.start_loop()
-                sensor_state = self.sensor.get_sensor_state()  # Has sensor_values and timestamps
-                for attribute in sensor_state.keys():
-                    if attribute not in self.sensor_information.keys():
-                        self.sensor_information[attribute] = [sensor_state[attribute]]
-                        continue
-
-                    self.sensor_information[attribute].append(sensor_state[attribute])
-
+                # Has the sensor values and the timestamp
+                with self.metrics.span("write"):
+                    writer.append(
+                        {
+                            "timestamps" if key == "timestamp" else key: value
+                            for key, value in sensor_state.items()
+                        }
+                    )
                 self.num_datapoints += 1
-                self.timer.end_loop()
+
+                # Every published state in order, the sensor component sets the rate
+                with self.metrics.span("recv"):
+                    sensor_state = self.sensor.recv_next_state()
+                self.metrics.end_loop()
 
             except KeyboardInterrupt:
                 self.record_end_time = time.time()
@@ -60,32 +73,9 @@ class XelaSensorRecorder(Recorder):
 
         # Saving the metadata
         self._add_metadata(self.num_datapoints)
+        self._add_rate_metadata()
+        self.sensor.stop()
 
-        # Writing to dataset
-        print("Compressing XELA sensor data...")
-        with h5py.File(self._recorder_file_name, "w") as file:
-            for key in self.sensor_information.keys():
-                if key != "timestamp":
-                    self.sensor_information[key] = np.array(
-                        self.sensor_information[key], dtype=np.float32
-                    )
-                    file.create_dataset(
-                        key,
-                        data=self.sensor_information[key],
-                        compression="gzip",
-                        compression_opts=6,
-                    )
-                else:
-                    self.sensor_information["timestamp"] = np.array(
-                        self.sensor_information["timestamp"], dtype=np.float64
-                    )
-                    file.create_dataset(
-                        "timestamps",
-                        data=self.sensor_information["timestamp"],
-                        compression="gzip",
-                        compression_opts=6,
-                    )
-
-            # Other metadata
-            file.update(self.metadata)
+        # Writing the remaining datapoints and the metadata
+        writer.close(self.metadata)
         print("Saved XELA sensor data in {}".format(self._recorder_file_name))
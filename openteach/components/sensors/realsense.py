@@ -9,7 +9,15 @@ from openteach.utils.timer import FrequencyTimer
 
 
 class RealsenseCamera(Component):
-    def __init__(self, stream_configs, cam_serial_num, cam_id, cam_configs, stream_oculus=False):
+    def __init__(
+        self,
+        stream_configs,
+        cam_serial_num,
+        cam_id,
+        cam_configs,
+        stream_oculus=False,
+        rgb_codec=None,
+    ):
         # Disabling scientific notations
         np.set_printoptions(suppress=True)
         self.cam_id = cam_id
@@ -20,7 +28,7 @@ class RealsenseCamera(Component):
 
         # Different publishers to avoid overload
         self.rgb_publisher = ZMQCameraPublisher(
-            host=stream_configs["host"], port=stream_configs["port"]
+            host=stream_configs["host"], port=stream_configs["port"], rgb_codec=rgb_codec
         )
 
         if self._stream_oculus:
@@ -120,23 +128,26 @@ class RealsenseCamera(Component):
         while True:
             # try:
             self.timer.start_loop()
-            color_image, depth_image, timestamp = self.get_rgb_depth_images()
-
-            color_image = rotate_image(color_image, self.cam_configs.rotation_angle)
-            depth_image = rotate_image(depth_image, self.cam_configs.rotation_angle)
-
-            # Publishing the rgb images
-            self.rgb_publisher.pub_rgb_image(color_image, timestamp)
-            # TODO - move the oculus publisher to a separate process - this cycle works at 40 FPS
-            if self._stream_oculus:
-                self.rgb_viz_publisher.send_image(rescale_image(color_image, 2))  # 640 * 360
-
-            # Publishing the depth images
-            self.depth_publisher.pub_depth_image(depth_image, timestamp)
-            self.depth_publisher.pub_intrinsics(
-                self.intrinsics_matrix
-            )  # Publishing inrinsics along with the depth publisher
-
+            with self.metrics.span("capture"):
+                color_image, depth_image, timestamp = self.get_rgb_depth_images()
+
+                color_image = rotate_image(color_image, self.cam_configs.rotation_angle)
+                depth_image = rotate_image(depth_image, self.cam_configs.rotation_angle)
+
+            with self.metrics.span("publish"):
+                # Publishing the rgb images
+                self.rgb_publisher.pub_rgb_image(color_image, timestamp)
+                # TODO - move the oculus publisher to a separate process - this cycle works at 40 FPS
+                if self._stream_oculus:
+                    self.rgb_viz_publisher.send_image(rescale_image(color_image, 2))  # 640 * 360
+
+                # Publishing the depth images
+                self.depth_publisher.pub_depth_image(depth_image, timestamp)
+                self.depth_publisher.pub_intrinsics(
+                    self.intrinsics_matrix
+                )  # Publishing inrinsics along with the depth publisher
+
+            self.metrics.end_loop(self.timer)
             self.timer.end_loop()
         # except KeyboardInterrupt:
         #     break
@@ -1,27 +1,165 @@
-from copy import deepcopy as copy
+import time
 
 import numpy as np
 from get_xela_values import XelaCurvedSensorControl, XelaSensorControl
 
 from openteach.components import Component
 from openteach.constants import *
+from openteach.utils.files import check_file, make_dir
+from openteach.utils.network import ZMQSensorStatePublisher
 from openteach.utils.timer import FrequencyTimer
 
 
-class XelaSensors(Component):
-    def __init__(self, init_duration):
-        self._controller = XelaSensorControl()
-        self._bias_values = np.zeros((XELA_NUM_SENSORS, XELA_NUM_TAXELS, 3))
-        self._bias_duration = init_duration  # Wait 3 seconds for finding the average
+def create_sensor_publisher(host, port):
+    # The sensors are only read by their own process when no port is given
+    if port is None:
+        return None
+    return ZMQSensorStatePublisher(host=host, port=port, topic=XELA_SENSOR_TOPIC)
+
+
+class XelaBias(object):
+    """
+    Bias of the Xela readings, the mean of num_samples readings at rest. It is stored in the
+    calibration files with the name of the sensors and the time it was computed, and loaded by
+    the next launches while it is younger than max_age seconds.
+    """
+
+    def __init__(self, sensor_name, shapes, num_samples, max_age=XELA_BIAS_MAX_AGE):
+        self.sensor_name = sensor_name
+        self.num_samples = num_samples
+        self.max_age = max_age
+        self.path = XELA_BIAS_PATH.format(sensor_name)
+        self.values = {name: np.zeros(shape) for name, shape in shapes.items()}
+        self.calibration_time = None
+
+        self._sums = {name: np.zeros(shape) for name, shape in shapes.items()}
+        self._num_added = None
+
+    @property
+    def calibrating(self):
+        return self._num_added is not None
+
+    def load(self):
+        """
+        Loads the stored bias if it belongs to these sensors and is recent enough.
+        """
+        if not self.max_age or not check_file(self.path):
+            return False
+
+        with np.load(self.path) as bias_file:
+            age = time.time() - float(bias_file["calibration_time"])
+            if str(bias_file["sensor_name"]) != self.sensor_name or age > self.max_age:
+                return False
+            for name, value in self.values.items():
+                if name not in bias_file or bias_file[name].shape != value.shape:
+                    return False
+            for name in self.values:
+                self.values[name] = bias_file[name].astype(np.float64)
+            self.calibration_time = float(bias_file["calibration_time"])
+
+        print("Using the XELA bias computed {:.0f} seconds ago.".format(age))
+        return True
+
+    def save(self):
+        make_dir(CALIBRATION_FILES_PATH)
+        np.savez(
+            self.path,
+            sensor_name=self.sensor_name,
+            calibration_time=self.calibration_time,
+            **self.values,
+        )
+
+    def start(self):
+        for sums in self._sums.values():
+            sums.fill(0)
+        self._num_added = 0
+
+    def add(self, readings):
+        # Returns True once num_samples readings were added and the bias is updated
+        for name, sums in self._sums.items():
+            np.add(sums, readings[name], out=sums)
+        self._num_added += 1
+        if self._num_added < self.num_samples:
+            return False
+
+        for name, sums in self._sums.items():
+            self.values[name] = sums / self._num_added
+        self.calibration_time = time.time()
+        self._num_added = None
+        self.save()
+        return True
+
+
+class XelaSensorStream(object):
+    """
+    Reads the Xela sensors at XELA_FPS and publishes the bias corrected states. The sensor
+    classes set controller_class, sensor_name and bias_shapes, and implement get_sensor_state
+    and _set_bias for the readings of their controller.
+    """
+
+    def __init__(
+        self,
+        init_duration,
+        host=None,
+        port=None,
+        bias_max_age=XELA_BIAS_MAX_AGE,
+        refine_bias=False,
+    ):
+        self._controller = self.controller_class()
+        self._publisher = create_sensor_publisher(host, port)
+        self._bias = XelaBias(
+            self.sensor_name,
+            self.bias_shapes,
+            num_samples=int(init_duration * XELA_FPS),  # Wait 3 seconds for finding the average
+            max_age=bias_max_age,
+        )
         self.timer = FrequencyTimer(XELA_FPS)
-        self._set_bias()
+        # The bias stored by a previous launch is used while it is recent enough, with
+        # refine_bias it is computed again from the first readings of the stream
+        if not self._bias.load():
+            self._set_bias()
+        elif refine_bias:
+            self._bias.start()
+
+    def _publish_sensor_state(self):
+        with self.metrics.span("read"):
+            xela_state = self.get_sensor_state()
+        if xela_state is None:
+            self.metrics.count("empty_states")
+        elif self._publisher is not None:
+            with self.metrics.span("publish"):
+                self._publisher.pub_state(xela_state)
+        self.metrics.end_loop(self.timer)
+
+    def stream(self):
+        # # Starting the xela stream
+        self.notify_component_start("XELA sensors")
+        print(f"Started the XELA sensor pipeline for the hand")
+
+        while True:
+            try:
+                self.timer.start_loop()
+                self._publish_sensor_state()
+                self.timer.end_loop()
+
+            except KeyboardInterrupt:
+                break
+
+        if self._publisher is not None:
+            self._publisher.stop()
+
+
+class XelaSensors(XelaSensorStream, Component):
+    controller_class = XelaSensorControl
+    sensor_name = "xela"
+    bias_shapes = dict(sensor_values=(XELA_NUM_SENSORS, XELA_NUM_TAXELS, 3))
 
     # The bias should be received for the first 2-3 seconds
     # to normalize the data accordingly
     def _set_bias(self):
-        self.notify_component_start("XELA sensors - receiving bias")
-        loop_index = 0
-        while True:
+        print("Receiving the XELA sensors bias...")
+        self._bias.start()
+        while self._bias.calibrating:
             try:
                 self.timer.start_loop()
 
@@ -33,65 +171,40 @@ class XelaSensors(Component):
                 bias_values = xela_state["sensor_values"]
                 # bias_values, _ = self.get_sensor_values()
                 if bias_values is not None:
-                    self._bias_values += bias_values
-                    loop_index += 1
+                    self._bias.add(dict(sensor_values=bias_values))
                 self.timer.end_loop()
 
-                if loop_index >= self._bias_duration * XELA_FPS:
-                    self._bias_values /= loop_index
-                    # self.debug_component('found bias_values: {}'.format(self._bias_values))
-                    break
-
             except KeyboardInterrupt:
                 break
 
-        # self._bias_values /= loop_index # Take the average
-
     def get_sensor_state(self):
         xela_state = self._controller.get_sensor_state()
         if xela_state is not None:
+            if self._bias.calibrating and self._bias.add(xela_state):
+                print("Updated the XELA bias.")
             normalized_state = dict(
-                sensor_values=xela_state["sensor_values"] - self._bias_values,
+                sensor_values=xela_state["sensor_values"] - self._bias.values["sensor_values"],
                 timestamp=xela_state["timestamp"],
             )
             return normalized_state
         return xela_state  # NOTE: This can be None as well
 
-    def stream(self):
-        # # Starting the xela stream
-        self.notify_component_start("XELA sensors")
-        print(f"Started the XELA sensor pipeline for the hand")
-
-        while True:
-            try:
-                self.timer.start_loop()
-
-                xela_state = self.get_sensor_state()
-
-                self.timer.end_loop()
-
-            except KeyboardInterrupt:
-                break
-
 
-class XelaCurvedSensors(Component):
-    def __init__(self, init_duration):
-        self._controller = XelaCurvedSensorControl()
-        self._palm_bias_values = np.zeros((XELA_PALM_NUM_SENSORS, XELA_PALM_NUM_TAXELS, 3))
-        self._fingertip_bias_values = np.zeros(
-            (XELA_FINGERTIP_NUM_SENSORS, XELA_FINGERTIP_NUM_TAXELS, 3)
-        )
-        self._finger_bias_values = np.zeros((XELA_FINGER_NUM_SENSORS, XELA_FINGER_NUM_TAXELS, 3))
-        self._bias_duration = init_duration  # Wait 3 seconds for finding the average
-        self.timer = FrequencyTimer(XELA_FPS)
-        self._set_bias()
+class XelaCurvedSensors(XelaSensorStream, Component):
+    controller_class = XelaCurvedSensorControl
+    sensor_name = "xela_curved"
+    bias_shapes = dict(
+        palm_sensor_values=(XELA_PALM_NUM_SENSORS, XELA_PALM_NUM_TAXELS, 3),
+        fingertip_sensor_values=(XELA_FINGERTIP_NUM_SENSORS, XELA_FINGERTIP_NUM_TAXELS, 3),
+        finger_sensor_values=(XELA_FINGER_NUM_SENSORS, XELA_FINGER_NUM_TAXELS, 3),
+    )
 
     # The bias should be received for the first 2-3 seconds
     # to normalize the data accordingly
     def _set_bias(self):
-        self.notify_component_start("XELA sensors - receiving bias")
-        loop_index = 0
-        while True:
+        print("Receiving the XELA sensors bias...")
+        self._bias.start()
+        while self._bias.calibrating:
             try:
                 self.timer.start_loop()
 
@@ -119,24 +232,18 @@ class XelaCurvedSensors(Component):
                         and finger_bias_values is not None
                         and fingertip_bias_values is not None
                     ):
-                        self._palm_bias_values += palm_bias_values
-                        self._finger_bias_values += finger_bias_values
-                        self._fingertip_bias_values += fingertip_bias_values
-                        loop_index += 1
+                        self._bias.add(
+                            dict(
+                                palm_sensor_values=palm_bias_values,
+                                fingertip_sensor_values=fingertip_bias_values,
+                                finger_sensor_values=finger_bias_values,
+                            )
+                        )
                     self.timer.end_loop()
 
-                    if loop_index >= self._bias_duration * XELA_FPS:
-                        self._palm_bias_values /= loop_index
-                        self._finger_bias_values /= loop_index
-                        self._fingertip_bias_values /= loop_index
-                        # self.debug_component('found bias_values: {}'.format(self._bias_values))
-                        break
-
             except KeyboardInterrupt:
                 break
 
-        # self._bias_values /= loop_index # Take the average
-
     def get_sensor_state(self):
         (
             curr_sensor_palm_values,
@@ -149,27 +256,22 @@ class XelaCurvedSensors(Component):
             and curr_sensor_finger_values is not None
             and curr_sensor_fingertip_values is not None
         ):
+            if self._bias.calibrating and self._bias.add(
+                dict(
+                    palm_sensor_values=curr_sensor_palm_values,
+                    fingertip_sensor_values=curr_sensor_fingertip_values,
+                    finger_sensor_values=curr_sensor_finger_values,
+                )
+            ):
+                print("Updated the XELA bias.")
+            bias_values = self._bias.values
             normalized_state = dict(
-                palm_sensor_values=curr_sensor_palm_values - self._palm_bias_values,
-                fingertip_sensor_values=curr_sensor_fingertip_values - self._fingertip_bias_values,
-                finger_sensor_values=curr_sensor_finger_values - self._finger_bias_values,
+                palm_sensor_values=curr_sensor_palm_values - bias_values["palm_sensor_values"],
+                fingertip_sensor_values=curr_sensor_fingertip_values
+                - bias_values["fingertip_sensor_values"],
+                finger_sensor_values=curr_sensor_finger_values
+                - bias_values["finger_sensor_values"],
                 timestamp=timestamp,
             )
             return normalized_state
-        return normalized_state  # NOTE: This can be None as well
-
-    def stream(self):
-        # # Starting the xela stream
-        self.notify_component_start("XELA sensors")
-        print(f"Started the XELA sensor pipeline for the hand")
-
-        while True:
-            # try:
-            self.timer.start_loop()
-
-            xela_state = self.get_sensor_state()
-
-            self.timer.end_loop()
-
-        # except KeyboardInterrupt:
-        # break
+        return None
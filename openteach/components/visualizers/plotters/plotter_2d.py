@@ -1,8 +1,7 @@
 import os
 
 import cv2
-import matplotlib
-import matplotlib.pyplot as plt
+import numpy as np
 
 from openteach.constants import *
 from openteach.utils.files import *
@@ -10,88 +9,139 @@ from openteach.utils.network import ZMQCompressedImageTransmitter
 
 from .plotter import Plotter
 
-
-def plot_line(X1, X2, Y1, Y2):
-    plt.plot([X1, X2], [Y1, Y2])
+# Plot image, same size and axes position as the 6x6 inch matplotlib figure at 60 dpi
+PLOT_2D_SIZE = 360
+PLOT_2D_AXES = (45, 324, 43, 320)  # left, right, top, bottom pixels
+PLOT_2D_LIMITS = (-0.12, 0.12, -0.02, 0.2)  # x min, x max, y min, y max
+PLOT_2D_X_TICKS = (-0.1, -0.05, 0, 0.05, 0.1)
+PLOT_2D_Y_TICKS = (0, 0.05, 0.1, 0.15, 0.2)
+
+# Matplotlib's default line colors in BGR, the lines take them in turn like in plt.plot
+LINE_COLORS = [
+    (180, 119, 31),
+    (14, 127, 255),
+    (44, 160, 44),
+    (40, 39, 214),
+    (189, 103, 148),
+    (75, 86, 140),
+    (194, 119, 227),
+    (127, 127, 127),
+    (34, 189, 188),
+    (207, 190, 23),
+]
+KEYPOINT_COLOR = (0, 0, 255)
+
+
+def get_hand_segments():
+    # Wrist to metacarpals, then knuckle to knuckle and along every finger
+    segments = [(0, idx) for idx in OCULUS_JOINTS["metacarpals"]]
+    for key in ["knuckles", "thumb", "index", "middle", "ring", "pinky"]:
+        joints = OCULUS_JOINTS[key]
+        segments += [(joints[idx], joints[idx + 1]) for idx in range(len(joints) - 1)]
+    return np.array(segments)
 
 
 class PlotHand2D(Plotter):
-    def __init__(self, host, port, display_plot):
-        # Display plot
-        if not display_plot:
-            matplotlib.use("TkAgg")
+    """
+    Draws the hand keypoints and the thumb bounds with OpenCV and sends the image to the
+    headset. The axes and the thumb bounds are drawn once on a background image, every frame
+    only copies it and draws the hand.
+    """
 
-        # Thumb bound info
+    def __init__(self, host, port, display_plot):
         self.display_plot = display_plot
+
+        # Thumb bound info, reloaded when the calibration updates the file
         self.thumb_bounds = None
         self.thumb_bounds_path = VR_DISPLAY_THUMB_BOUNDS_PATH
+        self._thumb_bounds_time = None
         self.bound_update_counter = 0
-        self._check_thumb_bounds()
 
-        # Checking image storage path
+        # Checking the calibration files path
         make_dir(os.path.join(CALIBRATION_FILES_PATH))
 
-        # Figure settings
-        self.fig = plt.figure(figsize=(6, 6), dpi=60)
+        self._segments = get_hand_segments()
+        self._set_limits()
+        self._check_thumb_bounds()
 
         # Plot streamer settings
         self.socket = ZMQCompressedImageTransmitter(host=host, port=port)
 
     def _check_thumb_bounds(self):
-        if check_file(self.thumb_bounds_path):
+        if not check_file(self.thumb_bounds_path):
+            return
+        bounds_time = os.path.getmtime(self.thumb_bounds_path)
+        if bounds_time != self._thumb_bounds_time:
             self.thumb_bounds = get_npz_data(self.thumb_bounds_path)
+            self._thumb_bounds_time = bounds_time
+            self._draw_background()
 
     def _set_limits(self):
-        plt.axis([-0.12, 0.12, -0.02, 0.2])
-
-    def _draw_thumb_bounds(self):
-        for idx in range(VR_THUMB_BOUND_VERTICES):
-            plot_line(
-                self.thumb_bounds[idx][0],
-                self.thumb_bounds[(idx + 1) % VR_THUMB_BOUND_VERTICES][0],
-                self.thumb_bounds[idx][1],
-                self.thumb_bounds[(idx + 1) % VR_THUMB_BOUND_VERTICES][1],
-            )
-
-    def draw_hand(self, X, Y):
-        plt.plot(X, Y, "ro")
-
+        left, right, top, bottom = PLOT_2D_AXES
+        x_min, x_max, y_min, y_max = PLOT_2D_LIMITS
+        # Pixel = coordinate * scale + offset
+        self._scale = np.array([(right - left) / (x_max - x_min), (top - bottom) / (y_max - y_min)])
+        self._offset = np.array([left, bottom]) - np.array([x_min, y_min]) * self._scale
+        self._draw_background()
+
+    def _to_pixels(self, X, Y):
+        # Fixed point with 4 fractional bits for the anti-aliased drawing
+        points = np.stack([X, Y], axis=-1) * self._scale + self._offset
+        return np.round(np.clip(points, -PLOT_2D_SIZE, 2 * PLOT_2D_SIZE) * 16).astype(np.int32)
+
+    def _draw_background(self):
+        background = np.full((PLOT_2D_SIZE, PLOT_2D_SIZE, 3), 255, dtype=np.uint8)
+        left, right, top, bottom = PLOT_2D_AXES
+        cv2.rectangle(background, (left, top), (right, bottom), (0, 0, 0), 1)
+
+        font = cv2.FONT_HERSHEY_SIMPLEX
+        for tick in PLOT_2D_X_TICKS:
+            x = int(self._to_pixels(tick, 0)[0]) // 16
+            cv2.line(background, (x, bottom), (x, bottom + 4), (0, 0, 0), 1)
+            cv2.putText(background, "{:g}".format(tick), (x - 14, bottom + 17), font, 0.35, 0)
+        for tick in PLOT_2D_Y_TICKS:
+            y = int(self._to_pixels(0, tick)[1]) // 16
+            cv2.line(background, (left - 4, y), (left, y), (0, 0, 0), 1)
+            cv2.putText(background, "{:g}".format(tick), (left - 34, y + 4), font, 0.35, 0)
+
+        # The hand lines continue the color cycle after the thumb bounds
+        self._color_offset = 0
         if self.thumb_bounds is not None:
-            self._draw_thumb_bounds()
-
-        # Drawing connections fromn the wrist - 0
-        for idx in OCULUS_JOINTS["metacarpals"]:
-            plot_line(X[0], X[idx], Y[0], Y[idx])
-
-        # Drawing knuckle to knuckle connections and knuckle to finger connections
-        for key in ["knuckles", "thumb", "index", "middle", "ring", "pinky"]:
-            for idx in range(len(OCULUS_JOINTS[key]) - 1):
-                plot_line(
-                    X[OCULUS_JOINTS[key][idx]],
-                    X[OCULUS_JOINTS[key][idx + 1]],
-                    Y[OCULUS_JOINTS[key][idx]],
-                    Y[OCULUS_JOINTS[key][idx + 1]],
+            bounds = np.asarray(self.thumb_bounds)[:VR_THUMB_BOUND_VERTICES]
+            points = self._to_pixels(bounds[:, 0], bounds[:, 1])
+            for idx in range(len(points)):
+                cv2.line(
+                    background,
+                    tuple(points[idx]),
+                    tuple(points[(idx + 1) % len(points)]),
+                    LINE_COLORS[idx % len(LINE_COLORS)],
+                    2,
+                    cv2.LINE_AA,
+                    4,
                 )
+            self._color_offset = len(points)
 
-    def draw(self, X, Y):
-        # Setting the plot limits
-        self._set_limits()
+        self._background = background
 
-        # Resetting the thumb bounds
-        if self.bound_update_counter % 10 == 0:
-            self._check_thumb_bounds()
-            self.bound_update_counter = 0
-        else:
-            self.bound_update_counter += 1
+    def draw_hand(self, image, X, Y):
+        points = self._to_pixels(X, Y)
+        for idx, (start, end) in enumerate(self._segments):
+            color = LINE_COLORS[(idx + self._color_offset) % len(LINE_COLORS)]
+            cv2.line(image, tuple(points[start]), tuple(points[end]), color, 2, cv2.LINE_AA, 4)
+        for point in points:
+            cv2.circle(image, tuple(point), 4 * 16, KEYPOINT_COLOR, -1, cv2.LINE_AA, 4)
+        return image
 
-        # Plotting the lines to visualize the hand
-        self.draw_hand(X, Y)
+    def draw(self, X, Y):
+        # Checking for new thumb bounds every 10 frames
+        if self.bound_update_counter == 0:
+            self._check_thumb_bounds()
+        self.bound_update_counter = (self.bound_update_counter + 1) % 10
 
-        # Saving and obtaining the plot
-        plt.savefig(VR_2D_PLOT_SAVE_PATH)
-        plot = cv2.imread(VR_2D_PLOT_SAVE_PATH)
+        # Drawing the hand over the axes and the thumb bounds
+        plot = self.draw_hand(self._background.copy(), X, Y)
         self.socket.send_image(plot)
 
-        # Resetting and pausing the 3D plot
-        plt.pause(0.001)  # This make the graph show up if matplotlib is in Tkinter mode
-        plt.cla()
+        if self.display_plot:
+            cv2.imshow("Hand 2D plot", plot)
+            cv2.waitKey(1)
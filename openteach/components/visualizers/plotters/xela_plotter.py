@@ -1,322 +1,215 @@
 import cv2
-import matplotlib
-import matplotlib.pyplot as plt
 import numpy as np
 
 from openteach.constants import *
 
 from .plotter import Plotter
 
+# Pixels of a finger sensor tile and of the title band above every tile, before scaling
+XELA_TILE_SIZE = 240
+XELA_TITLE_HEIGHT = 20
+# Pressure at which the taxels reach the last color of the heat map
+XELA_PLOT_MAX_PRESSURE = 300
+
+
+def get_grid_coords(x_values, y_values):
+    # Row first, from the top left to the bottom right
+    return np.array([[x, y] for y in y_values for x in x_values], dtype=np.float64)
+
+
+def get_curved_tip_coords():
+    # Two taxels on the top row, four on the next two rows and six on the last three
+    coords = []
+    for y in range(20, 240, 40):
+        for x in range(20, 240, 40):
+            if y == 20 and (x == 100 or x == 140):
+                coords.append([x, y])
+            elif (y > 20 and y < 100) and (x > 20 and x < 220):
+                coords.append([x, y])
+            elif y >= 100:
+                coords.append([x, y])
+    return np.array(coords, dtype=np.float64)
+
+
+def get_palm_coords():
+    # Three 6x4 sensors, two on the top row and one below the second
+    return np.concatenate(
+        [
+            get_grid_coords(range(220, 420 + 1, 40), range(70, 190 + 1, 40)),
+            get_grid_coords(range(540, 740 + 1, 40), range(70, 190 + 1, 40)),
+            get_grid_coords(range(540, 740 + 1, 40), range(270, 390 + 1, 40)),
+        ]
+    )
+
+
+class TactileRenderer(object):
+    """
+    Draws the taxels of several tactile sensors into a single preallocated image. Every sensor
+    is a tile of the image with a title, its taxel positions and tile bounds are computed once.
+    Each taxel is a circle moved by its shear values and sized and colored by its pressure,
+    clipped to the tile of its sensor.
+
+        renderer = TactileRenderer([("index_tip", (0, 0), (240, 240), tip_coords), ...])
+        image = renderer.render(taxel_values)  # (num_taxels, 3), in the order of the tiles
+    """
+
+    def __init__(self, tiles, scale=1.0, min_radius=2):
+        self._scale = scale
+        self._min_radius = min_radius * scale
+
+        # Tile origins and sizes include the title band
+        width = max(origin[0] + size[0] for _, origin, size, _ in tiles)
+        height = max(origin[1] + size[1] for _, origin, size, _ in tiles) + XELA_TITLE_HEIGHT
+        self.image = np.empty((int(height * scale), int(width * scale), 3), dtype=np.uint8)
+        self._background = np.full_like(self.image, 255)
+
+        coords, bounds = [], []
+        for title, origin, size, taxel_coords in tiles:
+            x0, y0 = origin[0], origin[1] + XELA_TITLE_HEIGHT
+            coords.append((taxel_coords + [x0, y0]) * scale)
+            tile_bounds = np.array([x0, y0, x0 + size[0] - 1, y0 + size[1] - 1]) * scale
+            bounds.append(np.repeat(tile_bounds[None], len(taxel_coords), axis=0))
+            self._draw_tile(title, tile_bounds.astype(int))
+        self._coords = np.concatenate(coords)
+        self._bounds = np.concatenate(bounds)
+        self.num_taxels = len(self._coords)
+
+        # Heat map colors of the pressure levels
+        levels = np.arange(256, dtype=np.uint8).reshape(-1, 1)
+        self._colors = cv2.applyColorMap(levels, cv2.COLORMAP_JET).reshape(256, 3)
+
+    def _draw_tile(self, title, tile_bounds):
+        x0, y0, x1, y1 = tile_bounds
+        cv2.rectangle(self._background, (x0, y0), (x1, y1), (200, 200, 200), 1)
+        if title is not None:
+            cv2.putText(
+                self._background,
+                title,
+                (x0 + 4, y0 - int(6 * self._scale)),
+                cv2.FONT_HERSHEY_SIMPLEX,
+                0.45 * self._scale,
+                (0, 0, 0),
+                1,
+                cv2.LINE_AA,
+            )
 
-class XelaPlotter(Plotter):
-    def __init__(self, display_plot=True):
-        if not display_plot:
-            matplotlib.use("Agg")
-
-        # Create the figures and self.axs
-        self.fig, self.axs = plt.subplots(figsize=(15, 15), nrows=4, ncols=4, dpi=60)
-
-        # Blank images to be used since cv2 images is used
-        # NOTE: Not sure if these are needed
-        self.blank_image = np.zeros((240, 240, 3))
-        self.imgs = []
-        for i in range(4):
-            self.imgs.append([self.axs[i, j].imshow(self.blank_image.copy()) for j in range(4)])
-
-        for i in range(4):
-            for j in range(4):
-                self.axs[i, j].set_title("Finger: {} Sensor: {}".format(i, j))
-
-        self._set_circle_coordinates()
+    def render(self, taxel_values):
+        # taxel_values: (num_taxels, 3) - the x and y shear and the pressure of every taxel
+        taxel_values = np.asarray(taxel_values).reshape(self.num_taxels, 3)
+        centers = np.clip(
+            self._coords + taxel_values[:, :2] * (self._scale / 20),
+            self._bounds[:, :2],
+            self._bounds[:, 2:],
+        )
+        radii = np.maximum((10 + taxel_values[:, 2] / 10) * self._scale, self._min_radius)
+        # Keeping the circles inside their tile
+        radii = np.minimum(
+            radii, np.min(np.abs(np.hstack([centers, centers]) - self._bounds), axis=1)
+        )
+        levels = np.clip(taxel_values[:, 2] * (255 / XELA_PLOT_MAX_PRESSURE), 0, 255)
+        colors = self._colors[levels.astype(np.uint8)]
+
+        np.copyto(self.image, self._background)
+        for center, radius, color in zip(
+            centers.astype(int).tolist(), radii.astype(int).tolist(), colors.tolist()
+        ):
+            cv2.circle(self.image, center, radius, color, -1)
+        return self.image
+
+
+def show_plot(image, display_plot):
+    if display_plot:
+        cv2.imshow("Xela sensors", image)
+        cv2.waitKey(1)
 
-    def _set_limits(self):
-        pass
 
-    def _set_circle_coordinates(self):
-        self.circle_coords_in_one_circle = []
-        for j in range(48, 192 + 1, 48):  # Y
-            for i in range(48, 192 + 1, 48):  # X - It goes from top left to bottom right row first
-                self.circle_coords_in_one_circle.append([i, j])
-
-    def _draw_one_sensor(self, ax, sensor_values, img=None):
-        # sensor_values: (16,3) - 3 values for each taxel
-        img_shape = (240, 240, 3)
-        blank_image = np.ones(img_shape, np.uint8) * 255
-        if img is None:
-            img = ax.imshow(blank_image.copy())
-
-        # Plot the circles in one sensor
-        for i in range(sensor_values.shape[0]):
-            # Get the center coordinates of the circle
-            center_coordinates = (
-                self.circle_coords_in_one_circle[i][0] + int(sensor_values[i, 0] / 20),
-                self.circle_coords_in_one_circle[i][1] + int(sensor_values[i, 1] / 20),
-            )
-            radius = max(10 + int(sensor_values[i, 2] / 10), 0)
-
-            if i == 0:
-                frame_axis = cv2.circle(
-                    blank_image.copy(),
-                    center_coordinates,
-                    radius,
-                    color=(0, 255, 0),
-                    thickness=-1,
-                )
-            else:
-                frame_axis = cv2.circle(
-                    frame_axis.copy(),
-                    center_coordinates,
-                    radius,
-                    color=(0, 255, 0),
-                    thickness=-1,
-                )
-
-        img.set_array(frame_axis)
-
-        return img, frame_axis
+class XelaPlotter(Plotter):
+    """
+    The 16 taxel sensors on a 4x4 grid, the top left tile is empty.
+    """
 
-    def draw(self, all_sensor_values):
-        # Set the plot limits
-        # self._set_limits() - TODO: Do we really not need this?
+    def __init__(self, display_plot=True, scale=0.5):
+        self.display_plot = display_plot
+        sensor_coords = get_grid_coords(range(48, 192 + 1, 48), range(48, 192 + 1, 48))
+        tile_height = XELA_TILE_SIZE + XELA_TITLE_HEIGHT
 
-        # Plot the sensors for each values
+        tiles = []
         for row_id in range(4):
             for column_id in range(4):
-                if row_id + column_id > 0:  # The top left axis should stay empty
-                    self.imgs[column_id][row_id], _ = self._draw_one_sensor(
-                        self.axs[column_id, row_id],
-                        sensor_values=all_sensor_values[row_id * 4 + column_id - 1],
-                        img=self.imgs[column_id][row_id],
+                if row_id + column_id > 0:
+                    tiles.append(
+                        (
+                            "Finger: {} Sensor: {}".format(column_id, row_id),
+                            (row_id * XELA_TILE_SIZE, column_id * tile_height),
+                            (XELA_TILE_SIZE, XELA_TILE_SIZE),
+                            sensor_coords,
+                        )
                     )
+        self.renderer = TactileRenderer(tiles, scale=scale, min_radius=0)
 
-        # TODO: Fix the issue with the last sensor value
-        plt.savefig(XELA_PLOT_SAVE_PATH)  # NOTE: this is for debugging purposes as well
+    def _set_limits(self):
+        pass
 
-        # Resetting and pausing the plot - NOTE: Make sure this works as well
-        plt.pause(0.01)
-        plt.cla()
+    def draw(self, all_sensor_values):
+        num_sensors = self.renderer.num_taxels // XELA_NUM_TAXELS
+        image = self.renderer.render(np.asarray(all_sensor_values)[:num_sensors])
+        show_plot(image, self.display_plot)
+        return image
 
 
 class XelaCurvedPlotter(Plotter):
-    def __init__(self, display_plot=True):
-        if not display_plot:
-            matplotlib.use("Agg")
-
-        thumb = [["thumb_empty"], ["thumb_tip"], ["thumb_section2"], ["thumb_section3"]]
-
-        index = [
-            ["index_tip"],
-            ["index_section1"],
-            ["index_section2"],
-            ["index_section3"],
+    """
+    The fingers of the curved Xela hand side by side, every finger a column of its curved tip
+    and its sections from the top, with the palm below them.
+    """
+
+    def __init__(self, display_plot=True, scale=0.5):
+        self.display_plot = display_plot
+        tip_coords = get_curved_tip_coords()
+        section_coords = get_grid_coords(range(60, 180 + 1, 40), range(60, 180 + 1, 40))
+        tile_height = XELA_TILE_SIZE + XELA_TITLE_HEIGHT
+        tile_size = (XELA_TILE_SIZE, XELA_TILE_SIZE)
+
+        # The thumb has no first section, its tip is one tile lower than the others
+        fingers = [
+            ("thumb", [None, "tip", "section2", "section3"]),
+            ("index", ["tip", "section1", "section2", "section3"]),
+            ("mid", ["tip", "section1", "section2", "section3"]),
+            ("ring", ["tip", "section1", "section2", "section3"]),
         ]
-
-        ring = [["ring_tip"], ["ring_section1"], ["ring_section2"], ["ring_section3"]]
-
-        middle = [["mid_tip"], ["mid_section1"], ["mid_section2"], ["mid_section3"]]
-
-        all_fingers = [thumb, index, middle, ring]
-
-        hand = [[thumb, index, middle, ring], ["palm", "palm", "palm", "palm"]]
-
-        fig, self.axs = plt.subplot_mosaic(hand, figsize=(10, 20))
+        fingertip_tiles, finger_tiles = [], []
+        for finger_id, (finger, sensors) in enumerate(fingers):
+            for sensor_id, sensor in enumerate(sensors):
+                if sensor is None:
+                    continue
+                origin = (finger_id * XELA_TILE_SIZE, sensor_id * tile_height)
+                title = "{}_{}".format(finger, sensor)
+                if sensor == "tip":
+                    fingertip_tiles.append((title, origin, tile_size, tip_coords))
+                else:
+                    finger_tiles.append((title, origin, tile_size, section_coords))
+
+        palm_tile = ("palm", (0, 4 * tile_height), (4 * XELA_TILE_SIZE, 480), get_palm_coords())
+        self.renderer = TactileRenderer([palm_tile] + fingertip_tiles + finger_tiles, scale=scale)
+
+        # Preallocated values of all the taxels, in the order of the tiles
+        self._taxel_values = np.zeros((self.renderer.num_taxels, 3))
+        num_palm_taxels = XELA_PALM_NUM_SENSORS * XELA_PALM_NUM_TAXELS
+        num_fingertip_taxels = XELA_FINGERTIP_NUM_SENSORS * XELA_FINGERTIP_NUM_TAXELS
+        self._palm_values = self._taxel_values[:num_palm_taxels]
+        self._fingertip_values = self._taxel_values[
+            num_palm_taxels : num_palm_taxels + num_fingertip_taxels
+        ]
+        self._finger_values = self._taxel_values[num_palm_taxels + num_fingertip_taxels :]
 
     def _set_limits(self):
         pass
 
-    def plot_tactile_sensor(self, ax, sensor_values, use_img=False, img=None, title="Tip Position"):
-        # sensor_values: (16, 3) - 3 values for each tactile - x and y represents the position, z represents the pressure on the tactile point
-        img_shape = (240, 240, 3)  # For one sensor
-        blank_image = np.ones(img_shape, np.uint8) * 255
-        if use_img == False:
-            img = ax.imshow(blank_image.copy())
-        ax.set_title(title)
-
-        # Set the coordinates for each circle
-        tactile_coordinates = []
-        for j in range(60, 180 + 1, 40):  # Y
-            for i in range(60, 180 + 1, 40):  # X - It goes from top left to bottom right row first
-                tactile_coordinates.append([i, j])
-
-        # Plot the circles
-        for i in range(sensor_values.shape[0]):
-            center_coordinates = (
-                tactile_coordinates[i][0] + int(sensor_values[i, 0] / 20),  # NOTE: Change this
-                tactile_coordinates[i][1] + int(sensor_values[i, 1] / 20),
-            )
-            radius = max(10 + int(sensor_values[i, 2] / 10), 2)
-
-            if i == 0:
-                frame_axis = cv2.circle(
-                    blank_image.copy(),
-                    center_coordinates,
-                    radius,
-                    color=(0, 255, 0),
-                    thickness=-1,
-                )
-            else:
-                frame_axis = cv2.circle(
-                    frame_axis.copy(),
-                    center_coordinates,
-                    radius,
-                    color=(0, 255, 0),
-                    thickness=-1,
-                )
-
-        img.set_array(frame_axis)
-
-        return img, frame_axis
-
-    def plot_tactile_curved_tip(
-        self, ax, sensor_values, use_img=False, img=None, title="Tip Position"
-    ):
-        # sensor_values: (16, 3) - 3 values for each tactile - x and y represents the position, z represents the pressure on the tactile point
-        img_shape = (240, 240, 3)  # For one sensor
-        blank_image = np.ones(img_shape, np.uint8) * 255
-        if use_img == False:
-            img = ax.imshow(blank_image.copy())
-        ax.set_title(title)
-
-        # Set the coordinates for each circle
-        tactile_coordinates = []
-        for j in range(20, 240, 40):  # y axis
-            # x axis is somewhat hard coded
-            for i in range(20, 240, 40):
-                if j == 20 and (i == 100 or i == 140):  # Only the middle two will be added
-                    tactile_coordinates.append([i, j])
-                elif (j > 20 and j < 100) and (i > 20 and i < 220):
-                    tactile_coordinates.append([i, j])
-                elif j >= 100:
-                    tactile_coordinates.append([i, j])
-
-        # Plot the circles
-        for i in range(sensor_values.shape[0]):
-            center_coordinates = (
-                tactile_coordinates[i][0] + int(sensor_values[i, 0] / 20),
-                tactile_coordinates[i][1] + int(sensor_values[i, 1] / 20),
-            )
-            radius = max(10 + int(sensor_values[i, 2] / 10), 2)
-
-            if i == 0:
-                frame_axis = cv2.circle(
-                    blank_image.copy(),
-                    center_coordinates,
-                    radius,
-                    color=(0, 255, 0),
-                    thickness=-1,
-                )
-            else:
-                frame_axis = cv2.circle(
-                    frame_axis.copy(),
-                    center_coordinates,
-                    radius,
-                    color=(0, 255, 0),
-                    thickness=-1,
-                )
-
-        img.set_array(frame_axis)
-
-        return img, frame_axis
-
-    def plot_tactile_palm(self, ax, sensor_values, use_img=False, img=None, title="Tip Position"):
-        # sensor_values: (16, 3) - 3 values for each tactile - x and y represents the position, z represents the pressure on the tactile point
-        img_shape = (480, 960, 3)  # For one sensor
-        blank_image = np.ones(img_shape, np.uint8) * 255
-        if use_img == False:
-            img = ax.imshow(blank_image.copy())
-        ax.set_title(title)
-
-        # Set the coordinates for each circle
-        tactile_coordinates = []
-
-        for j in range(70, 190 + 1, 40):
-            for i in range(220, 420 + 1, 40):
-                tactile_coordinates.append([i, j])
-
-        for j in range(70, 190 + 1, 40):
-            for i in range(540, 740 + 1, 40):
-                tactile_coordinates.append([i, j])
-
-        for j in range(270, 390 + 1, 40):
-            for i in range(540, 740 + 1, 40):
-                tactile_coordinates.append([i, j])
-
-        # for j in range(70, 410+1, 40):
-        #     for i in range(180, 780+1, 40):
-        #         if (j < 230) and ((i >= 220 and i <= 420) or (i >= 540 and i <= 740)):
-        #             tactile_coordinates.append([i,j])
-        #         elif (j > 230) and (i >= 540 and i <= 740):
-        #             tactile_coordinates.append([i,j])
-
-        # print(len(tactile_coordinates))
-
-        # Plot the circles
-        for i in range(sensor_values.shape[0]):
-            # print(sensor_values[i,0])
-            center_coordinates = (
-                tactile_coordinates[i][0] + int(sensor_values[i, 0] / 20),
-                tactile_coordinates[i][1] + int(sensor_values[i, 1] / 20),
-            )
-            radius = max(10 + int(sensor_values[i, 2] / 10), 2)
-
-            if i == 0:
-                frame_axis = cv2.circle(
-                    blank_image.copy(),
-                    center_coordinates,
-                    radius,
-                    color=(0, 255, 0),
-                    thickness=-1,
-                )
-            else:
-                frame_axis = cv2.circle(
-                    frame_axis.copy(),
-                    center_coordinates,
-                    radius,
-                    color=(0, 255, 0),
-                    thickness=-1,
-                )
-
-        img.set_array(frame_axis)
-
-        return img, frame_axis
-
     def draw(self, palm_sensor_values, fingertip_sensor_values, finger_sensor_values):
-        cnt_fingertip = 0
-        cnt_finger = 0
-        for k in self.axs:
-            # print('k: {}'.format(k))
-            if "tip" in k:
-                # sensor_values = np.random.randn(30,3) * 20
-                self.fingertip_sensor_values = fingertip_sensor_values
-                # print(self.fingertip_sensor_values)
-                self.plot_tactile_curved_tip(
-                    self.axs[k],
-                    sensor_values=self.fingertip_sensor_values[cnt_fingertip],
-                    title=k,
-                )
-                cnt_fingertip += 1
-            elif "palm" in k:
-                # sensor_values = np.random.randn(72,3) * 20
-                palm_sensor_values = np.concatenate(palm_sensor_values, axis=0)
-                assert palm_sensor_values.shape == (72, 3), (
-                    f"palm_sensor_values.shape: {palm_sensor_values.shape}"
-                )
-                # self.palm_sensor_values= palm_sensor_values
-                self.plot_tactile_palm(self.axs[k], sensor_values=palm_sensor_values, title=k)
-                # cnt_palm+=1
-            elif not "empty" in k:
-                self.finger_sensor_values = finger_sensor_values
-                self.plot_tactile_sensor(
-                    self.axs[k],
-                    sensor_values=self.finger_sensor_values[cnt_finger],
-                    title=k,
-                )
-                cnt_finger += 1
-            self.axs[k].get_yaxis().set_ticks([])
-            self.axs[k].get_xaxis().set_ticks([])
-
-        plt.savefig(XELA_PLOT_SAVE_PATH)  # NOTE: this is for debugging purposes as well
-
-        # Resetting and pausing the plot - NOTE: Make sure this works as well
-        plt.pause(0.01)
-        plt.cla()
+        self._palm_values[:] = np.reshape(palm_sensor_values, (-1, 3))
+        self._fingertip_values[:] = np.reshape(fingertip_sensor_values, (-1, 3))
+        self._finger_values[:] = np.reshape(finger_sensor_values, (-1, 3))
+
+        image = self.renderer.render(self._taxel_values)
+        show_plot(image, self.display_plot)
+        return image
@@ -1,27 +1,40 @@
 import hydra
 import numpy as np
-from get_xela_values import (
-    XelaCurvedSensorControl,
-)  # Python path is set to that directory
 
 from openteach.components import Component
+from openteach.utils.network import ZMQCompressedImageTransmitter
 
 from .plotters.xela_plotter import *
 
 
 class XelaVisualizer(Component):
-    def __init__(self, sensor, display_plot):
+    def __init__(self, sensor, display_plot, host=None, plot_port=None, plot_scale=0.5):
         self.notify_component_start("Xela Visualizer starting")
 
-        # Initialize the plotter and the sensor controller
-        self.plotter = XelaCurvedPlotter(display_plot)
+        # Initialize the plotter, the sensor is a subscriber of the Xela sensor stream
+        self.plotter = XelaCurvedPlotter(display_plot, plot_scale)
         self.sensor = sensor
         # self.display_plot = display_plot
 
+        # Streaming the plot instead of saving it
+        self.plot_socket = None
+        if plot_port is not None:
+            self.plot_socket = ZMQCompressedImageTransmitter(host=host, port=plot_port)
+
+    def _draw(self, palm_sensor_values, fingertip_sensor_values, finger_sensor_values):
+        with self.metrics.span("render"):
+            plot = self.plotter.draw(
+                palm_sensor_values, fingertip_sensor_values, finger_sensor_values
+            )
+        if self.plot_socket is not None:
+            with self.metrics.span("publish"):
+                self.plot_socket.send_image(plot)
+        self.metrics.end_loop()
+
     def stream(self):
         while True:
-            # xela_palm_sensor_values,xela_fingertip_sensor_values,xela_finger_sensor_values, timestamp  = self.sensor.get_sensor_state()
-            sensor_state = self.sensor.get_sensor_state()
+            # Waiting for the next readings of the sensor stream
+            sensor_state = self.sensor.recv_state()
             palm_sensor_values = sensor_state["palm_sensor_values"]
             fingertip_sensor_values = sensor_state["fingertip_sensor_values"]
             finger_sensor_values = sensor_state["finger_sensor_values"]
@@ -34,30 +47,45 @@ class XelaVisualizer(Component):
             ):
                 # Get the xela sensor values
 
-                self.plotter.draw(palm_sensor_values, fingertip_sensor_values, finger_sensor_values)
+                self._draw(palm_sensor_values, fingertip_sensor_values, finger_sensor_values)
 
         print("Stopping the XELA visualizer")
 
 
 class XelaCurvedVisualizer(Component):
-    def __init__(self, sensor, display_plot):
+    def __init__(self, sensor, display_plot, host=None, plot_port=None, plot_scale=0.5):
         self.notify_component_start("Xela Visualizer starting")
-        # Initialize the plotter and the sensor controller
-        self.plotter = XelaCurvedPlotter(display_plot)
+        # Initialize the plotter, the sensor is a subscriber of the Xela sensor stream
+        self.plotter = XelaCurvedPlotter(display_plot, plot_scale)
         self.sensor = sensor
 
+        # Streaming the plot instead of saving it
+        self.plot_socket = None
+        if plot_port is not None:
+            self.plot_socket = ZMQCompressedImageTransmitter(host=host, port=plot_port)
+
+    def _draw(self, palm_sensor_values, fingertip_sensor_values, finger_sensor_values):
+        with self.metrics.span("render"):
+            plot = self.plotter.draw(
+                palm_sensor_values, fingertip_sensor_values, finger_sensor_values
+            )
+        if self.plot_socket is not None:
+            with self.metrics.span("publish"):
+                self.plot_socket.send_image(plot)
+        self.metrics.end_loop()
+
     def stream(self):
         while True:
             try:
-                # Get the xela sensor values
-                xela_state = self.sensor.get_sensor_state()
+                # Get the latest xela sensor values, waiting for new ones
+                xela_state = self.sensor.recv_state()
 
                 if not xela_state is None:
                     palm_sensor_values = xela_state["palm_sensor_values"]
                     fingertip_sensor_values = xela_state["fingertip_sensor_values"]
                     finger_sensor_values = xela_state["finger_sensor_values"]
 
-                self.plotter.draw(palm_sensor_values, fingertip_sensor_values, finger_sensor_values)
+                self._draw(palm_sensor_values, fingertip_sensor_values, finger_sensor_values)
 
             except:
                 break
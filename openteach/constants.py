@@ -31,6 +31,10 @@ OCULUS_VIEW_LIMITS = {
 }
 
 VR_FREQ = 30
+# Milliseconds the VR detectors wait for any of their inputs
+VR_POLL_TIMEOUT = 100
+# Seconds without a message after which a VR input is reported as stale
+VR_INPUT_STALE_TIME = 1.0
 LIBERO_FREQ = 20
 
 # XELA Sensor parameters
@@ -43,6 +47,10 @@ XELA_PALM_NUM_TAXELS = 24
 XELA_FINGERTIP_NUM_TAXELS = 30
 XELA_FINGER_NUM_TAXELS = 16
 XELA_NUM_TAXELS = 16
+# Topic of the bias corrected readings published by the Xela sensor components
+XELA_SENSOR_TOPIC = "xela"
+# Seconds for which a stored Xela bias is reused instead of calibrating again, 0 to always calibrate
+XELA_BIAS_MAX_AGE = 3600
 # Robot parameters
 
 # Allegro
@@ -76,12 +84,17 @@ VR_THUMB_BOUNDS_PATH = path.join(CALIBRATION_FILES_PATH, "vr_thumb_bounds.npy")
 VR_DISPLAY_THUMB_BOUNDS_PATH = path.join(CALIBRATION_FILES_PATH, "vr_thumb_plot_bounds.npy")
 VR_2D_PLOT_SAVE_PATH = path.join(CALIBRATION_FILES_PATH, "oculus_hand_2d_plot.jpg")
 XELA_PLOT_SAVE_PATH = path.join(CALIBRATION_FILES_PATH, "xela_plot.png")
+# Formatted with the name of the sensors
+XELA_BIAS_PATH = path.join(CALIBRATION_FILES_PATH, "{}_bias.npz")
 
 
 # Data recording parameters - Images are recorded at CAM_FPS rate
 IMAGE_RECORD_RESOLUTION = (1280, 720)
 IMAGE_RECORD_RESOLUTION_SIM = (480, 480)
+RGB_RECORD_QUEUE_SIZE = 30  # Frames waiting for the video writer thread
 DEPTH_RECORD_FPS = 30
+DEPTH_RECORD_QUEUE_SIZE = 30  # Frames waiting for the depth writer thread
+DEPTH_RECORD_FLUSH_EVERY = 10
 ALLEGRO_SAMPLE_OFFSET = 10  # For sampling states
 SAMPLE_WRITER_FPS = 5
 
@@ -89,6 +102,9 @@ SAMPLE_WRITER_FPS = 5
 DEPLOY_REACH_THRESHOLD = 0.35
 DEPLOY_FREQ = 3
 
+# Loop timing
+TIMER_STATISTICS_WINDOW = 1000  # Loops in the FrequencyTimer statistics
+
 # RESOLUTION SPECIFIC parameters
 
 ARM_HIGH_RESOLUTION = 1  #  for arm teleoperation
@@ -30,6 +30,7 @@ class AllegroKDL(object):
                 ],
                 name=finger,
             )
+        self._chain_constants = {}
 
     def finger_forward_kinematics(self, finger_type, input_angles):
         # Checking if the number of angles is equal to 4
@@ -98,6 +99,69 @@ class AllegroKDL(object):
         finger_tip_coords = np.hstack([index_coords, middle_coords, ring_coords, thumb_coords])
         return np.array(finger_tip_coords)
 
+    def _get_chain_constants(self, finger_type):
+        # Fixed transform and rotation axis of every link in the finger chain, None for fixed links
+        if finger_type not in self._chain_constants:
+            constants = []
+            for link in self.chains[finger_type].links:
+                origin_frame = np.asarray(link.get_link_frame_matrix(0), dtype=np.float64)
+                axis = np.asarray(link.rotation, dtype=np.float64) if link.has_rotation else None
+                constants.append((origin_frame, axis))
+            self._chain_constants[finger_type] = constants
+
+        return self._chain_constants[finger_type]
+
+    def batched_finger_forward_kinematics(self, finger_type, input_angles):
+        """
+        Forward kinematics of N finger states at once, input_angles is (N, 4). Returns the (N, 3)
+        positions and (N, 3, 3) orientations, the same as finger_forward_kinematics for each state.
+        """
+        finger_info = self.finger_configs["links_info"][finger_type]
+        input_angles = np.clip(
+            np.asarray(input_angles, dtype=np.float64),
+            finger_info["joint_min"],
+            finger_info["joint_max"],
+        )
+
+        # The angles of the chain links, padded like in finger_forward_kinematics
+        link_angles = np.zeros((len(input_angles), len(self.chains[finger_type].links)))
+        link_angles[:, 1 : input_angles.shape[1] + 1] = input_angles
+
+        frames = np.broadcast_to(np.eye(4), (len(input_angles), 4, 4))
+        for link_idx, (origin_frame, axis) in enumerate(self._get_chain_constants(finger_type)):
+            frames = frames @ origin_frame
+            if axis is None:
+                continue
+
+            # Rodrigues rotation about the joint axis
+            skew = np.array(
+                [
+                    [0, -axis[2], axis[1]],
+                    [axis[2], 0, -axis[0]],
+                    [-axis[1], axis[0], 0],
+                ]
+            )
+            angles = link_angles[:, link_idx, None, None]
+            rotations = np.zeros((len(input_angles), 4, 4))
+            rotations[:, :3, :3] = (
+                np.eye(3) + np.sin(angles) * skew + (1 - np.cos(angles)) * (skew @ skew)
+            )
+            rotations[:, 3, 3] = 1
+            frames = frames @ rotations
+
+        return frames[:, :3, 3], frames[:, :3, :3]
+
+    def get_batched_fingertip_coords(self, joint_positions):
+        # (N, 16) joint states to the (N, 12) fingertip coordinates of get_fingertip_coords
+        joint_positions = np.asarray(joint_positions)
+        finger_coords = [
+            self.batched_finger_forward_kinematics(
+                finger_type, joint_positions[:, start : start + 4]
+            )[0]
+            for finger_type, start in [("index", 0), ("middle", 4), ("ring", 8), ("thumb", 12)]
+        ]
+        return np.hstack(finger_coords)
+
     def get_joint_state_from_coord(
         self, index_tip_coord, middle_tip_coord, ring_tip_coord, thumb_tip_coord, seed
     ):
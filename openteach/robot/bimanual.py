@@ -3,7 +3,6 @@ import time
 import numpy as np
 
 from openteach.ros_links.bimanual import DexArmControl
-from openteach.utils.network import ZMQKeypointSubscriber
 
 from .robot import RobotWrapper
 
@@ -85,10 +84,9 @@ class Bimanual(RobotWrapper):
         self._controller.set_gripper_status(gripper_state)
 
     def get_gripper_state_from_socket(self):
-        self._gripper_state_subscriber = ZMQKeypointSubscriber(
-            host="10.19.216.156", port=8108, topic="gripper_right"
-        )
-        gripper_state = self._gripper_state_subscriber.recv_keypoints()
+        gripper_state = self._get_keypoint_subscriber(
+            "10.19.216.156", 8108, "gripper_right"
+        ).recv_keypoints()
         gripper_state_dict = dict(
             gripper_position=np.array(gripper_state, dtype=np.float32),
             timestamp=time.time(),
@@ -96,10 +94,9 @@ class Bimanual(RobotWrapper):
         return gripper_state_dict
 
     def get_cartesian_state_from_socket(self):
-        self._cartesian_state_subscriber = ZMQKeypointSubscriber(
-            host="10.19.216.156", port=8118, topic="cartesian"
-        )
-        cartesian_state = self._cartesian_state_subscriber.recv_keypoints()
+        cartesian_state = self._get_keypoint_subscriber(
+            "10.19.216.156", 8118, "cartesian"
+        ).recv_keypoints()
         cartesian_state_dict = dict(
             cartesian_position=np.array(cartesian_state, dtype=np.float32),
             timestamp=time.time(),
@@ -107,10 +104,7 @@ class Bimanual(RobotWrapper):
         return cartesian_state_dict
 
     def get_joint_state_from_socket(self):
-        self._joint_state_subscriber = ZMQKeypointSubscriber(
-            host="10.19.216.156", port=8119, topic="joint"
-        )
-        joint_state = self._joint_state_subscriber.recv_keypoints()
+        joint_state = self._get_keypoint_subscriber("10.19.216.156", 8119, "joint").recv_keypoints()
         joint_state_dict = dict(
             joint_position=np.array(joint_state, dtype=np.float32),
             timestamp=time.time(),
@@ -119,10 +113,9 @@ class Bimanual(RobotWrapper):
         return joint_state_dict
 
     def get_cartesian_commanded_position(self):
-        self.cartesian_state_subscriber = ZMQKeypointSubscriber(
-            host="10.19.216.156", port=8120, topic="cartesian"
-        )
-        cartesian_state = self.cartesian_state_subscriber.recv_keypoints()
+        cartesian_state = self._get_keypoint_subscriber(
+            "10.19.216.156", 8120, "cartesian"
+        ).recv_keypoints()
         cartesian_state_dict = dict(
             commanded_cartesian_position=np.array(cartesian_state, dtype=np.float32),
             timestamp=time.time(),
@@ -3,7 +3,6 @@ import time
 import numpy as np
 
 from openteach.ros_links.rm65_bi import DexArmControl
-from openteach.utils.network import ZMQKeypointSubscriber
 
 from .robot import RobotWrapper
 
@@ -69,10 +68,9 @@ class RM65L(RobotWrapper):
         self._controller.move_arm_cartesian(cartesian_coords)
 
     def get_gripper_state_from_socket(self):
-        self._gripper_state_subscriber = ZMQKeypointSubscriber(
-            host="10.19.216.156", port=8115, topic="gripper_left"
-        )
-        gripper_state = self._gripper_state_subscriber.recv_keypoints()
+        gripper_state = self._get_keypoint_subscriber(
+            "10.19.216.156", 8115, "gripper_left"
+        ).recv_keypoints()
         gripper_state_dict = dict(
             gripper_position=np.array(gripper_state, dtype=np.float32),
             timestamp=time.time(),
@@ -80,10 +78,9 @@ class RM65L(RobotWrapper):
         return gripper_state_dict
 
     def get_cartesian_state_from_socket(self):
-        self.cartesian_state_subscriber = ZMQKeypointSubscriber(
-            host="10.19.216.156", port=8116, topic="cartesian"
-        )
-        cartesian_state = self.cartesian_state_subscriber.recv_keypoints()
+        cartesian_state = self._get_keypoint_subscriber(
+            "10.19.216.156", 8116, "cartesian"
+        ).recv_keypoints()
         cartesian_state_dict = dict(
             cartesian_position=np.array(cartesian_state, dtype=np.float32),
             timestamp=time.time(),
@@ -91,10 +88,7 @@ class RM65L(RobotWrapper):
         return cartesian_state_dict
 
     def get_joint_state_from_socket(self):
-        self._joint_state_subscriber = ZMQKeypointSubscriber(
-            host="10.19.216.156", port=8117, topic="joint"
-        )
-        joint_state = self._joint_state_subscriber.recv_keypoints()
+        joint_state = self._get_keypoint_subscriber("10.19.216.156", 8117, "joint").recv_keypoints()
         joint_state_dict = dict(
             joint_position=np.array(joint_state, dtype=np.float32),
             timestamp=time.time(),
@@ -102,10 +96,9 @@ class RM65L(RobotWrapper):
         return joint_state_dict
 
     def get_cartesian_commanded_position(self):
-        self.cartesian_state_subscriber = ZMQKeypointSubscriber(
-            host="10.19.216.156", port=8121, topic="cartesian"
-        )
-        cartesian_state = self.cartesian_state_subscriber.recv_keypoints()
+        cartesian_state = self._get_keypoint_subscriber(
+            "10.19.216.156", 8121, "cartesian"
+        ).recv_keypoints()
         # gripper_state = self._controller.robot.get_gripper_position()[1]
         cartesian_state_dict = dict(
             commanded_cartesian_position=np.array(cartesian_state, dtype=np.float32),
@@ -1,7 +1,19 @@
 from abc import ABC, abstractmethod
 
+from openteach.utils.network import ZMQKeypointSubscriber
+
 
 class RobotWrapper(ABC):
+    # Subscribers of the socket recorder functions are created once and reused for every call
+    def _get_keypoint_subscriber(self, host, port, topic):
+        if not hasattr(self, "_keypoint_subscribers"):
+            self._keypoint_subscribers = dict()
+        if (host, port, topic) not in self._keypoint_subscribers:
+            self._keypoint_subscribers[(host, port, topic)] = ZMQKeypointSubscriber(
+                host=host, port=port, topic=topic
+            )
+        return self._keypoint_subscribers[(host, port, topic)]
+
     @property
     @abstractmethod
     def name(self):
@@ -0,0 +1,71 @@
+import numpy as np
+
+ALIGNMENT_POLICIES = ("next", "nearest")
+
+
+def match_timestamps(
+    timestamps, reference_timestamps, policy="next", tolerance=None, previous_idx=None
+):
+    """
+    Returns the index in the sorted timestamps array matching every sorted reference timestamp,
+    or -1 where there is no match, in one vectorized pass.
+
+    The "next" policy matches the first timestamp at or after the reference and "nearest" the
+    closest one. With a tolerance, matches further than it from the reference are rejected.
+    With previous_idx, every match comes after the previous match, the first one after
+    previous_idx, so that no frame is used twice.
+    """
+    timestamps = np.asarray(timestamps)
+    reference_timestamps = np.asarray(reference_timestamps)
+    if len(timestamps) == 0:
+        return np.full(len(reference_timestamps), -1, dtype=np.int64)
+
+    idxs = np.searchsorted(timestamps, reference_timestamps, side="left")
+    if policy == "nearest":
+        before_idxs = np.maximum(idxs - 1, 0)
+        after_idxs = np.minimum(idxs, len(timestamps) - 1)
+        use_before = (idxs > 0) & (
+            (idxs == len(timestamps))
+            | (
+                reference_timestamps - timestamps[before_idxs]
+                <= timestamps[after_idxs] - reference_timestamps
+            )
+        )
+        idxs = np.where(use_before, idxs - 1, idxs)
+    elif policy != "next":
+        raise ValueError(
+            "Unknown alignment policy {}. Choose from {}.".format(policy, ALIGNMENT_POLICIES)
+        )
+
+    if previous_idx is not None:
+        # idx[k] = max(idx[k], idx[k - 1] + 1) is a running maximum of idx[k] - k
+        steps = np.arange(1, len(idxs) + 1)
+        idxs = np.maximum.accumulate(np.maximum(idxs - steps, previous_idx)) + steps
+
+    valid = idxs < len(timestamps)
+    if tolerance is not None:
+        matched_timestamps = timestamps[np.minimum(idxs, len(timestamps) - 1)]
+        valid &= np.abs(matched_timestamps - reference_timestamps) <= tolerance
+
+    return np.where(valid, idxs, -1).astype(np.int64)
+
+
+def match_streams(streams, reference_timestamps, policy="next", tolerance=None, previous_idxs=None):
+    """
+    Matches the reference timestamps in every stream of a {name: [timestamp arrays]} dict, e.g.
+    the rgb and depth timestamps of every camera. Returns the matched indices with the same
+    structure and a mask of the reference timestamps matched in all the streams.
+    """
+    matched_idxs = dict()
+    valid = np.ones(len(reference_timestamps), dtype=bool)
+    for name, timestamp_arrays in streams.items():
+        matched_idxs[name] = []
+        for stream_idx, timestamps in enumerate(timestamp_arrays):
+            previous_idx = None if previous_idxs is None else previous_idxs[name][stream_idx]
+            idxs = match_timestamps(
+                timestamps, reference_timestamps, policy, tolerance, previous_idx
+            )
+            matched_idxs[name].append(idxs)
+            valid &= idxs >= 0
+
+    return matched_idxs, valid
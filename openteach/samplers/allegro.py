@@ -7,14 +7,29 @@ from tqdm import tqdm
 from openteach.constants import *
 from openteach.robot.allegro.allegro_kdl import AllegroKDL
 from openteach.robot.kinova import KinovaArm
-from openteach.utils.vectorops import get_distance
+from openteach.utils.vectorops import get_distance, get_distance_subsample_idxs
 
 from .sampler import Sampler
 
 
 class AllegroSampler(Sampler):
-    def __init__(self, data_path, cam_idxs, data_type, min_action_distance):
-        super().__init__(data_path, cam_idxs, data_type, min_action_distance)
+    def __init__(
+        self,
+        data_path,
+        cam_idxs,
+        data_type,
+        min_action_distance,
+        alignment_policy="next",
+        alignment_tolerance=None,
+    ):
+        super().__init__(
+            data_path,
+            cam_idxs,
+            data_type,
+            min_action_distance,
+            alignment_policy,
+            alignment_tolerance,
+        )
         self._robot = AllegroKDL()
 
     def _get_robot_data(self):
@@ -51,43 +66,27 @@ class AllegroSampler(Sampler):
         print("Obtaining all the starting indices.")
         self._get_starting_idxs()
         self.chosen_timestamps = []
-        # Sampling the allegro indices based on the minimum action distance
-        previous_idx = self._chosen_allegro_idxs[-1]
-        previous_state = self._robot.get_fingertip_coords(self._allegro_states[previous_idx])
 
+        # Fingertip coordinates of all the candidate states at once
         print("Starting sampling process.")
-        for current_idx in tqdm(
-            range(
-                self._chosen_allegro_idxs[-1],
-                self._allegro_states.shape[0],
-                ALLEGRO_SAMPLE_OFFSET,
-            )
-        ):
-            # Check if next state is valid
-            if current_idx < self._allegro_states.shape[0]:
-                current_state = self._robot.get_fingertip_coords(self._allegro_states[current_idx])
-            else:
-                break
-
-            # Check if action distance is greater than minimum action distance
-            if get_distance(current_state, previous_state) > self._min_action_distance:
-                # Update the index information
-                self._chosen_allegro_idxs.append(current_idx)
-                print("Choosen idxs", self._chosen_allegro_idxs)
-
-                previous_idx = current_idx
-                previous_state = current_state
-
-                # Get the timestamp of the new state
-                current_timestamp = self._allegro_timestamps[current_idx]
-                # kinova_idx=self._get_matching_timestamp(self._kinova_timestamps, current_timestamp)
-                # self._chosen_kinova_idxs.append(kinova_idx)
-                # self.chosen_timestamps.append(current_timestamp)
-                # Finding corresponding image idxs
-                success = self._sample_images(current_timestamp)
+        candidate_idxs = np.arange(
+            self._chosen_allegro_idxs[-1],
+            self._allegro_states.shape[0],
+            ALLEGRO_SAMPLE_OFFSET,
+        )
+        fingertip_coords = self._robot.get_batched_fingertip_coords(
+            self._allegro_states[candidate_idxs]
+        )
 
-                if not success:
-                    break
+        # Sampling the allegro indices based on the minimum action distance
+        sampled_idxs = candidate_idxs[
+            get_distance_subsample_idxs(fingertip_coords, self._min_action_distance)
+        ]
+
+        # Finding the image idxs of all the sampled states at once, the states without
+        # matching frames in every camera are left out
+        matched = self._sample_all_images(self._allegro_timestamps[sampled_idxs])
+        self._chosen_allegro_idxs.extend(sampled_idxs[matched].tolist())
 
         print("Sampling finished.")
         print("Extracted number of states: {}".format(len(self._chosen_allegro_idxs)))
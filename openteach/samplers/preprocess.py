@@ -0,0 +1,197 @@
+import json
+import os
+import re
+import time
+import traceback
+from multiprocessing import Pool
+
+import cv2
+import h5py
+import numpy as np
+
+from openteach.utils.episode import EPISODE_FILE_NAME, pack_episode
+
+from .allegro import AllegroSampler
+
+PROCESSED_DIRECTORY = "processed"
+SUMMARY_FILE_NAME = "summary.json"
+DATASET_INDEX_FILE_NAME = "dataset_index.json"
+# Options that change the outputs, the outputs of other values are processed again
+SAMPLING_CONFIG_KEYS = [
+    "cam_idxs",
+    "data_type",
+    "min_action_distance",
+    "alignment_policy",
+    "alignment_tolerance",
+    "pack_episode",
+]
+
+
+def find_demonstrations(storage_path):
+    # demonstration_{n} folders sorted by their number
+    demonstrations = []
+    for name in os.listdir(storage_path):
+        match = re.fullmatch(r"demonstration_(\d+)", name)
+        if match is not None and os.path.isdir(os.path.join(storage_path, name)):
+            demonstrations.append((int(match.group(1)), os.path.join(storage_path, name)))
+
+    return [path for _, path in sorted(demonstrations)]
+
+
+def _get_latest_input_time(demo_path):
+    latest_time = 0
+    for name in os.listdir(demo_path):
+        path = os.path.join(demo_path, name)
+        if os.path.isfile(path):
+            latest_time = max(latest_time, os.path.getmtime(path))
+    return latest_time
+
+
+def get_sampling_configs(configs):
+    sampling_configs = {key: configs.get(key) for key in SAMPLING_CONFIG_KEYS}
+    sampling_configs["cam_idxs"] = list(sampling_configs["cam_idxs"])
+    sampling_configs["pack_episode"] = bool(sampling_configs["pack_episode"])
+    return sampling_configs
+
+
+def is_preprocessed(demo_path, configs):
+    # The summary is written last, it is only there if all the outputs are
+    summary_path = os.path.join(demo_path, PROCESSED_DIRECTORY, SUMMARY_FILE_NAME)
+    if not os.path.exists(summary_path):
+        return False
+    if os.path.getmtime(summary_path) <= _get_latest_input_time(demo_path):
+        return False
+
+    # Outputs of other sampling options
+    with open(summary_path, "r") as file:
+        summary = json.load(file)
+    return summary.get("configs") == get_sampling_configs(configs)
+
+
+def preprocess_demonstration(demo_path, configs):
+    """
+    Samples one demonstration of the Allegro hand and stores the sampled robot states, the
+    sampled RGB frames of every camera as videos, the sampled depth frames and, with
+    pack_episode, the whole episode in a single file in demo_path/processed. Returns the summary
+    of the outputs and of the sampling options, which is also stored in the summary file.
+    """
+    output_path = os.path.join(demo_path, PROCESSED_DIRECTORY)
+    os.makedirs(output_path, exist_ok=True)
+
+    sampler = AllegroSampler(
+        data_path=demo_path,
+        cam_idxs=list(configs["cam_idxs"]),
+        data_type=configs["data_type"],
+        min_action_distance=configs["min_action_distance"],
+        alignment_policy=configs["alignment_policy"],
+        alignment_tolerance=configs["alignment_tolerance"],
+    )
+    sampler.sample_data()
+
+    outputs = dict()
+    robot_idxs = np.array(sampler.sampled_robot_idxs(), dtype=np.int64)
+    states_path = os.path.join(output_path, "sampled_states.h5")
+    with h5py.File(states_path, "w") as file:
+        file.create_dataset("allegro_idxs", data=robot_idxs)
+        file.create_dataset("allegro_states", data=sampler.sampled_allegro_states)
+        for data_type, frame_idxs in sampler.sampled_frame_idxs.items():
+            for cam_idx, idxs in zip(configs["cam_idxs"], frame_idxs):
+                file.create_dataset("cam_{}_{}_idxs".format(cam_idx, data_type), data=idxs)
+    outputs["sampled_states"] = states_path
+
+    if configs["data_type"] in ("rgb", "all"):
+        for cam_idx in configs["cam_idxs"]:
+            video_path = os.path.join(output_path, "cam_{}_rgb_video.avi".format(cam_idx))
+            sampler.save_sampled_rgb_frames(cam_idx, video_path)
+            outputs["cam_{}_rgb".format(cam_idx)] = video_path
+
+    if configs["data_type"] in ("depth", "all"):
+        for cam_idx in configs["cam_idxs"]:
+            depth_path = os.path.join(output_path, "cam_{}_depth.h5".format(cam_idx))
+            with h5py.File(depth_path, "w") as file:
+                file.create_dataset(
+                    "depth_images",
+                    data=sampler.get_sampled_depth_frames(cam_idx),
+                    compression="lzf",
+                )
+            outputs["cam_{}_depth".format(cam_idx)] = depth_path
+
+    if configs.get("pack_episode", False):
+        outputs["episode"] = pack_episode(
+            demo_path, episode_path=os.path.join(output_path, EPISODE_FILE_NAME)
+        )
+
+    summary = dict(
+        demonstration=os.path.basename(demo_path),
+        path=demo_path,
+        num_states=len(robot_idxs),
+        configs=get_sampling_configs(configs),
+        outputs=outputs,
+        processed_time=time.time(),
+    )
+    with open(os.path.join(output_path, SUMMARY_FILE_NAME), "w") as file:
+        json.dump(summary, file, indent=4)
+
+    return summary
+
+
+def _init_worker():
+    # One process per demonstration, OpenCV threads would only compete with the other workers
+    cv2.setNumThreads(1)
+
+
+def _preprocess_worker(job):
+    demo_path, configs = job
+    if not configs["overwrite"] and is_preprocessed(demo_path, configs):
+        summary_path = os.path.join(demo_path, PROCESSED_DIRECTORY, SUMMARY_FILE_NAME)
+        with open(summary_path, "r") as file:
+            summary = json.load(file)
+        summary["status"] = "cached"
+        return summary
+
+    try:
+        summary = preprocess_demonstration(demo_path, configs)
+        summary["status"] = "processed"
+    except Exception:
+        summary = dict(
+            demonstration=os.path.basename(demo_path),
+            path=demo_path,
+            status="failed",
+            error=traceback.format_exc(),
+        )
+    return summary
+
+
+def preprocess_demonstrations(configs):
+    """
+    Preprocesses every demonstration_{n} folder of configs["storage_path"] in a process pool and
+    writes the dataset index with the summary of every demonstration.
+    """
+    demo_paths = find_demonstrations(configs["storage_path"])
+    print("Found {} demonstrations in {}.".format(len(demo_paths), configs["storage_path"]))
+
+    num_processes = configs["num_processes"] or os.cpu_count()
+    summaries = dict()
+    with Pool(min(num_processes, max(1, len(demo_paths))), initializer=_init_worker) as pool:
+        jobs = [(demo_path, configs) for demo_path in demo_paths]
+        for summary in pool.imap_unordered(_preprocess_worker, jobs):
+            print("{}: {}".format(summary["demonstration"], summary["status"]))
+            if summary["status"] == "failed":
+                print(summary["error"])
+            summaries[summary["path"]] = summary
+
+    # In the order of the demonstrations
+    summaries = [summaries[demo_path] for demo_path in demo_paths]
+
+    dataset_index = dict(
+        storage_path=configs["storage_path"],
+        num_demonstrations=len(summaries),
+        num_states=sum(summary.get("num_states", 0) for summary in summaries),
+        demonstrations=summaries,
+    )
+    index_path = os.path.join(configs["storage_path"], DATASET_INDEX_FILE_NAME)
+    with open(index_path, "w") as file:
+        json.dump(dataset_index, file, indent=4)
+
+    print("Stored the dataset index in {}.".format(index_path))
+    return dataset_index
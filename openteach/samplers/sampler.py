@@ -1,20 +1,35 @@
 import os
 from abc import ABC, abstractmethod
+from multiprocessing import Pool
 
 import cv2
 import h5py
 import numpy as np
 
+import openteach.utils.hdf5  # noqa: F401 - registers the hdf5plugin filters used by the recorders
 from openteach.constants import *
 from openteach.utils.files import get_pickle_data
+from openteach.utils.video import MJPEGReader
+
+from .alignment import match_streams, match_timestamps
 
 
 class Sampler(ABC):
-    def __init__(self, data_path, cam_idxs, data_type, min_action_distance):
+    def __init__(
+        self,
+        data_path,
+        cam_idxs,
+        data_type,
+        min_action_distance,
+        alignment_policy="next",
+        alignment_tolerance=None,
+    ):
         self.data_path = data_path
         self.cam_idxs = cam_idxs
         self.data_type = data_type
         self._min_action_distance = min_action_distance
+        self._alignment_policy = alignment_policy
+        self._alignment_tolerance = alignment_tolerance
 
         # Obtaining all the timestamp arrays
         self._get_image_frame_timestamps()
@@ -39,9 +54,10 @@ class Sampler(ABC):
         return data
 
     def _get_hdf5_timestamps(self, hdf5_file_path):
-        # with h5py.File(hdf5_file_path, '
-
-        return self._get_hdf5_data(hdf5_file_path, "timestamp", np.float64)
+        # The recorders store "timestamps", older recordings "timestamp"
+        with h5py.File(hdf5_file_path, "r") as file:
+            key = "timestamps" if "timestamps" in file else "timestamp"
+        return self._get_hdf5_data(hdf5_file_path, key, np.float64)
 
     def _get_image_frame_timestamps(self):
         self.image_frame_timestamps = dict()
@@ -75,9 +91,8 @@ class Sampler(ABC):
 
     # To pick the corresponding timestamps
     def _get_matching_timestamp(self, timestamp_array, reference_timestamp):
-        differences = timestamp_array - reference_timestamp
-        idx = np.argmax(differences >= 0)
-        if idx >= 0 and differences[idx] >= 0:
+        idx = match_timestamps(timestamp_array, [reference_timestamp])[0]
+        if idx >= 0:
             return idx
         else:
             return None
@@ -164,6 +179,31 @@ class Sampler(ABC):
 
         return True
 
+    # To sample the frames of all the given timestamps at once
+    def _sample_all_images(self, reference_timestamps):
+        """
+        Matches the reference timestamps with the frames of every camera, after the frames used
+        so far, and appends the frames of the timestamps matched in all the cameras. Returns
+        the mask of these timestamps.
+        """
+        previous_idxs = {
+            data_type: [frame_idxs[-1] for frame_idxs in self._chosen_frame_idxs[data_type]]
+            for data_type in self._chosen_frame_idxs.keys()
+        }
+        matched_idxs, valid = match_streams(
+            self.image_frame_timestamps,
+            reference_timestamps,
+            policy=self._alignment_policy,
+            tolerance=self._alignment_tolerance,
+            previous_idxs=previous_idxs,
+        )
+
+        for data_type in matched_idxs.keys():
+            for cam_idx, frame_idxs in enumerate(matched_idxs[data_type]):
+                self._chosen_frame_idxs[data_type][cam_idx].extend(frame_idxs[valid].tolist())
+
+        return valid
+
     @property
     def sampled_rgb_frame_idxs(self):
         if self.data_type == "rgb" or self.data_type == "all":
@@ -173,6 +213,11 @@ class Sampler(ABC):
         else:
             return None
 
+    @property
+    def sampled_frame_idxs(self):
+        # The chosen frames of every camera, for every data type
+        return self._chosen_frame_idxs
+
     @property
     def sampled_depth_frame_idxs(self):
         if self.data_type == "depth" or self.data_type == "all":
@@ -180,45 +225,81 @@ class Sampler(ABC):
         else:
             return None
 
+    def _get_rgb_video_path(self, cam_idx):
+        mjpeg_path = os.path.join(self.data_path, "cam_{}_rgb_video.mjpeg".format(cam_idx))
+        if os.path.exists(mjpeg_path):
+            return mjpeg_path
+        return os.path.join(self.data_path, "cam_{}_rgb_video.avi".format(cam_idx))
+
     def save_sampled_rgb_frames(self, cam_idx, store_path):
         if self.data_type == "rgb" or self.data_type == "all":
-            capture = cv2.VideoCapture(
-                os.path.join(self.data_path, "cam_{}_rgb_video.avi".format(cam_idx))
-            )
-            writer = cv2.VideoWriter(
-                store_path,
-                cv2.VideoWriter_fourcc(*"XVID"),
-                SAMPLE_WRITER_FPS,
-                IMAGE_RECORD_RESOLUTION,
-            )
-
-            counter, num_frames_recorded = 0, 0
-            print("Writing the frames.")
-            while capture.isOpened():
-                ret, frame = capture.read()
-                if ret == True:
-                    if counter in self._chosen_frame_idxs["rgb"][cam_idx]:
-                        writer.write(frame)
-                        num_frames_recorded += 1
-                    counter += 1
-                else:
-                    break
-
-            # When everything done, release the video capture object
-            print("Storing {} frames".format(num_frames_recorded))
-            print("Saving video in {}".format(store_path))
-            writer.release()
-            capture.release()
+            frame_idxs = self._chosen_frame_idxs["rgb"][self.cam_idxs.index(cam_idx)]
+            save_video_frames(self._get_rgb_video_path(cam_idx), frame_idxs, store_path)
+
+    def save_all_sampled_rgb_frames(self, store_paths, num_processes=None):
+        """
+        Saves the sampled frames of every camera, store_paths[i] for self.cam_idxs[i], with one
+        process per camera.
+        """
+        if self.data_type == "rgb" or self.data_type == "all":
+            jobs = [
+                (self._get_rgb_video_path(cam_idx), self._chosen_frame_idxs["rgb"][idx], store_path)
+                for idx, (cam_idx, store_path) in enumerate(zip(self.cam_idxs, store_paths))
+            ]
+            if len(jobs) == 0:
+                return
+            with Pool(num_processes or len(jobs)) as pool:
+                pool.starmap(save_video_frames, jobs)
 
     def get_sampled_depth_frames(self, cam_idx):
         if self.data_type == "depth" or self.data_type == "all":
-            depth_data = self._get_hdf5_data(
-                hdf5_path=os.path.join(self.data_path, "cam_{}_depth.h5".format(cam_idx)),
-                required_data="depth_images",
-                dtype=np.uint16,
-            )
-            return depth_data[self._chosen_frame_idxs["depth"][cam_idx]]
+            frame_idxs = self._chosen_frame_idxs["depth"][self.cam_idxs.index(cam_idx)]
+            hdf5_path = os.path.join(self.data_path, "cam_{}_depth.h5".format(cam_idx))
+            # Only the chosen frames are read, they are increasing
+            with h5py.File(hdf5_path, "r") as depth_file:
+                return np.array(depth_file["depth_images"][frame_idxs], dtype=np.uint16)
 
     @abstractmethod
     def sample_data(self):
         pass
+
+
+def save_video_frames(video_path, frame_idxs, store_path):
+    """
+    Writes the frames at frame_idxs of a recorded RGB video into a new video. Motion JPEG
+    recordings are read by index. For the other videos the frames in between are only grabbed,
+    without the color conversion, and reading stops after the last chosen frame.
+    """
+    writer = cv2.VideoWriter(
+        store_path,
+        cv2.VideoWriter_fourcc(*"XVID"),
+        SAMPLE_WRITER_FPS,
+        IMAGE_RECORD_RESOLUTION,
+    )
+
+    num_frames_recorded = 0
+    print("Writing the frames of {}.".format(video_path))
+    if video_path.endswith(".mjpeg"):
+        reader = MJPEGReader(video_path)
+        for frame_idx in frame_idxs:
+            writer.write(reader.read(frame_idx))
+            num_frames_recorded += 1
+        reader.release()
+    else:
+        capture = cv2.VideoCapture(video_path)
+        chosen_frame_idxs = set(frame_idxs)
+        last_frame_idx = max(chosen_frame_idxs, default=-1)
+        for counter in range(last_frame_idx + 1):
+            if not capture.grab():
+                break
+
+            if counter in chosen_frame_idxs:
+                _, frame = capture.retrieve()
+                writer.write(frame)
+                num_frames_recorded += 1
+        capture.release()
+
+    print("Storing {} frames".format(num_frames_recorded))
+    print("Saving video in {}".format(store_path))
+    writer.release()
+    return num_frames_recorded
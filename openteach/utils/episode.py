@@ -0,0 +1,316 @@
+import os
+import re
+import time
+
+import cv2
+import h5py
+import numpy as np
+
+from openteach.utils.files import get_pickle_data
+from openteach.utils.hdf5 import get_compression_filter
+from openteach.utils.images import JPEGCodec
+from openteach.utils.video import MJPEGReader
+
+EPISODE_FILE_NAME = "episode.h5"
+TIME_INDEX_GROUP = "time_index"
+
+# Camera timestamps are recorded in milliseconds, robot and sensor states in seconds
+CAMERA_TIMESTAMP_SCALE = 1e-3
+# Depth frames copied to the episode file at a time
+EPISODE_COPY_ROWS = 100
+
+_RGB_VIDEO_PATTERN = re.compile(r"(cam_\d+)_rgb_video\.metadata")
+_DEPTH_PATTERN = re.compile(r"(cam_\d+)_depth\.h5")
+
+
+def _store_attributes(group, metadata):
+    # Only the scalar metadata, the timestamps are stored as a dataset
+    for key, value in metadata.items():
+        if isinstance(value, (int, float, str, bytes, np.number, np.bool_)):
+            group.attrs[key] = value
+
+
+def _get_rgb_video_path(demo_path, name):
+    # Same preference as the sampler: the Motion JPEG recording if there is one
+    for extension in (".mjpeg", ".avi"):
+        video_path = os.path.join(demo_path, name + "_rgb_video" + extension)
+        if os.path.exists(video_path):
+            return video_path
+    return None
+
+
+def _iterate_encoded_frames(video_path, num_frames, jpeg_codec):
+    if video_path.endswith(".mjpeg"):
+        reader = MJPEGReader(video_path)
+        for frame_idx in range(min(num_frames, len(reader))):
+            yield np.frombuffer(reader.read_encoded(frame_idx), np.uint8)
+        reader.release()
+        return
+
+    video = cv2.VideoCapture(video_path)
+    for _ in range(num_frames):
+        success, frame = video.read()
+        if not success:
+            break
+        yield jpeg_codec.encode(frame).reshape(-1)
+    video.release()
+
+
+def _pack_rgb_stream(episode_file, demo_path, name, metadata_path, jpeg_codec):
+    video_path = _get_rgb_video_path(demo_path, name)
+    if video_path is None:
+        return None
+
+    metadata = get_pickle_data(metadata_path)
+    timestamps = np.array(metadata["timestamps"], dtype=np.float64) * CAMERA_TIMESTAMP_SCALE
+
+    # JPEG frames of varying length, one row per timestamp
+    group = episode_file.create_group(name + "_rgb")
+    frames = group.create_dataset(
+        "frames",
+        shape=(len(timestamps),),
+        maxshape=(None,),
+        dtype=h5py.vlen_dtype(np.uint8),
+        chunks=(EPISODE_COPY_ROWS,),
+    )
+    num_frames = 0
+    for frame in _iterate_encoded_frames(video_path, len(timestamps), jpeg_codec):
+        frames[num_frames] = frame
+        num_frames += 1
+
+    # Older videos can be missing the last frames
+    frames.resize((num_frames,))
+    group.create_dataset("timestamps", data=timestamps[:num_frames])
+    group.attrs["kind"] = "rgb"
+    group.attrs["source"] = os.path.basename(video_path)
+    _store_attributes(group, metadata)
+    return group.name.strip("/")
+
+
+def _pack_depth_stream(episode_file, depth_path, name, compression, compression_level):
+    group = episode_file.create_group(name + "_depth")
+    with h5py.File(depth_path, "r") as depth_file:
+        key = "timestamps" if "timestamps" in depth_file else "timestamp"
+        timestamps = np.array(depth_file[key], dtype=np.float64) * CAMERA_TIMESTAMP_SCALE
+        depth_images = depth_file["depth_images"]
+
+        # One frame per chunk, so that single frames are read without the others
+        images = group.create_dataset(
+            "depth_images",
+            shape=depth_images.shape,
+            dtype=depth_images.dtype,
+            chunks=(1,) + depth_images.shape[1:],
+            **get_compression_filter(compression, compression_level),
+        )
+        for start in range(0, len(depth_images), EPISODE_COPY_ROWS):
+            end = min(start + EPISODE_COPY_ROWS, len(depth_images))
+            images[start:end] = depth_images[start:end]
+
+        for data_key in depth_file:
+            if depth_file[data_key].shape == ():
+                group.attrs[data_key] = depth_file[data_key][()]
+
+    group.create_dataset("timestamps", data=timestamps)
+    group.attrs["kind"] = "depth"
+    group.attrs["source"] = os.path.basename(depth_path)
+    return group.name.strip("/")
+
+
+def _pack_state_stream(episode_file, state_path):
+    group = episode_file.create_group(os.path.splitext(os.path.basename(state_path))[0])
+    with h5py.File(state_path, "r") as state_file:
+        key = "timestamps" if "timestamps" in state_file else "timestamp"
+        timestamps = np.array(state_file[key], dtype=np.float64)
+        for data_key in state_file:
+            dataset = state_file[data_key]
+            if dataset.shape == ():
+                group.attrs[data_key] = dataset[()]
+            elif data_key != key and len(dataset) == len(timestamps):
+                # States are small, they are stored uncompressed so that they can be memory-mapped
+                group.create_dataset(data_key, data=dataset[()])
+
+    group.create_dataset("timestamps", data=timestamps)
+    group.attrs["kind"] = "state"
+    group.attrs["source"] = os.path.basename(state_path)
+    return group.name.strip("/")
+
+
+def _write_time_index(episode_file, stream_names, reference_stream):
+    # For every sample of the reference stream, the latest sample of every stream at or before it
+    reference_timestamps = episode_file[reference_stream]["timestamps"][()]
+    time_index = episode_file.create_group(TIME_INDEX_GROUP)
+    time_index.attrs["reference_stream"] = reference_stream
+    time_index.create_dataset("timestamps", data=reference_timestamps)
+    for name in stream_names:
+        timestamps = episode_file[name]["timestamps"][()]
+        idxs = np.searchsorted(timestamps, reference_timestamps, side="right") - 1
+        time_index.create_dataset(name, data=idxs.astype(np.int64))
+
+
+def pack_episode(
+    demo_path,
+    episode_path=None,
+    reference_stream=None,
+    compression="lzf",
+    compression_level=None,
+):
+    """
+    Packs the recordings of a demonstration folder into a single chunked HDF5 file: one group
+    per stream with its timestamps in seconds, the RGB frames as JPEGs, the depth frames one per
+    chunk and the robot and sensor states uncompressed. The time_index group holds, for every
+    sample of the reference stream (the first state stream by default), the index of the latest
+    sample of every stream at or before it. Returns the path of the episode file.
+    """
+    if episode_path is None:
+        episode_path = os.path.join(demo_path, EPISODE_FILE_NAME)
+
+    jpeg_codec = JPEGCodec(quality=95)
+    stream_names = []
+    state_stream_names = []
+    with h5py.File(episode_path, "w") as episode_file:
+        for file_name in sorted(os.listdir(demo_path)):
+            file_path = os.path.join(demo_path, file_name)
+            if os.path.abspath(file_path) == os.path.abspath(episode_path):
+                continue
+
+            rgb_match = _RGB_VIDEO_PATTERN.fullmatch(file_name)
+            depth_match = _DEPTH_PATTERN.fullmatch(file_name)
+            if rgb_match is not None:
+                stream_name = _pack_rgb_stream(
+                    episode_file, demo_path, rgb_match.group(1), file_path, jpeg_codec
+                )
+            elif depth_match is not None:
+                stream_name = _pack_depth_stream(
+                    episode_file,
+                    file_path,
+                    depth_match.group(1),
+                    compression,
+                    compression_level,
+                )
+            elif file_name.endswith(".h5"):
+                stream_name = _pack_state_stream(episode_file, file_path)
+                state_stream_names.append(stream_name)
+            else:
+                continue
+
+            if stream_name is not None:
+                stream_names.append(stream_name)
+
+        if len(stream_names) == 0:
+            raise ValueError("No recordings found in {}.".format(demo_path))
+
+        if reference_stream is None:
+            reference_stream = state_stream_names[0] if state_stream_names else stream_names[0]
+        _write_time_index(episode_file, stream_names, reference_stream.strip("/"))
+
+        episode_file.attrs["demonstration"] = os.path.basename(os.path.normpath(demo_path))
+        episode_file.attrs["packed_time"] = time.time()
+
+    return episode_path
+
+
+class EpisodeStream(object):
+    """
+    A stream of an episode file. The timestamps are read when it is opened, the data is only
+    read for the requested indices or time range.
+    """
+
+    def __init__(self, episode_file, episode_path, name):
+        self._group = episode_file[name]
+        self._episode_path = episode_path
+        self.name = name
+        self.kind = self._group.attrs["kind"]
+        self.timestamps = self._group["timestamps"][()]
+        self.keys = [key for key in self._group.keys() if key != "timestamps"]
+
+    def __len__(self):
+        return len(self.timestamps)
+
+    @property
+    def attributes(self):
+        return dict(self._group.attrs)
+
+    def get_idx_range(self, start_time=None, end_time=None):
+        # Samples with start_time <= timestamp < end_time
+        start = 0 if start_time is None else np.searchsorted(self.timestamps, start_time, "left")
+        end = len(self) if end_time is None else np.searchsorted(self.timestamps, end_time, "left")
+        return slice(int(start), int(end))
+
+    def get_array(self, key):
+        """
+        Returns a memory-mapped array for uncompressed contiguous datasets (the states) and the
+        lazy h5py dataset otherwise.
+        """
+        dataset = self._group[key]
+        offset = dataset.id.get_offset()
+        if dataset.chunks is not None or offset is None or dataset.dtype.kind == "O":
+            return dataset
+        return np.memmap(
+            self._episode_path,
+            mode="r",
+            dtype=dataset.dtype,
+            shape=dataset.shape,
+            offset=offset,
+        )
+
+    def read(self, key, idxs=slice(None)):
+        # idxs is an index, a slice or increasing indices
+        if self.kind == "rgb" and key == "frames":
+            return self.read_rgb_frames(idxs)
+        return np.asarray(self.get_array(key)[idxs])
+
+    def read_time_range(self, key, start_time=None, end_time=None):
+        return self.read(key, self.get_idx_range(start_time, end_time))
+
+    def read_rgb_frames(self, idxs=slice(None)):
+        # BGR like the frames of cv2.VideoCapture
+        frames = self._group["frames"][idxs]
+        if isinstance(frames, np.ndarray) and frames.dtype.kind == "u":
+            return cv2.imdecode(frames, cv2.IMREAD_COLOR)
+        return np.stack([cv2.imdecode(frame, cv2.IMREAD_COLOR) for frame in frames])
+
+
+class EpisodeReader(object):
+    """
+    Reads the streams of an episode file written by pack_episode without loading them.
+
+        with EpisodeReader(episode_path) as episode:
+            states = episode["allegro_joint_states"].read_time_range("joint_angles", t0, t1)
+            frame_idxs = episode.get_aligned_idxs("cam_0_rgb", slice(100, 200))
+    """
+
+    def __init__(self, episode_path):
+        self.episode_path = episode_path
+        self._file = h5py.File(episode_path, "r")
+        self.streams = [name for name in self._file.keys() if name != TIME_INDEX_GROUP]
+        self._streams = dict()
+
+    def __getitem__(self, name):
+        name = name.strip("/")
+        if name not in self._streams:
+            self._streams[name] = EpisodeStream(self._file, self.episode_path, name)
+        return self._streams[name]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    @property
+    def reference_stream(self):
+        return self._file[TIME_INDEX_GROUP].attrs["reference_stream"]
+
+    @property
+    def reference_timestamps(self):
+        return self._file[TIME_INDEX_GROUP]["timestamps"][()]
+
+    def get_aligned_idxs(self, name, reference_idxs=slice(None)):
+        """
+        Indices of the stream samples aligned with the reference stream samples, -1 where the
+        stream has no sample yet.
+        """
+        return self._file[TIME_INDEX_GROUP][name.strip("/")][reference_idxs]
+
+    def close(self):
+        self._file.close()
@@ -0,0 +1,126 @@
+import h5py
+import numpy as np
+
+try:
+    # Registers the lz4, zstd and blosc filters with h5py
+    import hdf5plugin
+except ImportError:
+    hdf5plugin = None
+
+# Number of samples kept in memory before they are appended to the file
+HDF5_FLUSH_EVERY = 100
+# Upper bound for the size of a single HDF5 chunk
+HDF5_CHUNK_BYTES = 1 << 20
+
+HDF5_PLUGIN_COMPRESSIONS = ("lz4", "zstd", "blosc")
+
+
+def get_compression_filter(compression="gzip", level=None):
+    """
+    Returns the create_dataset keyword arguments for a compression name:
+    None, "gzip", "lzf" or, with hdf5plugin installed, "lz4", "zstd" and "blosc".
+    Files using the hdf5plugin filters need hdf5plugin to be imported to be read.
+    """
+    if compression is None or compression == "none":
+        return dict()
+
+    if compression in HDF5_PLUGIN_COMPRESSIONS and hdf5plugin is None:
+        print("hdf5plugin is not installed, using gzip instead of {}.".format(compression))
+        compression = "gzip"
+
+    if compression == "gzip":
+        return dict(compression="gzip", compression_opts=6 if level is None else level)
+    if compression == "lzf":
+        return dict(compression="lzf")
+    if compression == "lz4":
+        return dict(hdf5plugin.LZ4())
+    if compression == "zstd":
+        return dict(hdf5plugin.Zstd(clevel=3 if level is None else level))
+    if compression == "blosc":
+        return dict(
+            hdf5plugin.Blosc(
+                cname="zstd",
+                clevel=5 if level is None else level,
+                shuffle=hdf5plugin.Blosc.SHUFFLE,
+            )
+        )
+
+    raise ValueError("Unknown HDF5 compression: {}".format(compression))
+
+
+class HDF5StreamWriter(object):
+    """
+    Appends samples to chunked, resizable HDF5 datasets while recording.
+
+    Samples are copied into preallocated numpy buffers and written to the file
+    every `flush_every` samples, so memory stays bounded however long the
+    recording runs. The file is only touched and flushed at those points, so
+    it stays readable up to the last flush if the process is killed.
+    """
+
+    def __init__(
+        self,
+        file_path,
+        flush_every=HDF5_FLUSH_EVERY,
+        dtypes=None,
+        default_dtype=np.float32,
+        compression="gzip",
+        compression_level=None,
+    ):
+        self.file_path = file_path
+        self.flush_every = flush_every
+        self._dtypes = dtypes if dtypes is not None else dict()
+        self._default_dtype = default_dtype
+        self._compression_filter = get_compression_filter(compression, compression_level)
+
+        self._file = h5py.File(file_path, "w")
+        self._buffers = dict()
+        self._num_buffered = 0
+        self.num_samples = 0
+
+    def _create_datasets(self, sample):
+        for name, value in sample.items():
+            value = np.asarray(value)
+            dtype = np.dtype(self._dtypes.get(name, self._default_dtype))
+            sample_bytes = max(1, value.size * dtype.itemsize)
+            chunk_rows = max(1, min(self.flush_every, HDF5_CHUNK_BYTES // sample_bytes))
+
+            self._buffers[name] = np.empty((self.flush_every,) + value.shape, dtype=dtype)
+            self._file.create_dataset(
+                name,
+                shape=(0,) + value.shape,
+                maxshape=(None,) + value.shape,
+                chunks=(chunk_rows,) + value.shape,
+                dtype=dtype,
+                **self._compression_filter,
+            )
+
+    def append(self, sample):
+        if not self._buffers:
+            self._create_datasets(sample)
+
+        for name, buffer in self._buffers.items():
+            buffer[self._num_buffered] = sample[name]
+
+        self._num_buffered += 1
+        if self._num_buffered == self.flush_every:
+            self.flush()
+
+    def flush(self):
+        if self._num_buffered > 0:
+            num_samples = self.num_samples + self._num_buffered
+            for name, buffer in self._buffers.items():
+                dataset = self._file[name]
+                dataset.resize(num_samples, axis=0)
+                dataset[self.num_samples :] = buffer[: self._num_buffered]
+
+            self.num_samples = num_samples
+            self._num_buffered = 0
+
+        self._file.flush()
+
+    def close(self, metadata=None):
+        self.flush()
+        if metadata is not None:
+            self._file.update(metadata)
+        self._file.close()
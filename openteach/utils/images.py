@@ -23,3 +23,171 @@ def rotate_image(image, angle):
         image = cv2.rotate(image, cv2.ROTATE_270)
 
     return image
+
+
+# Image codecs for the camera streams. The id of the codec is sent with every frame so that the
+# subscribers can decode the frames of any codec.
+IMAGE_CODEC_RAW = 0
+IMAGE_CODEC_JPEG = 1
+IMAGE_CODEC_PNG = 2
+IMAGE_CODEC_WEBP = 3
+
+
+class ImageCodec(object):
+    codec_id = None
+
+    def encode(self, image):
+        raise NotImplementedError("Function not implemented!")
+
+    def decode(self, buffer, image_shape):
+        raise NotImplementedError("Function not implemented!")
+
+
+class RawCodec(ImageCodec):
+    """
+    Sends the uint8 pixels as they are. Only worth it on loopback or very fast links.
+    """
+
+    codec_id = IMAGE_CODEC_RAW
+
+    def encode(self, image):
+        return np.ascontiguousarray(image)
+
+    def decode(self, buffer, image_shape):
+        image = np.frombuffer(buffer, np.uint8).reshape(image_shape)
+        # Single channel frames as (height, width), like the other codecs decode them
+        if image.ndim == 3 and image.shape[2] == 1:
+            image = image[:, :, 0]
+        return image
+
+
+class OpenCVCodec(ImageCodec):
+    extension = None
+
+    def __init__(self, params=()):
+        self._params = list(params)
+
+    def encode(self, image):
+        _, buffer = cv2.imencode(self.extension, image, self._params)
+        return buffer
+
+    def decode(self, buffer, image_shape):
+        # WebP stores single channel frames as color, they are decoded as grayscale
+        flags = {1: cv2.IMREAD_GRAYSCALE, 3: cv2.IMREAD_COLOR}.get(
+            image_shape[-1], cv2.IMREAD_UNCHANGED
+        )
+        return cv2.imdecode(np.frombuffer(buffer, np.uint8), flags)
+
+
+class JPEGCodec(OpenCVCodec):
+    codec_id = IMAGE_CODEC_JPEG
+    extension = ".jpg"
+
+    def __init__(self, quality=70):
+        super().__init__([int(cv2.IMWRITE_JPEG_QUALITY), quality])
+
+
+class PNGCodec(OpenCVCodec):
+    """
+    Lossless, for dataset capture where the JPEG artifacts matter.
+    """
+
+    codec_id = IMAGE_CODEC_PNG
+    extension = ".png"
+
+    def __init__(self, compression=1):
+        super().__init__([int(cv2.IMWRITE_PNG_COMPRESSION), compression])
+
+
+class WebPCodec(OpenCVCodec):
+    codec_id = IMAGE_CODEC_WEBP
+    extension = ".webp"
+
+    def __init__(self, quality=80):
+        super().__init__([int(cv2.IMWRITE_WEBP_QUALITY), quality])
+
+
+class TurboJPEGCodec(ImageCodec):
+    """
+    JPEG through libjpeg-turbo (PyTurboJPEG). The frames are regular JPEGs, so any subscriber can
+    decode them.
+    """
+
+    codec_id = IMAGE_CODEC_JPEG
+
+    def __init__(self, quality=70):
+        from turbojpeg import TJPF_BGR, TJPF_GRAY, TurboJPEG
+
+        self._quality = quality
+        self._turbojpeg = TurboJPEG()
+        self._pixel_formats = {1: TJPF_GRAY, 3: TJPF_BGR}
+
+    def encode(self, image):
+        return self._turbojpeg.encode(image, quality=self._quality)
+
+    def decode(self, buffer, image_shape):
+        image = self._turbojpeg.decode(buffer, pixel_format=self._pixel_formats[image_shape[-1]])
+        # Single channel frames as (height, width), like the other codecs decode them
+        if image.ndim == 3 and image.shape[2] == 1:
+            image = image[:, :, 0]
+        return image
+
+
+IMAGE_CODECS = {
+    "raw": RawCodec,
+    "jpeg": JPEGCodec,
+    "turbojpeg": TurboJPEGCodec,
+    "png": PNGCodec,
+    "webp": WebPCodec,
+}
+
+
+def get_image_codec(codec_configs=None):
+    """
+    Returns the codec for a codec config: None (JPEG with quality 70), a codec name or a
+    mapping with the codec name and its options, e.g. {name: jpeg, quality: 90}.
+    """
+    if codec_configs is None:
+        return JPEGCodec()
+
+    if isinstance(codec_configs, str):
+        name, options = codec_configs, dict()
+    else:
+        options = dict(codec_configs)
+        name = options.pop("name")
+
+    if name not in IMAGE_CODECS:
+        raise ValueError(
+            "Unknown image codec {}. Choose from {}.".format(name, list(IMAGE_CODECS.keys()))
+        )
+
+    if name == "turbojpeg":
+        try:
+            return TurboJPEGCodec(**options)
+        except (ImportError, OSError, RuntimeError):
+            print("TurboJPEG is not available, using the OpenCV JPEG codec.")
+            return JPEGCodec(**options)
+
+    return IMAGE_CODECS[name](**options)
+
+
+_image_decoders = dict()
+
+
+def decode_image(buffer, image_shape, codec_id):
+    """
+    Decodes a frame of any of the image codecs. JPEGs are decoded with TurboJPEG when installed.
+    """
+    if codec_id not in _image_decoders:
+        if codec_id == IMAGE_CODEC_JPEG:
+            try:
+                _image_decoders[codec_id] = TurboJPEGCodec()
+            except (ImportError, OSError, RuntimeError):
+                _image_decoders[codec_id] = JPEGCodec()
+        else:
+            codec = [codec for codec in IMAGE_CODECS.values() if codec.codec_id == codec_id]
+            if len(codec) == 0:
+                raise ValueError("Unknown image codec id {}.".format(codec_id))
+            _image_decoders[codec_id] = codec[0]()
+
+    return _image_decoders[codec_id].decode(buffer, image_shape)
@@ -0,0 +1,191 @@
+import json
+import os
+import time
+
+import numpy as np
+import zmq
+
+from openteach.utils.network import get_zmq_context, recv_frames, send_frames
+
+# Loop metrics
+# The components of all the processes publish a summary of their loops every
+# METRICS_INTERVAL seconds as [b"metrics", json] messages. Their PUB sockets connect to the
+# metrics port and the monitor binds the SUB socket, so any number of processes can publish
+# on a single port. Metrics are disabled unless set_metrics_address is called, in which case
+# the instrumentation calls do nothing.
+METRICS_TOPIC = b"metrics"
+METRICS_INTERVAL = 1.0
+# Summaries waiting to be sent, older ones are dropped if the monitor is slow
+METRICS_QUEUE_SIZE = 10
+
+_metrics_address, _metrics_interval = None, METRICS_INTERVAL
+
+
+def set_metrics_address(host, port, interval=METRICS_INTERVAL):
+    """
+    Enables the metrics of the components created from now on in this process and the processes
+    started from it. With a None port the metrics are disabled.
+    """
+    global _metrics_address, _metrics_interval
+    _metrics_address = None if port is None else "tcp://{}:{}".format(host, port)
+    _metrics_interval = interval
+
+
+class _NullSpan(object):
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        return False
+
+
+class NullMetrics(object):
+    """
+    Metrics of the components when the metrics are disabled.
+    """
+
+    _span = _NullSpan()
+
+    def span(self, name):
+        return self._span
+
+    def count(self, name, value=1):
+        pass
+
+    def end_loop(self, timer=None):
+        pass
+
+    def close(self):
+        pass
+
+
+NULL_METRICS = NullMetrics()
+
+
+class _Span(object):
+    def __init__(self, durations):
+        self._durations = durations
+
+    def __enter__(self):
+        self._start_time = time.perf_counter()
+        return self
+
+    def __exit__(self, *args):
+        self._durations.append(time.perf_counter() - self._start_time)
+        return False
+
+
+class ComponentMetrics(object):
+    """
+    Times named spans of a component loop (recv, compute, publish, robot_io...) and counts
+    events (dropped or empty messages). Every interval, end_loop publishes the loop frequency,
+    the statistics of every span in milliseconds, the counters and the statistics of the loop
+    timer, and starts a new interval.
+
+        with self.metrics.span("recv"):
+            keypoints = self.subscriber.recv_keypoints()
+        ...
+        self.metrics.end_loop(self.timer)
+    """
+
+    def __init__(self, component_name, address, interval=METRICS_INTERVAL):
+        self.component_name = component_name
+        self._interval = interval
+
+        self.socket = get_zmq_context().socket(zmq.PUB)
+        self.socket.setsockopt(zmq.SNDHWM, METRICS_QUEUE_SIZE)
+        self.socket.setsockopt(zmq.LINGER, 0)
+        self.socket.connect(address)
+
+        self._durations = dict()
+        self._spans = dict()
+        self._counters = dict()
+        self._start_interval(time.perf_counter())
+
+    def _start_interval(self, start_time):
+        self._interval_start = start_time
+        self._num_loops = 0
+        for durations in self._durations.values():
+            durations.clear()
+        for name in self._counters:
+            self._counters[name] = 0
+
+    def span(self, name):
+        # The span objects are reused, a span can not be nested in itself
+        if name not in self._spans:
+            self._durations[name] = []
+            self._spans[name] = _Span(self._durations[name])
+        return self._spans[name]
+
+    def count(self, name, value=1):
+        self._counters[name] = self._counters.get(name, 0) + value
+
+    def get_summary(self, timer=None):
+        duration = time.perf_counter() - self._interval_start
+        summary = dict(
+            component=self.component_name,
+            pid=os.getpid(),
+            time=time.time(),
+            interval=duration,
+            num_loops=self._num_loops,
+            frequency=self._num_loops / duration if duration > 0 else 0.0,
+            spans=dict(),
+            counters=dict(self._counters),
+        )
+        for name, durations in self._durations.items():
+            if len(durations) == 0:
+                continue
+            durations = np.array(durations) * 1e3
+            summary["spans"][name] = dict(
+                count=len(durations),
+                mean=float(durations.mean()),
+                p50=float(np.percentile(durations, 50)),
+                p99=float(np.percentile(durations, 99)),
+                max=float(durations.max()),
+            )
+        if timer is not None:
+            summary["timer"] = timer.get_statistics()
+        return summary
+
+    def end_loop(self, timer=None):
+        self._num_loops += 1
+        end_time = time.perf_counter()
+        if end_time - self._interval_start < self._interval:
+            return
+
+        # PUB sockets drop the message instead of blocking when the monitor is not there
+        send_frames(self.socket, [METRICS_TOPIC, json.dumps(self.get_summary(timer)).encode()])
+        self._start_interval(end_time)
+
+    def close(self):
+        self.socket.close()
+
+
+def create_component_metrics(component_name):
+    """
+    Returns the metrics of a component, which do nothing if the metrics are disabled.
+    """
+    if _metrics_address is None:
+        return NULL_METRICS
+    return ComponentMetrics(component_name, _metrics_address, _metrics_interval)
+
+
+class MetricsSubscriber(object):
+    """
+    Receives the metrics summaries of all the components. Binds the metrics port, the
+    components connect to it.
+    """
+
+    def __init__(self, host, port):
+        self._host, self._port = host, port
+        self.socket = get_zmq_context().socket(zmq.SUB)
+        self.socket.setsockopt(zmq.SUBSCRIBE, METRICS_TOPIC)
+        self.socket.bind("tcp://{}:{}".format(host, port))
+
+    def recv_metrics(self, flags=0):
+        _, message = recv_frames(self.socket, flags)
+        return json.loads(message.bytes)
+
+    def stop(self):
+        print("Closing the metrics socket in {}:{}.".format(self._host, self._port))
+        self.socket.close()
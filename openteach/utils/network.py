@@ -1,5 +1,7 @@
-import base64
+import atexit
+import os
 import pickle
+import struct
 import threading
 
 import blosc as bl
@@ -7,17 +9,53 @@ import cv2
 import numpy as np
 import zmq
 
+from openteach.utils.images import JPEGCodec, decode_image, get_image_codec
+
+# ZMQ Context
+# All the sockets of a process share one context (and its I/O threads) instead of creating a
+# context per socket. Forked processes get their own context the first time they ask for it.
+ZMQ_IO_THREADS = 1
+_context, _context_pid = None, None
+
+
+def set_zmq_io_threads(io_threads):
+    """
+    Sets the number of I/O threads of the contexts created from now on in this process and
+    the processes started from it.
+    """
+    global ZMQ_IO_THREADS
+    ZMQ_IO_THREADS = io_threads
+
+
+def get_zmq_context():
+    global _context, _context_pid
+    if _context is None or _context.closed or _context_pid != os.getpid():
+        _context = zmq.Context(io_threads=ZMQ_IO_THREADS)
+        _context_pid = os.getpid()
+    return _context
+
+
+@atexit.register
+def close_zmq_context(linger=0):
+    """
+    Closes the remaining sockets and terminates the context of this process.
+    """
+    global _context
+    if _context is not None and _context_pid == os.getpid() and not _context.closed:
+        _context.destroy(linger=linger)
+    _context = None
+
 
 # ZMQ Sockets
 def create_push_socket(host, port):
-    context = zmq.Context()
+    context = get_zmq_context()
     socket = context.socket(zmq.PUSH)
     socket.bind("tcp://{}:{}".format(host, port))
     return socket
 
 
 def create_pull_socket(host, port):
-    context = zmq.Context()
+    context = get_zmq_context()
     socket = context.socket(zmq.PULL)
     socket.setsockopt(zmq.CONFLATE, 1)
     socket.bind("tcp://{}:{}".format(host, port))
@@ -25,19 +63,145 @@ def create_pull_socket(host, port):
 
 
 def create_response_socket(host, port):
-    content = zmq.Context()
-    socket = content.socket(zmq.REP)
+    context = get_zmq_context()
+    socket = context.socket(zmq.REP)
     socket.bind("tcp://{}:{}".format(host, port))
     return socket
 
 
 def create_request_socket(host, port):
-    context = zmq.Context()
+    context = get_zmq_context()
     socket = context.socket(zmq.REQ)
     socket.connect("tcp://{}:{}".format(host, port))
     return socket
 
 
+# Keypoint wire format
+# Every keypoint message is a [topic, header, payload] multipart message. The header holds the
+# payload kind, the numpy dtype string and the shape (one uint32 per dimension) so that the
+# subscriber can view the payload with np.frombuffer instead of unpickling a copy of it.
+KEYPOINT_HEADER = struct.Struct("<BB8s")
+KEYPOINT_ARRAY = 0  # np.ndarray, received as a read-only view on the payload frame
+KEYPOINT_LIST = 1  # list / tuple of numbers, received as a list
+KEYPOINT_SCALAR = 2  # int / float / bool, received as a python scalar
+KEYPOINT_PICKLE = 3  # anything else (dicts etc.), only decoded if the subscriber allows pickle
+
+
+def encode_keypoints(keypoint_array):
+    """
+    Returns the header and payload frames of a keypoint message. Numeric arrays, lists and
+    scalars are sent as their raw buffer, everything else falls back to pickle.
+    """
+    if isinstance(keypoint_array, np.ndarray):
+        kind = KEYPOINT_ARRAY
+    elif isinstance(keypoint_array, (list, tuple)):
+        kind = KEYPOINT_LIST
+    elif isinstance(keypoint_array, (bool, int, float, np.generic)):
+        kind = KEYPOINT_SCALAR
+    else:
+        kind = KEYPOINT_PICKLE
+
+    if kind != KEYPOINT_PICKLE:
+        try:
+            array = np.ascontiguousarray(keypoint_array)
+        except ValueError:  # Ragged sequences
+            array = None
+        if array is None or array.dtype.kind not in "biuf":
+            kind = KEYPOINT_PICKLE
+
+    if kind == KEYPOINT_PICKLE:
+        return KEYPOINT_HEADER.pack(kind, 0, b""), pickle.dumps(keypoint_array, protocol=-1)
+
+    header = KEYPOINT_HEADER.pack(kind, array.ndim, array.dtype.str.encode())
+    header += struct.pack("<{}I".format(array.ndim), *array.shape)
+    return header, array
+
+
+def decode_keypoints(header, payload, allow_pickle=False):
+    """
+    Inverse of encode_keypoints. Both frames can be any buffer (bytes, memoryview or zmq.Frame
+    buffers), arrays are returned as read-only views on the payload.
+    """
+    kind, ndim, dtype = KEYPOINT_HEADER.unpack_from(header)
+    if kind == KEYPOINT_PICKLE:
+        if not allow_pickle:
+            raise ValueError(
+                "Received a pickled keypoint message. Create the subscriber with "
+                "allow_pickle=True to accept non-numeric payloads."
+            )
+        return pickle.loads(payload)
+
+    shape = struct.unpack_from("<{}I".format(ndim), header, KEYPOINT_HEADER.size)
+    array = np.frombuffer(payload, dtype=np.dtype(dtype.rstrip(b"\0").decode())).reshape(shape)
+    if kind == KEYPOINT_LIST:
+        return array.tolist()
+    if kind == KEYPOINT_SCALAR:
+        return array.item()
+    return array
+
+
+# Oculus keypoint tokens
+# The headset sends b"<absolute|relative>:x,y,z|x,y,z|...", one x,y,z per hand keypoint. The
+# detectors publish them as a float32 array with the absolute (0) / relative (1) flag first.
+_TOKEN_SEPARATORS = bytes.maketrans(b":|", b",,")
+
+
+def parse_keypoint_token(token):
+    """
+    Parses an Oculus keypoint token into the [flag, x0, y0, z0, x1, ...] float32 array in a
+    single split of the bytes, without decoding the token or converting every value in python.
+    """
+    values = token.strip().translate(_TOKEN_SEPARATORS).split(b",")
+    values[0] = b"0" if values[0].startswith(b"absolute") else b"1"
+    num_vectors = token.count(b"|") + 1
+    if len(values) == 3 * num_vectors + 1:
+        return np.array(values, dtype=np.float32)
+
+    # Vectors with more than three values, only x, y and z are kept
+    vectors = token.strip().partition(b":")[2].split(b"|")
+    keypoints = [values[0]] + [value for vector in vectors for value in vector.split(b",")[:3]]
+    return np.array(keypoints, dtype=np.float32)
+
+
+def send_frames(socket, frames, copy=False):
+    """
+    Sends a multipart message. Equivalent to socket.send_multipart but does not check every frame
+    in python, which is most of the time spent on small messages.
+    """
+    for frame in frames[:-1]:
+        socket.send(frame, zmq.SNDMORE, copy=copy)
+    socket.send(frames[-1], copy=copy)
+
+
+def recv_frames(socket, flags=0):
+    """
+    Receives a multipart message as the topic bytes followed by the zmq.Frame of every other part
+    so that the payloads are not copied out of the message.
+    """
+    frames = [socket.recv(flags)]
+    while socket.getsockopt(zmq.RCVMORE):
+        frames.append(socket.recv(copy=False))
+    return frames
+
+
+def recv_latest_multipart(socket, topic=None, flags=0):
+    """
+    Receives the newest queued multipart message (with the given topic frame) and drops the
+    older ones. ZMQ's CONFLATE option does not support multipart messages, so the subscribers
+    drain their queue here instead to keep reading the latest data.
+    """
+    latest = None
+    while latest is None:
+        frames = recv_frames(socket, flags)
+        while True:
+            if topic is None or frames[0] == topic:
+                latest = frames
+            if not socket.getsockopt(zmq.EVENTS) & zmq.POLLIN:
+                break
+            frames = recv_frames(socket)
+    return latest
+
+
 # Pub/Sub classes for Keypoints
 class ZMQKeypointPublisher(object):
     def __init__(self, host, port):
@@ -45,48 +209,47 @@ class ZMQKeypointPublisher(object):
         self._init_publisher()
 
     def _init_publisher(self):
-        self.context = zmq.Context()
+        self.context = get_zmq_context()
         self.socket = self.context.socket(zmq.PUB)
         self.socket.bind("tcp://{}:{}".format(self._host, self._port))
 
     def pub_keypoints(self, keypoint_array, topic_name):
         """
-        Process the keypoints into a byte stream and input them in this function
+        Send the keypoints as a [topic, header, payload] multipart message
         """
-        buffer = pickle.dumps(keypoint_array, protocol=-1)
-        self.socket.send(bytes("{} ".format(topic_name), "utf-8") + buffer)
+        header, payload = encode_keypoints(keypoint_array)
+        send_frames(self.socket, [bytes(topic_name, "utf-8"), header, payload])
 
     def stop(self):
         print("Closing the publisher socket in {}:{}.".format(self._host, self._port))
         self.socket.close()
-        self.context.term()
 
 
 class ZMQKeypointSubscriber(threading.Thread):
-    def __init__(self, host, port, topic):
+    def __init__(self, host, port, topic, allow_pickle=False):
         self._host, self._port, self._topic = host, port, topic
+        self._allow_pickle = allow_pickle
         self._init_subscriber()
 
-        # Topic chars to remove
-        self.strip_value = bytes("{} ".format(self._topic), "utf-8")
+        # Topic frame of the messages to keep
+        self.topic_frame = bytes(self._topic, "utf-8")
 
     def _init_subscriber(self):
-        self.context = zmq.Context()
+        self.context = get_zmq_context()
         self.socket = self.context.socket(zmq.SUB)
-        self.socket.setsockopt(zmq.CONFLATE, 1)
         self.socket.connect("tcp://{}:{}".format(self._host, self._port))
         self.socket.setsockopt(zmq.SUBSCRIBE, bytes(self._topic, "utf-8"))
 
+    def _recv_keypoints(self, flags):
+        _, header, payload = recv_latest_multipart(self.socket, self.topic_frame, flags)
+        return decode_keypoints(header.buffer, payload.buffer, self._allow_pickle)
+
     def recv_keypoints(self, flags=None):
         if flags is None:
-            raw_data = self.socket.recv()
-            raw_array = raw_data.lstrip(self.strip_value)
-            return pickle.loads(raw_array)
+            return self._recv_keypoints(0)
         else:  # For possible usage of no blocking zmq subscriber
             try:
-                raw_data = self.socket.recv(flags)
-                raw_array = raw_data.lstrip(self.strip_value)
-                return pickle.loads(raw_array)
+                return self._recv_keypoints(flags)
             except zmq.Again:
                 # print('zmq again error')
                 return None
@@ -94,38 +257,150 @@ class ZMQKeypointSubscriber(threading.Thread):
     def stop(self):
         print("Closing the subscriber socket in {}:{}.".format(self._host, self._port))
         self.socket.close()
-        self.context.term()
+
+
+# Pub/Sub classes for sensor states
+# A sensor state (the Xela readings) is a dict of arrays and a timestamp, sent as a
+# [topic, header, name, keypoint header, payload, name, ...] multipart message with every array
+# as float32. The header holds the timestamp and the sequence number of the state, from which
+# the subscribers that read every state count the ones they missed.
+SENSOR_STATE_HEADER = struct.Struct("<dQ")
+
+
+class ZMQSensorStatePublisher(object):
+    def __init__(self, host, port, topic):
+        self._host, self._port = host, port
+        self._topic_frame = bytes(topic, "utf-8")
+        self._sequence = 0
+
+        self.socket = get_zmq_context().socket(zmq.PUB)
+        self.socket.bind("tcp://{}:{}".format(self._host, self._port))
+
+    def pub_state(self, sensor_state):
+        frames = [self._topic_frame, None]
+        for name, value in sensor_state.items():
+            if name == "timestamp":
+                continue
+            header, payload = encode_keypoints(np.asarray(value, dtype=np.float32))
+            frames += [name.encode(), header, payload]
+        frames[1] = SENSOR_STATE_HEADER.pack(sensor_state["timestamp"], self._sequence)
+        send_frames(self.socket, frames)
+        self._sequence += 1
+
+    def stop(self):
+        print("Closing the publisher socket in {}:{}.".format(self._host, self._port))
+        self.socket.close()
+
+
+class ZMQSensorStateSubscriber(object):
+    """
+    Receives the sensor states of a ZMQSensorStatePublisher. recv_state returns the newest
+    state and drops the older ones, recv_next_state returns every state in order and
+    get_sensor_state returns the newest state without waiting once a state was received.
+    The arrays are read-only views on the received frames.
+    """
+
+    def __init__(self, host, port, topic):
+        self._host, self._port = host, port
+        self._topic_frame = bytes(topic, "utf-8")
+        self._state = None
+        # Sequence number of the last received state
+        self.sequence = None
+        self.num_missed_states = 0
+
+        self.socket = get_zmq_context().socket(zmq.SUB)
+        self.socket.connect("tcp://{}:{}".format(self._host, self._port))
+        self.socket.setsockopt(zmq.SUBSCRIBE, self._topic_frame)
+
+    def _decode_state(self, frames):
+        timestamp, sequence = SENSOR_STATE_HEADER.unpack(frames[1].buffer)
+        if self.sequence is not None and sequence > self.sequence + 1:
+            self.num_missed_states += sequence - self.sequence - 1
+        self.sequence = sequence
+
+        state = dict()
+        for idx in range(2, len(frames), 3):
+            name = frames[idx].bytes.decode()
+            state[name] = decode_keypoints(frames[idx + 1].buffer, frames[idx + 2].buffer)
+        state["timestamp"] = timestamp
+        self._state = state
+        return state
+
+    def recv_state(self, flags=0):
+        return self._decode_state(recv_latest_multipart(self.socket, self._topic_frame, flags))
+
+    def recv_next_state(self, flags=0):
+        return self._decode_state(recv_frames(self.socket, flags))
+
+    def get_sensor_state(self):
+        try:
+            return self.recv_state(zmq.NOBLOCK)
+        except zmq.Again:
+            if self._state is None:
+                return self.recv_state()
+            return self._state
+
+    def stop(self):
+        print("Closing the subscriber socket in {}:{}.".format(self._host, self._port))
+        self.socket.close()
 
 
 # Pub/Sub classes for storing data from Realsense Cameras
+# Camera messages are multipart messages starting with the topic frame. Both ends bound their
+# queue to about a second of frames and the subscribers drain it to read the latest frame, like
+# CONFLATE did for the single frame messages.
+CAMERA_QUEUE_SIZE = 30
+
+# RGB frames are [b"rgb_image", header, encoded image] messages. The header holds the capture
+# timestamp, the image height, width and channels and the id of the codec of the payload.
+RGB_IMAGE_HEADER = struct.Struct("<dHHBB")
+
+
+def pack_rgb_header(timestamp, image_shape, codec):
+    height, width = image_shape[:2]
+    channels = image_shape[2] if len(image_shape) > 2 else 1
+    return RGB_IMAGE_HEADER.pack(timestamp, height, width, channels, codec)
+
+
+def unpack_rgb_header(header):
+    """
+    Returns the timestamp, (height, width, channels) and codec id of an RGB frame header.
+    """
+    timestamp, height, width, channels, codec = RGB_IMAGE_HEADER.unpack_from(header)
+    return timestamp, (height, width, channels), codec
+
+
 class ZMQCameraPublisher(object):
-    def __init__(self, host, port):
+    def __init__(self, host, port, rgb_codec=None):
         self._host, self._port = host, port
+        # Codec config of the RGB images (see openteach.utils.images.get_image_codec)
+        self._rgb_codec = get_image_codec(rgb_codec)
         self._init_publisher()
 
     def _init_publisher(self):
-        self.context = zmq.Context()
+        self.context = get_zmq_context()
         self.socket = self.context.socket(zmq.PUB)
+        self.socket.setsockopt(zmq.SNDHWM, CAMERA_QUEUE_SIZE)
         print("tcp://{}:{}".format(self._host, self._port))
         self.socket.bind("tcp://{}:{}".format(self._host, self._port))
 
     def pub_intrinsics(self, array):
-        self.socket.send(b"intrinsics " + pickle.dumps(array, protocol=-1))
+        header, payload = encode_keypoints(array)
+        send_frames(self.socket, [b"intrinsics", header, payload])
 
     def pub_rgb_image(self, rgb_image, timestamp):
-        _, buffer = cv2.imencode(".jpg", rgb_image, [int(cv2.IMWRITE_JPEG_QUALITY), 70])
-        data = dict(timestamp=timestamp, rgb_image=base64.b64encode(buffer))
-        self.socket.send(b"rgb_image " + pickle.dumps(data, protocol=-1))
+        buffer = self._rgb_codec.encode(rgb_image)
+        header = pack_rgb_header(timestamp, rgb_image.shape, self._rgb_codec.codec_id)
+        send_frames(self.socket, [b"rgb_image", header, buffer])
 
     def pub_depth_image(self, depth_image, timestamp):
         compressed_depth = bl.pack_array(depth_image, cname="zstd", clevel=1, shuffle=bl.NOSHUFFLE)
         data = dict(timestamp=timestamp, depth_image=compressed_depth)
-        self.socket.send(b"depth_image " + pickle.dumps(data, protocol=-1))
+        send_frames(self.socket, [b"depth_image", pickle.dumps(data, protocol=-1)])
 
     def stop(self):
         print("Closing the publisher socket in {}:{}.".format(self._host, self._port))
         self.socket.close()
-        self.context.term()
 
 
 class ZMQCameraSubscriber(threading.Thread):
@@ -134,9 +409,9 @@ class ZMQCameraSubscriber(threading.Thread):
         self._init_subscriber()
 
     def _init_subscriber(self):
-        self.context = zmq.Context()
+        self.context = get_zmq_context()
         self.socket = self.context.socket(zmq.SUB)
-        self.socket.setsockopt(zmq.CONFLATE, 1)
+        self.socket.setsockopt(zmq.RCVHWM, CAMERA_QUEUE_SIZE)
         print("tcp://{}:{}".format(self._host, self._port))
         self.socket.connect("tcp://{}:{}".format(self._host, self._port))
 
@@ -148,55 +423,58 @@ class ZMQCameraSubscriber(threading.Thread):
             self.socket.setsockopt(zmq.SUBSCRIBE, b"depth_image")
 
     def recv_intrinsics(self):
-        raw_data = self.socket.recv()
-        raw_array = raw_data.lstrip(b"intrinsics ")
-        return pickle.loads(raw_array)
+        _, header, payload = recv_latest_multipart(self.socket, b"intrinsics")
+        return decode_keypoints(header.buffer, payload.buffer)
+
+    def recv_rgb_frame(self):
+        """
+        Returns the encoded image buffer (without decoding it), the timestamp, the image shape
+        and the codec id of the latest RGB frame.
+        """
+        _, header, payload = recv_latest_multipart(self.socket, b"rgb_image")
+        timestamp, image_shape, codec = unpack_rgb_header(header.buffer)
+        return payload.buffer, timestamp, image_shape, codec
 
     def recv_rgb_image(self):
-        raw_data = self.socket.recv()
-        data = raw_data.lstrip(b"rgb_image ")
-        data = pickle.loads(data)
-        encoded_data = np.fromstring(base64.b64decode(data["rgb_image"]), np.uint8)
-        return cv2.imdecode(encoded_data, 1), data["timestamp"]
+        encoded_image, timestamp, image_shape, codec = self.recv_rgb_frame()
+        return decode_image(encoded_image, image_shape, codec), timestamp
 
     def recv_depth_image(self):
-        raw_data = self.socket.recv()
-        striped_data = raw_data.lstrip(b"depth_image ")
-        data = pickle.loads(striped_data)
+        _, payload = recv_latest_multipart(self.socket, b"depth_image")
+        data = pickle.loads(payload.buffer)
         depth_image = bl.unpack_array(data["depth_image"])
         return np.array(depth_image, dtype=np.int16), data["timestamp"]
 
     def stop(self):
         print("Closing the subscriber socket in {}:{}.".format(self._host, self._port))
         self.socket.close()
-        self.context.term()
 
 
 # Publisher for image visualizers
 class ZMQCompressedImageTransmitter(object):
-    def __init__(self, host, port):
+    def __init__(self, host, port, quality=95):
         self._host, self._port = host, port
+        # The headset decodes JPEGs, the quality was OpenCV's default before it was configurable
+        self._codec = JPEGCodec(quality=quality)
         # self._init_push_socket()
         self._init_publisher()
 
     def _init_publisher(self):
-        self.context = zmq.Context()
+        self.context = get_zmq_context()
         self.socket = self.context.socket(zmq.PUB)
         self.socket.bind("tcp://{}:{}".format(self._host, self._port))
 
     def _init_push_socket(self):
-        self.context = zmq.Context()
+        self.context = get_zmq_context()
         self.socket = self.context.socket(zmq.PUSH)
         self.socket.bind("tcp://{}:{}".format(self._host, self._port))
 
     def send_image(self, rgb_image):
-        _, buffer = cv2.imencode(".jpg", rgb_image, [int(cv2.IMWRITE_WEBP_QUALITY), 10])
-        self.socket.send(np.array(buffer).tobytes())
+        self.socket.send(self._codec.encode(rgb_image), copy=False)
 
     def stop(self):
         print("Closing the publisher in {}:{}.".format(self._host, self._port))
         self.socket.close()
-        self.context.term()
 
 
 class ZMQCompressedImageReciever(threading.Thread):
@@ -206,28 +484,27 @@ class ZMQCompressedImageReciever(threading.Thread):
         self._init_subscriber()
 
     def _init_subscriber(self):
-        self.context = zmq.Context()
+        self.context = get_zmq_context()
         self.socket = self.context.socket(zmq.SUB)
         self.socket.setsockopt(zmq.CONFLATE, 1)
         self.socket.connect("tcp://{}:{}".format(self._host, self._port))
         self.socket.subscribe("")
 
     def _init_pull_socket(self):
-        self.context = zmq.Context()
+        self.context = get_zmq_context()
         self.socket = self.context.socket(zmq.PULL)
         self.socket.setsockopt(zmq.CONFLATE, 1)
         self.socket.connect("tcp://{}:{}".format(self._host, self._port))
 
     def recv_image(self):
-        raw_data = self.socket.recv()
-        encoded_data = np.fromstring(raw_data, np.uint8)
+        raw_data = self.socket.recv(copy=False)
+        encoded_data = np.frombuffer(raw_data.buffer, np.uint8)
         decoded_frame = cv2.imdecode(encoded_data, 1)
         return decoded_frame
 
     def stop(self):
         print("Closing the subscriber socket in {}:{}.".format(self._host, self._port))
         self.socket.close()
-        self.context.term()
 
 
 class ZMQButtonFeedbackSubscriber(threading.Thread):
@@ -237,14 +514,14 @@ class ZMQButtonFeedbackSubscriber(threading.Thread):
         self._init_subscriber()
 
     def _init_subscriber(self):
-        self.context = zmq.Context()
+        self.context = get_zmq_context()
         self.socket = self.context.socket(zmq.SUB)
         self.socket.setsockopt(zmq.CONFLATE, 1)
         self.socket.connect("tcp://{}:{}".format(self._host, self._port))
         self.socket.subscribe("")
 
     def _init_pull_socket(self):
-        self.context = zmq.Context()
+        self.context = get_zmq_context()
         self.socket = self.context.socket(zmq.PULL)
         self.socket.setsockopt(zmq.CONFLATE, 1)
         self.socket.connect("tcp://{}:{}".format(self._host, self._port))
@@ -256,4 +533,3 @@ class ZMQButtonFeedbackSubscriber(threading.Thread):
     def stop(self):
         print("Closing the subscriber socket in {}:{}.".format(self._host, self._port))
         self.socket.close()
-        self.context.term()
@@ -1,27 +1,93 @@
-import base64
-import pickle
 import time
+from collections import deque
 
 import cv2
 import numpy as np
 import zmq
 
+from openteach.constants import TIMER_STATISTICS_WINDOW
+from openteach.utils.network import decode_keypoints, get_zmq_context, recv_frames
+
 
 class FrequencyTimer(object):
-    def __init__(self, frequency_rate):
-        self.frame_time = 0.99 / frequency_rate
+    """
+    Paces a loop at frequency_rate against absolute deadlines, so that the time spent in the
+    loop and the sleep overshoot do not add up to drift. A loop running late is caught up on
+    the next loops, and the missed deadlines are dropped once it is a whole period late.
+
+    With spin_time, the last spin_time seconds before a deadline are busy-waited instead of
+    slept, trading some CPU for sub-millisecond regularity.
+    """
+
+    def __init__(self, frequency_rate, spin_time=0, statistics_window=TIMER_STATISTICS_WINDOW):
+        self.frequency_rate = frequency_rate
+        self.frame_time = 1.0 / frequency_rate
+        self.spin_time = spin_time
+
+        self._deadline = None
+        self._previous_end_time = None
+        self._loop_times = deque(maxlen=statistics_window)
+        self._periods = deque(maxlen=statistics_window)
+        self.num_loops = 0
+        self.num_overruns = 0
 
     def start_loop(self):
         self.start_time = time.perf_counter()
+        if self._deadline is None:
+            self._deadline = self.start_time
 
-    def end_loop(self):
-        # this_frame_time = time.perf_counter() - self.start_time
-        # print("Frame time: ", this_frame_time)
-        # sleep_time = self.frame_time - this_frame_time
-
-        sleep_time = self.frame_time - time.perf_counter() + self.start_time
+    def _sleep_until(self, deadline):
+        sleep_time = deadline - time.perf_counter() - self.spin_time
         if sleep_time > 0:
             time.sleep(sleep_time)
+        while time.perf_counter() < deadline:
+            pass
+
+    def end_loop(self):
+        end_time = time.perf_counter()
+        self._loop_times.append(end_time - self.start_time)
+        self.num_loops += 1
+
+        self._deadline += self.frame_time
+        if end_time > self._deadline:
+            self.num_overruns += 1
+            if end_time - self._deadline > self.frame_time:
+                # Too late to catch up, starting over from now
+                self._deadline = end_time
+        else:
+            self._sleep_until(self._deadline)
+
+        end_time = time.perf_counter()
+        if self._previous_end_time is not None:
+            self._periods.append(end_time - self._previous_end_time)
+        self._previous_end_time = end_time
+
+    def get_statistics(self):
+        """
+        Loop counts and, over the last statistics_window loops, the time spent in the loop and
+        the achieved frequency. Times are in milliseconds.
+        """
+        statistics = dict(
+            target_frequency=self.frequency_rate,
+            num_loops=self.num_loops,
+            num_overruns=self.num_overruns,
+        )
+        if len(self._loop_times) > 0:
+            loop_times = np.array(self._loop_times) * 1e3
+            statistics.update(
+                mean_loop_time=float(loop_times.mean()),
+                p50_loop_time=float(np.percentile(loop_times, 50)),
+                p99_loop_time=float(np.percentile(loop_times, 99)),
+                max_loop_time=float(loop_times.max()),
+            )
+        if len(self._periods) > 0:
+            periods = np.array(self._periods) * 1e3
+            statistics.update(
+                frequency=float(1e3 / periods.mean()),
+                p99_period=float(np.percentile(periods, 99)),
+                period_jitter=float(periods.std()),
+            )
+        return statistics
 
 
 class SocketChecker(object):
@@ -34,9 +100,8 @@ class SocketChecker(object):
         self._init_connection(host, port)
 
     def _init_connection(self, host, port):
-        self.context = zmq.Context()
+        self.context = get_zmq_context()
         self.socket = self.context.socket(zmq.SUB)
-        self.socket.setsockopt(zmq.CONFLATE, 1)
         self.socket.setsockopt(zmq.SUBSCRIBE, bytes(self.topic_name, "utf-8"))
         self.socket.connect("tcp://{}:{}".format(host, port))
 
@@ -48,20 +113,23 @@ class SocketChecker(object):
         return self.counter / (time.time() - self.start_time)
 
     def _decode_array(self):
-        processed_data = self.data.lstrip(bytes("{} ".format(self.topic_name), "utf-8"))
-        print(pickle.loads(processed_data))
+        _, header, payload = self.data
+        print(decode_keypoints(header.buffer, payload.buffer, allow_pickle=True))
 
     def _decode_rgb_image(self):
-        frame = self.data.lstrip(b"rgb_image ")
-        encoded_data = np.fromstring(base64.b64decode(frame), np.uint8)
+        encoded_data = np.frombuffer(self.data[2].buffer, np.uint8)
         image = cv2.imdecode(encoded_data, 1)
-        cv2.imshow(image)
+        cv2.imshow(self.topic_name, image)
         cv2.waitKey(1)
 
     def check_connection(self):
         self._reinit_counter()
+        topic = bytes(self.topic_name, "utf-8")
         while True:
-            self.data = self.socket.recv()
+            self.data = recv_frames(self.socket)
+            if self.data[0] != topic:
+                continue
+
             if self.data is not None and self.data is not self.previous_data:
                 # To see the data - usually reduces the actual frequency. Use it to just see the stream
                 if self.print_data:
@@ -91,3 +159,4 @@ if __name__ == "__main__":
     time_end = time.perf_counter()
 
     print("Time: ", time_end - time_start)
+    print(timer.get_statistics())
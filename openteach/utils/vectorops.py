@@ -23,6 +23,20 @@ def get_distance(start_vector, end_vector):
     return np.linalg.norm(end_vector - start_vector)
 
 
+@njit
+def get_distance_subsample_idxs(vectors, min_distance):
+    # Indices of the vectors further than min_distance from the last kept one, starting from vectors[0]
+    chosen_idxs = np.empty(len(vectors), dtype=np.int64)
+    num_chosen, previous_vector = 0, vectors[0]
+    for idx in range(1, len(vectors)):
+        if np.linalg.norm(vectors[idx] - previous_vector) > min_distance:
+            chosen_idxs[num_chosen] = idx
+            num_chosen += 1
+            previous_vector = vectors[idx]
+
+    return chosen_idxs[:num_chosen]
+
+
 @njit
 def linear_transform(curr_val, source_bound, target_bound):
     multiplier = (target_bound[1] - target_bound[0]) / (source_bound[1] - source_bound[0])
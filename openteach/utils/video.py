@@ -0,0 +1,64 @@
+import os
+
+import cv2
+import numpy as np
+
+# End offset of every frame in the video file
+FRAME_INDEX_DTYPE = np.dtype("<u8")
+
+
+def get_frame_index_path(video_path):
+    return os.path.splitext(video_path)[0] + ".index"
+
+
+class MJPEGWriter(object):
+    """
+    Writes JPEG frames as they are received into a Motion JPEG file (the JPEGs back to back,
+    playable with ffplay -f mjpeg) and appends the end offset of every frame to an index file.
+    Each frame is flushed before its index entry, so a recording that is killed only loses the
+    frame that was being written.
+    """
+
+    def __init__(self, video_path):
+        self.video_path = video_path
+        self._video_file = open(video_path, "wb")
+        self._index_file = open(get_frame_index_path(video_path), "wb", buffering=0)
+        self._offset = 0
+        self.num_frames = 0
+
+    def write(self, jpeg_buffer):
+        self._offset += self._video_file.write(jpeg_buffer)
+        self._video_file.flush()
+        self._index_file.write(np.array(self._offset, dtype=FRAME_INDEX_DTYPE).tobytes())
+        self.num_frames += 1
+
+    def release(self):
+        self._video_file.close()
+        self._index_file.close()
+
+
+class MJPEGReader(object):
+    """
+    Reads the frames of a MJPEGWriter recording by index without decoding the other frames.
+    """
+
+    def __init__(self, video_path):
+        self.video_path = video_path
+        self._frame_ends = np.fromfile(get_frame_index_path(video_path), dtype=FRAME_INDEX_DTYPE)
+        self._frame_starts = np.concatenate([[0], self._frame_ends[:-1]]).astype(FRAME_INDEX_DTYPE)
+        self._video_file = open(video_path, "rb")
+
+    def __len__(self):
+        return len(self._frame_ends)
+
+    def read_encoded(self, frame_idx):
+        start = int(self._frame_starts[frame_idx])
+        self._video_file.seek(start)
+        return self._video_file.read(int(self._frame_ends[frame_idx]) - start)
+
+    def read(self, frame_idx):
+        # BGR like the frames of cv2.VideoCapture
+        return cv2.imdecode(np.frombuffer(self.read_encoded(frame_idx), np.uint8), cv2.IMREAD_COLOR)
+
+    def release(self):
+        self._video_file.close()
@@ -0,0 +1,86 @@
+import queue
+import threading
+import time
+
+
+class BackgroundWriter(object):
+    """
+    Calls write_function on a background thread for every item put in a
+    bounded queue, so the receive loop of a recorder does not wait on
+    compression or disk writes. When the queue is full the item is dropped
+    and counted instead of blocking the caller.
+    """
+
+    def __init__(self, write_function, queue_size, name=None):
+        self._write_function = write_function
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._error = None
+
+        self.num_queued = 0
+        self.num_written = 0
+        self.num_dropped = 0
+        self.max_queue_depth = 0
+        self.total_queue_depth = 0
+        self.total_write_time = 0
+        self.max_write_time = 0
+
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                break
+            # Items queued after a failure are discarded
+            if self._error is not None:
+                continue
+
+            try:
+                start_time = time.perf_counter()
+                self._write_function(item)
+                write_time = time.perf_counter() - start_time
+            except Exception as error:
+                self._error = error
+                continue
+
+            self.num_written += 1
+            self.total_write_time += write_time
+            self.max_write_time = max(self.max_write_time, write_time)
+
+    def put(self, item):
+        if self._error is not None:
+            raise RuntimeError("Background writer failed.") from self._error
+
+        try:
+            self._queue.put_nowait(item)
+        except queue.Full:
+            self.num_dropped += 1
+            return False
+
+        self.num_queued += 1
+        queue_depth = self._queue.qsize()
+        self.max_queue_depth = max(self.max_queue_depth, queue_depth)
+        self.total_queue_depth += queue_depth
+        return True
+
+    def qsize(self):
+        return self._queue.qsize()
+
+    def close(self):
+        # Writes everything that is still queued before stopping
+        self._queue.put(None)
+        self._thread.join()
+
+        if self._error is not None:
+            raise RuntimeError("Background writer failed.") from self._error
+
+    def get_statistics(self):
+        return dict(
+            num_written=self.num_written,
+            num_dropped=self.num_dropped,
+            max_queue_depth=self.max_queue_depth,
+            mean_queue_depth=self.total_queue_depth / max(1, self.num_queued),
+            mean_write_time=self.total_write_time / max(1, self.num_written),
+            max_write_time=self.max_write_time,
+        )
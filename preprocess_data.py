@@ -0,0 +1,13 @@
+import hydra
+from omegaconf import OmegaConf
+
+from openteach.samplers.preprocess import preprocess_demonstrations
+
+
+@hydra.main(version_base="1.2", config_path="configs", config_name="preprocess")
+def main(configs):
+    preprocess_demonstrations(OmegaConf.to_container(configs, resolve=True))
+
+
+if __name__ == "__main__":
+    main()
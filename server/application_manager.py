@@ -1,33 +1,265 @@
-import base64
-import pickle
+import threading
+import time
+from collections import deque
 
+import cv2
 import numpy as np
 import zmq
 
+from openteach.constants import DEPTH_PORT_OFFSET
+from openteach.utils.images import IMAGE_CODEC_JPEG, JPEGCodec, decode_image
+from openteach.utils.metrics import MetricsSubscriber
+from openteach.utils.network import (
+    CAMERA_QUEUE_SIZE,
+    ZMQCameraSubscriber,
+    ZMQCompressedImageReciever,
+    get_zmq_context,
+    recv_frames,
+    unpack_rgb_header,
+)
 
-class VideoStreamer(object):
-    def __init__(self, host, cam_port):
+# Components whose last summary is older than this are shown as stale
+METRICS_STALE_TIME = 5
+
+# Topic rates are averaged over the messages of the last TOPIC_RATE_WINDOW seconds
+TOPIC_RATE_WINDOW = 2.0
+# Topics without a message for this long are shown as stalled
+TOPIC_STALE_TIME = 1.0
+TOPIC_POLL_TIMEOUT = 100  # ms
+
+# Seconds an HTTP client waits for a new frame before checking again
+BROADCAST_WAIT_TIMEOUT = 1.0
+
+
+class FrameBroadcaster(threading.Thread):
+    """
+    Receives the frames of a stream once and serves them as MJPEG to any number of HTTP
+    clients. Every client sends the latest frame that it has not sent yet, so a slow client
+    skips frames instead of holding back the stream or the other clients. Nothing is received
+    while nobody is watching.
+    """
+
+    def __init__(self, scale=1):
+        super().__init__(daemon=True)
+        self._scale = scale
+        self._codec = JPEGCodec()
+        self._condition = threading.Condition()
+        self._chunk, self._frame_idx = None, 0
+        self.num_clients = 0
+
+    def _recv_frame(self):
+        # Returns the encoded image, its shape and its codec id
+        raise NotImplementedError("Function not implemented!")
+
+    def _get_jpeg(self):
+        # JPEG frames are streamed as they are, the others are re-encoded, once for all clients
+        encoded_image, image_shape, codec = self._recv_frame()
+        if codec == IMAGE_CODEC_JPEG and self._scale == 1:
+            return encoded_image
+
+        image = decode_image(encoded_image, image_shape, codec)
+        if self._scale != 1:
+            image = cv2.resize(
+                image, None, fx=self._scale, fy=self._scale, interpolation=cv2.INTER_AREA
+            )
+        return self._codec.encode(image)
+
+    def run(self):
+        while True:
+            with self._condition:
+                self._condition.wait_for(lambda: self.num_clients > 0)
+
+            chunk = (
+                b"--frame\r\nContent-Type: image/jpeg\r\n\r\n" + bytes(self._get_jpeg()) + b"\r\n"
+            )
+            with self._condition:
+                self._chunk = chunk
+                self._frame_idx += 1
+                self._condition.notify_all()
+
+    def yield_frames(self):
+        with self._condition:
+            self.num_clients += 1
+            self._condition.notify_all()
+
+        sent_frame_idx = 0
+        try:
+            while True:
+                with self._condition:
+                    if not self._condition.wait_for(
+                        lambda: self._frame_idx > sent_frame_idx, BROADCAST_WAIT_TIMEOUT
+                    ):
+                        continue
+                    chunk, sent_frame_idx = self._chunk, self._frame_idx
+                yield chunk
+        finally:
+            # The generator is closed when the client disconnects
+            with self._condition:
+                self.num_clients -= 1
+
+
+class VideoStreamer(FrameBroadcaster):
+    def __init__(self, host, cam_port, scale=1):
         self._init_socket(host, cam_port)
+        super().__init__(scale)
 
     def _init_socket(self, host, port):
-        self.context = zmq.Context()
-        self.socket = self.context.socket(zmq.SUB)
-        self.socket.setsockopt(zmq.CONFLATE, 1)
-        self.socket.connect("tcp://{}:{}".format(host, port))
-        self.socket.setsockopt(zmq.SUBSCRIBE, b"rgb_image")
-
-    def _get_image(self):
-        raw_data = self.socket.recv()
-        data = raw_data.lstrip(b"rgb_image ")
-        data = pickle.loads(data)
-        encoded_data = np.fromstring(base64.b64decode(data["rgb_image"]), np.uint8)
-        return encoded_data.tobytes()
+        self.subscriber = ZMQCameraSubscriber(host=host, port=port, topic_type="RGB")
 
-    def yield_frames(self):
+    def _recv_frame(self):
+        encoded_image, _, image_shape, codec = self.subscriber.recv_rgb_frame()
+        return encoded_image, image_shape, codec
+
+
+class GraphStreamer(FrameBroadcaster):
+    """
+    Streams the hand plot sent to the headset, which is already a JPEG.
+    """
+
+    def __init__(self, host, port):
+        self.subscriber = ZMQCompressedImageReciever(host=host, port=port)
+        super().__init__()
+
+    def _recv_frame(self):
+        return self.subscriber.socket.recv(), None, IMAGE_CODEC_JPEG
+
+
+class TopicStatistics(object):
+    def __init__(self, name, port, topic):
+        self.name, self.port, self.topic = name, port, topic
+        self.num_messages = 0
+        self.last_time = None
+        self._arrival_times = deque()
+        self._latencies = deque()
+
+    def update(self, receive_time, timestamp=None):
+        self.num_messages += 1
+        self.last_time = receive_time
+        self._arrival_times.append(receive_time)
+        if timestamp is not None:
+            self._latencies.append((receive_time, receive_time - timestamp))
+
+    def get_statistics(self, current_time):
+        # Forgetting the messages that left the rate window
+        window_start = current_time - TOPIC_RATE_WINDOW
+        while self._arrival_times and self._arrival_times[0] < window_start:
+            self._arrival_times.popleft()
+        while self._latencies and self._latencies[0][0] < window_start:
+            self._latencies.popleft()
+
+        age = None if self.last_time is None else current_time - self.last_time
+        statistics = dict(
+            name=self.name,
+            port=self.port,
+            topic=self.topic,
+            num_messages=self.num_messages,
+            rate=len(self._arrival_times) / TOPIC_RATE_WINDOW,
+            age=age,
+            stalled=age is None or age > TOPIC_STALE_TIME,
+            latency=None,
+        )
+        if self._latencies:
+            statistics["latency"] = float(np.mean([latency for _, latency in self._latencies]))
+        return statistics
+
+
+class TopicMonitor(threading.Thread):
+    """
+    Measures the rate, the age of the last message and, for the RGB frames, the latency from
+    the capture timestamp of every monitored topic. All the ports are read from a single
+    thread with a zmq.Poller, so a stalled publisher does not block the others.
+    """
+
+    def __init__(self, host, topics):
+        super().__init__(daemon=True)
+        self._host = host
+        self._poller = zmq.Poller()
+        # Topic frame (None for single frame messages) -> statistics, for every socket
+        self._socket_topics = dict()
+        self._lock = threading.Lock()
+        for topic_configs in topics:
+            self._add_topic(**topic_configs)
+
+    def _add_topic(self, name, port, topic=None):
+        socket = None
+        for existing_socket, socket_topics in self._socket_topics.items():
+            if socket_topics["port"] == port:
+                socket = existing_socket
+
+        if socket is None:
+            socket = get_zmq_context().socket(zmq.SUB)
+            socket.setsockopt(zmq.RCVHWM, CAMERA_QUEUE_SIZE)
+            socket.connect("tcp://{}:{}".format(self._host, port))
+            self._poller.register(socket, zmq.POLLIN)
+            self._socket_topics[socket] = dict(port=port, topics=dict())
+
+        topic_frame = None if topic is None else bytes(topic, "utf-8")
+        socket.setsockopt(zmq.SUBSCRIBE, b"" if topic_frame is None else topic_frame)
+        self._socket_topics[socket]["topics"][topic_frame] = TopicStatistics(name, port, topic)
+
+    def _get_timestamp(self, frames):
+        # Only the RGB frames carry their capture timestamp (in ms) outside of a pickle
+        if frames[0] == b"rgb_image" and len(frames) == 3:
+            return unpack_rgb_header(frames[1].buffer)[0] / 1e3
+        return None
+
+    def _receive(self, socket):
+        socket_topics = self._socket_topics[socket]["topics"]
+        while True:
+            try:
+                frames = recv_frames(socket, zmq.NOBLOCK)
+            except zmq.Again:
+                return
+
+            receive_time = time.time()
+            statistics = socket_topics.get(frames[0], socket_topics.get(None))
+            if statistics is not None:
+                with self._lock:
+                    statistics.update(receive_time, self._get_timestamp(frames))
+
+    def run(self):
+        try:
+            while True:
+                for socket, _ in self._poller.poll(TOPIC_POLL_TIMEOUT):
+                    self._receive(socket)
+        except zmq.ZMQError:
+            # The sockets are closed with the context when the monitor exits
+            return
+
+    def get_statistics(self):
+        current_time = time.time()
+        with self._lock:
+            return [
+                statistics.get_statistics(current_time)
+                for socket_topics in self._socket_topics.values()
+                for statistics in socket_topics["topics"].values()
+            ]
+
+
+class MetricsCollector(threading.Thread):
+    """
+    Keeps the latest loop metrics summary of every component process.
+    """
+
+    def __init__(self, host, port):
+        super().__init__(daemon=True)
+        self.subscriber = MetricsSubscriber(host=host, port=port)
+        self._summaries = dict()
+        self._lock = threading.Lock()
+
+    def run(self):
         while True:
-            yield (
-                b"--frame\r\nContent-Type: image/jpeg\r\n\r\n" + self._get_image() + b"\r\n"
-            )  # concat frame one by one and show result
+            summary = self.subscriber.recv_metrics()
+            with self._lock:
+                self._summaries[(summary["component"], summary["pid"])] = summary
+
+    def get_summaries(self):
+        current_time = time.time()
+        with self._lock:
+            summaries = [dict(summary) for summary in self._summaries.values()]
+        for summary in summaries:
+            summary["stale"] = current_time - summary["time"] > METRICS_STALE_TIME
+        return sorted(summaries, key=lambda summary: summary["component"])
 
 
 class MonitoringApplication(object):
@@ -37,6 +269,10 @@ class MonitoringApplication(object):
         self.keypoint_port = configs.keypoint_port
         self.port_offset = configs.cam_port_offset
         self.num_cams = len(configs.robot_cam_serial_numbers)
+        self.graph_port = configs.oculus_graph_port
+        self.monitor_topics = configs.get("monitor_topics", [])
+        self.monitor_depth = configs.get("monitor_depth", False)
+        self.stream_scale = configs.get("monitor_stream_scale", 1)
 
         # Initializing the streamers
         self._init_cam_streamers()
@@ -45,21 +281,57 @@ class MonitoringApplication(object):
         # Initializing frequency checkers
         self._init_frequency_checkers()
 
+        # Loop metrics of the components
+        self._init_metrics_collector(configs)
+
+    def _init_metrics_collector(self, configs):
+        self.metrics_collector = MetricsCollector(self.host_address, configs.metrics_port)
+        self.metrics_collector.start()
+
+    def get_metrics(self):
+        return self.metrics_collector.get_summaries()
+
     def _init_graph_streamer(self):
-        # TODO
-        pass
+        self.graph_streamer = GraphStreamer(host=self.host_address, port=self.graph_port)
+        self.graph_streamer.start()
 
     def _init_frequency_checkers(self):
-        # TODO - Raw keypoint frequency
-        # TODO - Transformed keypoint frequency
-        pass
+        # Keypoint, robot state and plot topics of the config and the streams of every camera
+        topics = [dict(topic_configs) for topic_configs in self.monitor_topics]
+        for idx in range(self.num_cams):
+            topics.append(
+                dict(
+                    name="camera {} rgb".format(idx + 1),
+                    port=self.port_offset + idx,
+                    topic="rgb_image",
+                )
+            )
+            if self.monitor_depth:
+                topics.append(
+                    dict(
+                        name="camera {} depth".format(idx + 1),
+                        port=self.port_offset + DEPTH_PORT_OFFSET + idx,
+                        topic="depth_image",
+                    )
+                )
+
+        self.topic_monitor = TopicMonitor(self.host_address, topics)
+        self.topic_monitor.start()
+
+    def get_topic_statistics(self):
+        return self.topic_monitor.get_statistics()
 
     def _init_cam_streamers(self):
+        # One subscriber per camera, shared by all the viewers
         self.cam_streamers = []
         for idx in range(self.num_cams):
-            self.cam_streamers.append(
-                VideoStreamer(host=self.host_address, cam_port=self.port_offset + idx)
+            cam_streamer = VideoStreamer(
+                host=self.host_address,
+                cam_port=self.port_offset + idx,
+                scale=self.stream_scale,
             )
+            cam_streamer.start()
+            self.cam_streamers.append(cam_streamer)
 
     def get_cam_streamer(self, id):
         return self.cam_streamers[id - 1]
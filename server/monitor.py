@@ -1,6 +1,6 @@
 import hydra
 from application_manager import MonitoringApplication
-from flask import Flask, Response, render_template
+from flask import Flask, Response, jsonify, render_template
 
 # Initializing the monitor class
 hydra.initialize(config_path="../configs", version_base="1.2")
@@ -24,5 +24,23 @@ def video_feed(id):
     )
 
 
+@app.route("/graph_feed")
+def graph_feed():
+    return Response(
+        monitor_info.graph_streamer.yield_frames(),
+        mimetype="multipart/x-mixed-replace; boundary=frame",
+    )
+
+
+@app.route("/topics")
+def topics():
+    return jsonify(monitor_info.get_topic_statistics())
+
+
+@app.route("/metrics")
+def metrics():
+    return jsonify(monitor_info.get_metrics())
+
+
 if __name__ == "__main__":
     app.run(threaded=True, host="0.0.0.0", port=5000)